@@ -0,0 +1,114 @@
+"""
+Cache of users authenticated on WebSocket connect.
+
+A reconnect storm (a whole class coming back after a Wi-Fi blip) would
+otherwise read every user row again. Users are cached per (user_id, token
+jti) for WS_USER_CACHE_TTL seconds, so a token only ever resolves to the
+user it was first checked against. Entries are dropped when the user is
+saved or deleted (after the transaction commits). Each invalidation bumps the
+user's generation, and a read that started before it is not cached. A logout
+revokes the access token's jti until it expires, so a logged-out token can't
+open new sockets. Like the session cache this is per process.
+"""
+import collections
+import copy
+import threading
+import time
+from django.conf import settings
+
+
+class UserCache:
+    """LRU map of (user_id, jti) -> User with a TTL, plus revoked token ids."""
+
+    def __init__(self, ttl=None, max_entries=4096):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'WS_USER_CACHE_TTL', 60)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._generations = {}  # user_id -> number of invalidations so far
+        self._revoked = {}  # jti -> unix time the token expires
+        self._handshakes = {}  # 'hit' / 'miss' -> [count, total_seconds, max_seconds]
+        self._lock = threading.Lock()
+
+    def get(self, user_id, jti):
+        """A private copy of the cached user, or None on a miss."""
+        key = (str(user_id), jti)  # tokens carry the id as a string
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.copy(cached[0])
+            self.misses += 1
+        return None
+
+    def generation(self, user_id):
+        """Take this before reading a user; pass it to put()."""
+        with self._lock:
+            return self._generations.get(str(user_id), 0)
+
+    def put(self, user_id, jti, user, generation):
+        """Cache a user read at `generation`, unless it was invalidated since."""
+        key = (str(user_id), jti)
+        with self._lock:
+            if jti in self._revoked or self._generations.get(key[0], 0) != generation:
+                return
+            self._entries[key] = (copy.copy(user), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Forget every cached token of a user (profile changed or account deleted)."""
+        with self._lock:
+            self._generations[str(user_id)] = self._generations.get(str(user_id), 0) + 1
+            for key in [key for key in self._entries if key[0] == str(user_id)]:
+                del self._entries[key]
+
+    def revoke_token(self, jti, expires_at):
+        """Refuse an access token from now until it expires (logout)."""
+        now = time.time()
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == jti]:
+                del self._entries[key]
+            self._revoked = {
+                revoked: expiry for revoked, expiry in self._revoked.items() if expiry > now
+            }
+            if expires_at > now:
+                self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti):
+        with self._lock:
+            expiry = self._revoked.get(jti)
+            return expiry is not None and expiry > time.time()
+
+    def record_handshake(self, hit, seconds):
+        """Time spent authenticating one WebSocket connect."""
+        with self._lock:
+            stats = self._handshakes.setdefault('hit' if hit else 'miss', [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'revoked': len(self._revoked),
+                'ttl': self.ttl,
+                'handshakes': {
+                    outcome: {
+                        'connects': count,
+                        'avg_ms': round(total / count * 1000, 3),
+                        'max_ms': round(peak * 1000, 3),
+                    }
+                    for outcome, (count, total, peak) in self._handshakes.items()
+                },
+            }
+
+
+user_cache = UserCache()
@@ -2,7 +2,7 @@
 Custom User model with role support for Teacher and Student.
 """
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 
 
 class User(AbstractUser):
@@ -25,6 +25,20 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.role})"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._invalidate_cache()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._invalidate_cache()
+        return result
+    
+    def _invalidate_cache(self):
+        from .cache import user_cache
+        user_id = self.id
+        transaction.on_commit(lambda: user_cache.invalidate(user_id))
+    
     @property
     def is_teacher(self):
         return self.role == self.Role.TEACHER
@@ -87,6 +87,12 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     
     def get_object(self):
         return self.request.user
+    
+    def perform_update(self, serializer):
+        serializer.save()
+        # Open session sockets keep a snapshot of name and role
+        from coding.consumers import notify_identity_changed
+        notify_identity_changed(self.request.user.id)
 
 
 class LogoutView(APIView):
@@ -95,6 +101,12 @@ class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
+        # The access token can't open new session sockets either. This is only
+        # the in-memory WebSocket check of this process: REST calls still accept
+        # the same access token until it expires (SIMPLE_JWT ACCESS_TOKEN_LIFETIME)
+        if request.auth is not None and request.auth.get('jti'):
+            from .cache import user_cache
+            user_cache.revoke_token(request.auth['jti'], request.auth.get('exp', 0))
         try:
             refresh_token = request.data.get('refresh')
             if refresh_token:
@@ -1,13 +1,205 @@
 
-import requests
 import json
+import asyncio
+import re
+import time
+import hashlib
 import logging
+import threading
+import collections
+from asgiref.sync import async_to_sync
+from django.conf import settings as django_settings
+from .ai_stream import StreamError, stream_events
 
 logger = logging.getLogger(__name__)
 
+# Provider endpoints (overridable to point at a local stub server)
+OPENAI_URL = getattr(django_settings, 'AI_OPENAI_URL', 'https://api.openai.com/v1/chat/completions')
+GEMINI_URL = getattr(
+    django_settings, 'AI_GEMINI_URL',
+    'https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent'
+)
+GROQ_URL = getattr(django_settings, 'AI_GROQ_URL', 'https://api.groq.com/openai/v1/chat/completions')
+GEMINI_MODEL = GEMINI_URL.rsplit('/', 1)[-1].split(':')[0]
+GEMINI_STREAM_URL = GEMINI_URL.replace(':generateContent', ':streamGenerateContent')
+
+
+class AIStreamError(Exception):
+    """A streamed answer could not be produced; carries per-provider details."""
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or []
+
+
+def normalize_text(text):
+    """Ignore differences that don't change the question: line endings, trailing spaces, blank edges."""
+    lines = (text or '').replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+
+def make_cache_key(prompt, code, language, scope):
+    """Hash of the normalized request and the scope (owner, provider chain) that would answer it."""
+    payload = json.dumps([
+        re.sub(r'\s+', ' ', prompt or '').strip(),
+        normalize_text(code),
+        (language or '').lower(),
+        list(scope),
+    ])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AIResponseCache:
+    """
+    TTL + LRU cache of successful AI answers with single-flight: concurrent
+    identical requests wait for the first one's upstream call instead of
+    making their own. Failures are shared with waiting requests but not cached.
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl if ttl is not None else getattr(django_settings, 'AI_CACHE_TTL', 3600)
+        self.max_entries = max_entries or getattr(django_settings, 'AI_CACHE_MAX_ENTRIES', 256)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = collections.OrderedDict()  # key -> (expires_at, result)
+        self._in_flight = {}  # key -> [threading.Event, result]
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """Returns (result, source) with source 'hit', 'coalesced' or 'miss'."""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(cached[1]), 'hit'
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = [threading.Event(), None]
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight[0].wait()
+            return dict(flight[1]), 'coalesced'
+
+        result = {'error': 'All AI providers failed.', 'details': ['Internal error']}
+        try:
+            result = compute()
+        finally:
+            with self._lock:
+                if 'error' not in result:
+                    self._store(key, result)
+                del self._in_flight[key]
+            flight[1] = result
+            flight[0].set()
+        return dict(result), 'miss'
+
+    def get(self, key):
+        """A cached answer without waiting on in-flight requests (streaming path)."""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(cached[1])
+
+    def put(self, key, result):
+        with self._lock:
+            self._store(key, result)
+
+    def _store(self, key, result):
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'in_flight': len(self._in_flight),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'ttl': self.ttl,
+            }
+
+
+ai_cache = AIResponseCache()
+
+
+class ProviderStats:
+    """
+    Recent latency and outcome per provider, used to try the currently
+    fastest reliable provider first.
+    """
+
+    min_samples = 3
+
+    def __init__(self, window=100):
+        self.window = window
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, provider, seconds, ok):
+        with self._lock:
+            self._samples[provider].append((seconds, ok))
+
+    def score(self, provider):
+        """Expected cost of trying a provider: median latency, inflated by its error rate."""
+        with self._lock:
+            samples = list(self._samples.get(provider, ()))
+        if len(samples) < self.min_samples:
+            return None
+        latencies = sorted(seconds for seconds, _ in samples)
+        error_rate = sum(1 for _, ok in samples if not ok) / len(samples)
+        return latencies[len(latencies) // 2] * (1 + 4 * error_rate)
+
+    def ordered(self, providers):
+        """
+        Providers cheapest first. Ones without enough samples are scored as
+        the median known provider, and ties keep the configured order.
+        """
+        scores = {provider: self.score(provider) for provider in providers}
+        known = sorted(score for score in scores.values() if score is not None)
+        if not known:
+            return list(providers)
+        typical = known[len(known) // 2]
+        return sorted(providers, key=lambda provider: typical if scores[provider] is None else scores[provider])
+
+    def snapshot(self):
+        with self._lock:
+            samples = {provider: list(recent) for provider, recent in self._samples.items()}
+        result = {}
+        for provider, recent in samples.items():
+            latencies = sorted(seconds for seconds, _ in recent)
+            errors = sum(1 for _, ok in recent if not ok)
+            result[provider] = {
+                'samples': len(recent),
+                'error_rate': round(errors / len(recent), 3),
+                'p50_ms': round(latencies[len(latencies) // 2] * 1000),
+                'p95_ms': round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000),
+            }
+        return result
+
+
+provider_stats = ProviderStats()
+
+
 class AIService:
     """Service to handle AI code solving requests with fallback logic."""
     
+    MODELS = {
+        'openai': 'gpt-4o',  # Fallback to 3.5-turbo if needed, but assuming user has access
+        'groq': 'llama3-70b-8192',
+    }
+    
     def __init__(self, settings):
         self.settings = settings
         self.providers = []
@@ -21,42 +213,77 @@ class AIService:
             self.providers.append('groq')
             
     def solve(self, prompt, context_code=None, language='python'):
-        """Attempts to solve the problem using available providers in order."""
+        """Attempts to solve the problem, racing available providers (see _race_stream)."""
         if not self.settings.is_ai_active:
             return {'error': 'AI assistance is disabled in settings.'}
             
         if not self.providers:
             return {'error': 'No API keys configured. Please add keys in settings.'}
             
+        key = make_cache_key(prompt, context_code, language, self.cache_scope())
+        result, source = ai_cache.get_or_compute(
+            key, lambda: self._solve_uncached(prompt, context_code, language)
+        )
+        if 'error' not in result:
+            result['cached'] = source != 'miss'
+        return result
+    
+    def cache_scope(self):
+        """
+        Answers are cached per teacher: each one is paid for with that teacher's
+        API keys and shaped by their providers, so it is never served to another.
+        """
+        models = [f'{provider}:{self.MODELS.get(provider, GEMINI_MODEL)}' for provider in self.providers]
+        return [self.settings.user_id] + models
+    
+    def _solve_uncached(self, prompt, context_code, language):
         full_prompt = self._construct_prompt(prompt, context_code, language)
-        
-        errors = []
-        for provider in self.providers:
-            try:
-                response = self._call_provider(provider, full_prompt)
-                if response:
-                    return {
-                        'provider': provider,
-                        'content': response
-                    }
-            except requests.exceptions.HTTPError as e:
-                status_code = e.response.status_code
-                error_msg = f"{provider}: "
-                
-                if status_code == 429:
-                    error_msg += "Quota exceeded or Rate limit reached (Check billing)."
-                elif status_code == 401:
-                    error_msg += "Invalid API Key."
+        try:
+            provider, content = async_to_sync(self._collect)(full_prompt)
+        except AIStreamError as e:
+            return {'error': str(e), 'details': e.details}
+        return {
+            'provider': provider,
+            'content': content
+        }
+    
+    async def _collect(self, full_prompt):
+        """
+        (provider, whole answer) for the REST path. Providers are raced on their
+        first token exactly like stream(), so hedging looks at time to first
+        token rather than at full completions, and losers are cancelled.
+        """
+        provider, parts = None, []
+        events = self._stream_uncached(full_prompt)
+        try:
+            async for event in events:
+                if event['type'] == 'start':
+                    provider = event['provider']
                 else:
-                    error_msg += str(e)
-                    
-                logger.error(error_msg)
-                errors.append(error_msg)
-            except Exception as e:
-                logger.error(f"AI Provider {provider} failed: {str(e)}")
-                errors.append(f"{provider}: {str(e)}")
+                    parts.append(event['text'])
+        finally:
+            await events.aclose()
+        return provider, ''.join(parts)
+    
+    @staticmethod
+    def _describe_error(provider, e):
+        status_code = None
+        if isinstance(e, StreamError):
+            status_code = e.status
+        if status_code:
+            error_msg = f"{provider}: "
+            
+            if status_code == 429:
+                error_msg += "Quota exceeded or Rate limit reached (Check billing)."
+            elif status_code == 401:
+                error_msg += "Invalid API Key."
+            else:
+                error_msg += str(e)
                 
-        return {'error': 'All AI providers failed.', 'details': errors}
+            logger.error(error_msg)
+            return error_msg
+        logger.error(f"AI Provider {provider} failed: {str(e)}")
+        return f"{provider}: {str(e)}"
 
     def _construct_prompt(self, user_query, code, language):
         return f"""
@@ -78,60 +305,134 @@ Please provide:
 Format your response in Markdown.
 """
 
-    def _call_provider(self, provider, prompt):
-        if provider == 'openai':
-            return self._call_openai(prompt)
-        elif provider == 'gemini':
-            return self._call_gemini(prompt)
-        elif provider == 'groq':
-            return self._call_groq(prompt)
-        return None
-
-    def _call_openai(self, prompt):
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.settings.openai_api_key}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "gpt-4o", # Fallback to 3.5-turbo if needed, but assuming user has access
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7
-        }
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content']
-
-    def _call_gemini(self, prompt):
-        # Gemini usage via REST API
-        # Requires: https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key=YOUR_API_KEY
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={self.settings.gemini_api_key}"
-        headers = {"Content-Type": "application/json"}
-        data = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }]
-        }
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-        result = response.json()
+    # Streaming (WebSocket path; solve() collects the same stream)
+
+    async def stream(self, prompt, context_code=None, language='python'):
+        """
+        Async generator of {'type': 'start', 'provider', 'cached'} followed by
+        {'type': 'chunk', 'text'} events as the answer is generated. Providers
+        are raced on their first token like in solve(). Raises AIStreamError.
+        """
+        if not self.settings.is_ai_active:
+            raise AIStreamError('AI assistance is disabled in settings.')
+        if not self.providers:
+            raise AIStreamError('No API keys configured. Please add keys in settings.')
+
+        key = make_cache_key(prompt, context_code, language, self.cache_scope())
+        cached = ai_cache.get(key)
+        if cached is not None:
+            yield {'type': 'start', 'provider': cached['provider'], 'cached': True}
+            yield {'type': 'chunk', 'text': cached['content']}
+            return
+
+        full_prompt = self._construct_prompt(prompt, context_code, language)
+        provider, parts = None, []
+        events = self._stream_uncached(full_prompt)
         try:
-            return result['candidates'][0]['content']['parts'][0]['text']
-        except (KeyError, IndexError):
-            raise Exception("Invalid response format from Gemini")
-
-    def _call_groq(self, prompt):
-        # Groq compatible with OpenAI SDK but using raw HTTP here
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.settings.groq_api_key}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "llama3-70b-8192", 
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7
-        }
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content']
+            async for event in events:
+                if event['type'] == 'start':
+                    provider = event['provider']
+                else:
+                    parts.append(event['text'])
+                yield event
+        finally:
+            await events.aclose()
+        ai_cache.put(key, {'provider': provider, 'content': ''.join(parts)})
+
+    async def _stream_uncached(self, full_prompt):
+        """stream() events of a fresh answer; records the winner's latency."""
+        providers = provider_stats.ordered(self.providers)
+        hedge_delay = getattr(django_settings, 'AI_HEDGE_DELAY', 2.0)
+        provider, chunks, first, started = await self._race_stream(providers, full_prompt, hedge_delay)
+
+        try:
+            yield {'type': 'start', 'provider': provider, 'cached': False}
+            yield {'type': 'chunk', 'text': first}
+            async for text in chunks:
+                yield {'type': 'chunk', 'text': text}
+        except Exception as e:
+            provider_stats.record(provider, time.monotonic() - started, False)
+            raise AIStreamError('AI provider failed mid-answer.', [self._describe_error(provider, e)])
+        finally:
+            await chunks.aclose()
+        provider_stats.record(provider, time.monotonic() - started, True)
+
+    async def _race_stream(self, providers, full_prompt, hedge_delay):
+        """
+        Start the first provider, and the next one whenever the running ones
+        fail or send no token for hedge_delay seconds (negative: strictly in
+        order), until one produces its first token. Returns (provider,
+        remaining chunk iterator, first chunk, start time); the losing streams
+        are cancelled, which closes their connections.
+        """
+        remaining = list(providers)
+        pending = {}
+        errors = []
+
+        def launch():
+            provider = remaining.pop(0)
+            chunks = self._stream_provider(provider, full_prompt)
+            pending[asyncio.ensure_future(chunks.__anext__())] = (provider, chunks, time.monotonic())
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=hedge_delay if remaining and hedge_delay >= 0 else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                failed = not done
+                for task in done:
+                    provider, chunks, started = pending.pop(task)
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        first = None
+                    except Exception as e:
+                        provider_stats.record(provider, time.monotonic() - started, False)
+                        errors.append(self._describe_error(provider, e))
+                        failed = True
+                        continue
+                    if first:
+                        return provider, chunks, first, started
+                    provider_stats.record(provider, time.monotonic() - started, False)
+                    errors.append(f"{provider}: Empty response")
+                    failed = True
+                if remaining and (failed or not pending):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise AIStreamError('All AI providers failed.', errors)
+
+    async def _stream_provider(self, provider, prompt):
+        """Text deltas of one provider's streamed answer."""
+        if provider == 'gemini':
+            url = f"{GEMINI_STREAM_URL}?alt=sse"
+            headers = {"x-goog-api-key": self.settings.gemini_api_key}
+            data = {"contents": [{"parts": [{"text": prompt}]}]}
+        else:
+            url = OPENAI_URL if provider == 'openai' else GROQ_URL
+            api_key = self.settings.openai_api_key if provider == 'openai' else self.settings.groq_api_key
+            headers = {"Authorization": f"Bearer {api_key}"}
+            data = {
+                "model": self.MODELS[provider],
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": 0.7,
+                "stream": True
+            }
+
+        async for event in stream_events(url, headers, data):
+            if event.strip() == '[DONE]':
+                return
+            try:
+                payload = json.loads(event)
+                if provider == 'gemini':
+                    text = payload['candidates'][0]['content']['parts'][0].get('text', '')
+                else:
+                    text = payload['choices'][0]['delta'].get('content') or ''
+            except (ValueError, KeyError, IndexError, TypeError):
+                raise StreamError(f"Invalid stream event from {provider}")
+            if text:
+                yield text
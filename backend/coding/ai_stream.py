@@ -0,0 +1,52 @@
+"""
+Server-sent events over httpx for streamed AI answers.
+
+Providers stream completions as server-sent events in the body of an HTTP
+POST. httpx handles the transport (TLS, proxies from the environment,
+redirects, chunked bodies); this module only turns the body into events,
+so a generation in progress holds no thread: the consumer awaits each event
+and relays it to the teacher as it arrives. Cancelling the awaiting task
+closes the connection.
+"""
+import httpx
+
+
+class StreamError(Exception):
+    """Provider answered with an HTTP error or broke off the stream."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+async def stream_events(url, headers, body, connect_timeout=10, read_timeout=30):
+    """POST a JSON body and yield the data of each server-sent event as a string."""
+    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+    try:
+        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+            async with client.stream(
+                'POST', url, json=body, headers={'Accept': 'text/event-stream', **headers}
+            ) as response:
+                if response.status_code >= 400:
+                    text = (await response.aread()).decode('utf-8', errors='replace')
+                    raise StreamError(f'HTTP {response.status_code}: {text[:300]}', response.status_code)
+                async for data in parse_events(response.aiter_lines()):
+                    yield data
+    except httpx.HTTPError as e:
+        raise StreamError(f'{type(e).__name__}: {e}' if str(e) else type(e).__name__)
+
+
+async def parse_events(lines):
+    """Join the data lines of each server-sent event; other fields are ignored."""
+    data = []
+    async for line in lines:
+        line = line.rstrip('\r\n')
+        if not line:
+            if data:
+                yield '\n'.join(data)
+                data = []
+        elif line.startswith('data:'):
+            value = line[5:]
+            data.append(value[1:] if value.startswith(' ') else value)
+    if data:
+        yield '\n'.join(data)
@@ -1,14 +1,49 @@
+"""
+Automated archiving of student code to GitHub.
+
+Saves are handed to a fixed pool of ARCHIVE_WORKERS threads through a
+bounded queue. Pending saves of the same file are coalesced (only the
+latest code is pushed), and when ARCHIVE_QUEUE_SIZE files are already
+waiting new saves are dropped and counted. All GitHub calls share one
+keep-alive ``requests.Session``; a repository is checked (or created) once
+per process and the last known file SHA is remembered, so a steady stream
+of saves costs one PUT each. GITHUB_API_URL can point the service at a
+local fake of the GitHub API.
+"""
 import requests
 import base64
-import os
+import collections
 import threading
 import logging
 from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 # OPTIMIZATION: Use proper logging instead of print statements
 logger = logging.getLogger(__name__)
 
+
+def get_api_url():
+    return getattr(settings, 'GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+
+
+def build_http_session(pool_size):
+    """One keep-alive session, with a connection per worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
 class ArchiveService:
+    # Repositories known to exist, and the last pushed SHA per (repo, path)
+    _known_repos = set()
+    _file_shas = collections.OrderedDict()  # least recently pushed first
+    _max_file_shas = getattr(settings, 'ARCHIVE_SHA_CACHE_SIZE', 10000)
+    _lock = threading.Lock()
+    _repo_lock = threading.Lock()  # one worker checks/creates a repository at a time
+    http = build_http_session(getattr(settings, 'ARCHIVE_WORKERS', 2))
+
     @staticmethod
     def get_headers():
         if not hasattr(settings, 'GITHUB_ADMIN_TOKEN') or not settings.GITHUB_ADMIN_TOKEN:
@@ -19,49 +54,64 @@ class ArchiveService:
         }
 
     @staticmethod
-    def get_repo_name(session):
+    def get_timeout():
+        return getattr(settings, 'ARCHIVE_HTTP_TIMEOUT', 10)
+
+    @staticmethod
+    def get_repo_name(session_code, session_name):
         # Sanitize session name
-        s_name = "".join(c for c in session.session_name if c.isalnum() or c in ('-', '_')).strip()
-        return f"Observer-Session-{session.session_code}-{s_name}"
+        s_name = "".join(c for c in session_name if c.isalnum() or c in ('-', '_')).strip()
+        return f"Observer-Session-{session_code}-{s_name}"
 
     @staticmethod
-    def get_file_path(student, language):
+    def get_file_path(student_username, student_id, language):
         # Format: {StudentName}_{ID}/main.{ext}
         ext_map = {
             'python': 'py',
             'javascript': 'js',
-            'c': 'c', 
+            'c': 'c',
             'cpp': 'cpp',
             'java': 'java'
         }
         ext = ext_map.get(language, 'txt')
-        username = "".join(c for c in student.username if c.isalnum() or c in ('-', '_'))
-        return f"{username}_{student.id}/main.{ext}"
+        username = "".join(c for c in student_username if c.isalnum() or c in ('-', '_'))
+        return f"{username}_{student_id}/main.{ext}"
 
     @staticmethod
     def ensure_repo_exists(repo_name):
         headers = ArchiveService.get_headers()
         if not headers:
             return False
-
-        # Check existence
-        owner = settings.GITHUB_ADMIN_USERNAME
-        check_url = f"https://api.github.com/repos/{owner}/{repo_name}"
-        response = requests.get(check_url, headers=headers)
-        
-        if response.status_code == 200:
+        if repo_name in ArchiveService._known_repos:
             return True
-        
-        # Create if missing
-        create_url = "https://api.github.com/user/repos"
-        data = {
-            "name": repo_name,
-            "private": True,
-            "description": "Automated Code Archive from Observer Session",
-            "auto_init": True
-        }
-        create_res = requests.post(create_url, json=data, headers=headers)
-        return create_res.status_code == 201
+
+        with ArchiveService._repo_lock:
+            if repo_name in ArchiveService._known_repos:
+                return True
+
+            # Check existence
+            owner = settings.GITHUB_ADMIN_USERNAME
+            check_url = f"{get_api_url()}/repos/{owner}/{repo_name}"
+            response = ArchiveService.http.get(check_url, headers=headers, timeout=ArchiveService.get_timeout())
+
+            if response.status_code != 200:
+                # Create if missing
+                create_url = f"{get_api_url()}/user/repos"
+                data = {
+                    "name": repo_name,
+                    "private": True,
+                    "description": "Automated Code Archive from Observer Session",
+                    "auto_init": True
+                }
+                create_res = ArchiveService.http.post(
+                    create_url, json=data, headers=headers, timeout=ArchiveService.get_timeout()
+                )
+                if create_res.status_code != 201:
+                    return False
+
+            with ArchiveService._lock:
+                ArchiveService._known_repos.add(repo_name)
+        return True
 
     @staticmethod
     def push_file(repo_name, file_path, content, message):
@@ -70,65 +120,79 @@ class ArchiveService:
             return False
 
         owner = settings.GITHUB_ADMIN_USERNAME
-        url = f"https://api.github.com/repos/{owner}/{repo_name}/contents/{file_path}"
-        
-        # Get SHA if file exists (for update)
-        get_res = requests.get(url, headers=headers)
-        sha = None
-        if get_res.status_code == 200:
-            sha = get_res.json().get('sha')
-
-        # Push
+        url = f"{get_api_url()}/repos/{owner}/{repo_name}/contents/{file_path}"
         data = {
             "message": message,
             "content": base64.b64encode(content.encode('utf-8')).decode('utf-8'),
             "branch": "main"
         }
-        if sha:
-            data['sha'] = sha
 
-        put_res = requests.put(url, json=data, headers=headers)
-        return put_res.status_code in [200, 201]
+        # Try with the remembered SHA first; fetch it when unknown or stale
+        with ArchiveService._lock:
+            sha = ArchiveService._file_shas.get((repo_name, file_path))
+        for attempt in range(2):
+            if sha is None:
+                get_res = ArchiveService.http.get(url, headers=headers, timeout=ArchiveService.get_timeout())
+                if get_res.status_code == 200:
+                    sha = get_res.json().get('sha')
+            if sha:
+                data['sha'] = sha
+
+            put_res = ArchiveService.http.put(url, json=data, headers=headers, timeout=ArchiveService.get_timeout())
+            if put_res.status_code in [200, 201]:
+                new_sha = (put_res.json().get('content') or {}).get('sha')
+                ArchiveService.remember_sha(repo_name, file_path, new_sha)
+                return True
+            if put_res.status_code == 404:
+                # Repository deleted meanwhile: check it again next time
+                with ArchiveService._lock:
+                    ArchiveService._known_repos.discard(repo_name)
+                break
+            if put_res.status_code not in [409, 422] or attempt:
+                break
+            sha = None  # File changed on GitHub: refetch its SHA and retry once
+
+        with ArchiveService._lock:
+            ArchiveService._file_shas.pop((repo_name, file_path), None)
+        return False
+
+    @staticmethod
+    def remember_sha(repo_name, file_path, sha):
+        """Memo a file's latest SHA, forgetting the least recently pushed files beyond the cap."""
+        with ArchiveService._lock:
+            ArchiveService._file_shas[(repo_name, file_path)] = sha
+            ArchiveService._file_shas.move_to_end((repo_name, file_path))
+            while len(ArchiveService._file_shas) > ArchiveService._max_file_shas:
+                ArchiveService._file_shas.popitem(last=False)
 
     @staticmethod
     def archive_code_async(session_code, session_name, student_username, student_id, code, language):
         """
-        Calculates repo name and path locally to minimize data passed to thread
+        Calculates repo name and path locally to minimize data passed to workers
         """
         try:
-            # Mock session object/student object strictly for helper methods if needed,
-            # or just replicate logic to avoid passing Django models to threads if not db-serialized.
-            # Here we just use the raw data.
-            
-            # Repo Name Logic
-            s_name = "".join(c for c in session_name if c.isalnum() or c in ('-', '_')).strip()
-            repo_name = f"Observer-Session-{session_code}-{s_name}"
-            
-            # File Path Logic
-            ext_map = {'python': 'py', 'javascript': 'js', 'c': 'c', 'cpp': 'cpp', 'java': 'java'}
-            ext = ext_map.get(language, 'txt')
-            s_username = "".join(c for c in student_username if c.isalnum() or c in ('-', '_'))
-            file_path = f"{s_username}_{student_id}/main.{ext}"
-
-            # 1. Ensure Repo
-            # Note: ensure_repo_exists is static, so we can call it directly
-            # Logic inside ensure_repo_exists uses requests, which is fine in thread
-            
-            # We need to reimplement ensure_repo_exists logic or make it accept repo_name directly
-            # ensure_repo_exists ALREADY takes repo_name, so this is fine.
+            repo_name, file_path = ArchiveService.get_target(
+                session_code, session_name, student_username, student_id, language
+            )
             if ArchiveService.ensure_repo_exists(repo_name):
-                 # 2. Push Code
-                 # We need to fix the call to push_file to match signature (it is static)
-                 ArchiveService.push_file(
-                    repo_name, 
-                    file_path, 
-                    code, 
+                ArchiveService.push_file(
+                    repo_name,
+                    file_path,
+                    code,
                     f"Auto-archive: {student_username} update on {language}"
                 )
 
         except Exception as e:
             logger.warning(f"Archiving failed: {e}")
 
+    @staticmethod
+    def get_target(session_code, session_name, student_username, student_id, language):
+        """(repo name, file path) from raw values, so workers never touch Django models."""
+        return (
+            ArchiveService.get_repo_name(session_code, session_name),
+            ArchiveService.get_file_path(student_username, student_id, language)
+        )
+
     @staticmethod
     def trigger_archive(session, student, code, language):
         """
@@ -138,9 +202,93 @@ class ArchiveService:
         if not hasattr(settings, 'GITHUB_ADMIN_TOKEN') or not settings.GITHUB_ADMIN_TOKEN:
             return
 
-        thread = threading.Thread(
-            target=ArchiveService.archive_code_async,
-            args=(session.session_code, session.session_name, student.username, student.id, code, language)
+        archive_pool.submit(
+            session.session_code, session.session_name, student.username, student.id, code, language
         )
 
-        thread.start()
+
+class ArchiveWorkerPool:
+    """Fixed-size worker pool draining a bounded, per-file coalescing queue."""
+
+    def __init__(self, workers=None, max_queue=None):
+        self.workers = workers or getattr(settings, 'ARCHIVE_WORKERS', 2)
+        self.max_queue = max_queue or getattr(settings, 'ARCHIVE_QUEUE_SIZE', 500)
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.completed = 0
+        self._pending = collections.OrderedDict()  # (repo, path) -> job args
+        self._in_flight = set()  # files being pushed; a newer save waits its turn
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def submit(self, session_code, session_name, student_username, student_id, code, language):
+        """Queue a push. Returns False if the queue is full and the save was dropped."""
+        key = ArchiveService.get_target(session_code, session_name, student_username, student_id, language)
+        job = (session_code, session_name, student_username, student_id, code, language)
+        with self._condition:
+            self.submitted += 1
+            if key in self._pending:
+                # Only the latest code of a file is worth pushing
+                self._pending[key] = job
+                self.coalesced += 1
+                return True
+            if len(self._pending) >= self.max_queue:
+                self.dropped += 1
+                return False
+            self._pending[key] = job
+            self._condition.notify()
+        self._start()
+        return True
+
+    def stats(self):
+        with self._condition:
+            return {
+                'workers': self.workers,
+                'queue_depth': len(self._pending),
+                'max_queue': self.max_queue,
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'completed': self.completed,
+                'known_repos': len(ArchiveService._known_repos),
+                'known_shas': len(ArchiveService._file_shas),
+            }
+
+    def _start(self):
+        if self._threads:
+            return
+        with self._condition:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'archive-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                key = self._next_key()
+                while key is None:
+                    self._condition.wait()
+                    key = self._next_key()
+                job = self._pending.pop(key)
+                self._in_flight.add(key)
+            try:
+                ArchiveService.archive_code_async(*job)
+            finally:
+                with self._condition:
+                    self._in_flight.discard(key)
+                    self.completed += 1
+                    self._condition.notify_all()
+
+    def _next_key(self):
+        """Oldest pending file not already being pushed by another worker."""
+        for key in self._pending:
+            if key not in self._in_flight:
+                return key
+        return None
+
+
+archive_pool = ArchiveWorkerPool()
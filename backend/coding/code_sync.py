@@ -0,0 +1,170 @@
+"""
+Delta-encoded code sync.
+
+Students send edit operations against a numbered version of their buffer
+instead of the whole file on every change:
+
+    {"type": "code_change", "base_version": 7,
+     "ops": [{"from": 10, "to": 14, "text": "print"}], "language": "python"}
+
+Offsets are UTF-16 code units, matching JavaScript string indices. The student's
+consumer owns the authoritative buffer, applies the ops, bumps the version and
+fans out only the ops (``student_code_delta``). Whenever versions diverge the
+server asks the student for a full copy (``code_resync_required``), and
+teachers can ask for a full snapshot (``request_code_sync``). Clients that
+still send ``code`` keep working; every full update carries its version too.
+
+Bursts (fast typing, pastes) are coalesced per student: at most one update
+per CODE_SYNC_COALESCE_INTERVAL seconds reaches the teachers, always carrying
+the latest state, and pending updates are flushed at once on run or save.
+"""
+import asyncio
+import collections
+import threading
+import time
+from django.conf import settings
+
+# Same cap as the REST save endpoints
+MAX_CODE_SIZE = 1024 * 1024
+
+
+class CodeSyncError(ValueError):
+    """Ops don't apply cleanly to the server's buffer."""
+
+
+def apply_code_ops(code, ops):
+    """Apply a list of {from, to, text} ops (UTF-16 offsets) and return the new code."""
+    if not isinstance(ops, list):
+        raise CodeSyncError('ops must be a list')
+    buffer = code.encode('utf-16-le', errors='surrogatepass')
+    for op in ops:
+        try:
+            start, end, text = int(op['from']), int(op['to']), str(op.get('text', ''))
+        except (KeyError, TypeError, ValueError):
+            raise CodeSyncError(f'Malformed op: {op!r}')
+        if not 0 <= start <= end <= len(buffer) // 2:
+            raise CodeSyncError(f'Op range {start}-{end} out of bounds')
+        buffer = buffer[:start * 2] + text.encode('utf-16-le', errors='surrogatepass') + buffer[end * 2:]
+        if len(buffer) > MAX_CODE_SIZE * 2:
+            raise CodeSyncError('Code too large')
+    try:
+        return buffer.decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise CodeSyncError('Ops split a character')
+
+
+class CodeUpdateCoalescer:
+    """
+    Collapses one student's code events into at most one per interval.
+
+    The first event after a quiet period goes out immediately; events arriving
+    within the interval are merged into a single pending event that is sent
+    when the interval ends. Consecutive deltas are merged by concatenating
+    their ops, anything else is replaced by a full snapshot of the buffer.
+    """
+
+    def __init__(self, send, snapshot, interval=None):
+        self.send = send  # async callable(event)
+        self.snapshot = snapshot  # callable returning a full update for the current buffer
+        self.interval = interval if interval is not None else getattr(
+            settings, 'CODE_SYNC_COALESCE_INTERVAL', 0.075
+        )
+        self.pending = None
+        self.last_sent = 0.0
+        self._timer = None
+
+    async def submit(self, event):
+        self.pending = self._merge(self.pending, event)
+        if self._timer is not None:
+            return
+        delay = self.last_sent + self.interval - time.monotonic()
+        if delay <= 0:
+            await self.flush()
+        else:
+            self._timer = asyncio.ensure_future(self._flush_later(delay))
+
+    async def flush(self):
+        """Send the pending event now, if any."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        event, self.pending = self.pending, None
+        if event is None:
+            return
+        self.last_sent = time.monotonic()
+        await self.send(event)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.pending = None
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        self._timer = None
+        await self.flush()
+
+    def _merge(self, pending, event):
+        if pending is None:
+            return event
+        if pending['type'] == event['type'] == 'student_code_delta':
+            merged = dict(event)
+            merged['ops'] = pending['ops'] + event['ops']
+            merged['base_version'] = pending['base_version']
+            return merged
+        merged = self.snapshot()
+        merged['cursor_position'] = event.get('cursor_position', 0)
+        return merged
+
+
+class TrafficMeter:
+    """
+    Counts fan-out messages and bytes per session, with a rolling bytes/sec
+    rate, plus code frames received from students versus forwarded to teachers.
+    """
+
+    def __init__(self, window=60):
+        self.window = window
+        self._totals = collections.defaultdict(lambda: collections.defaultdict(lambda: [0, 0]))
+        self._frames = collections.defaultdict(lambda: [0, 0])  # session -> [received, forwarded]
+        self._recent = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    def frame_received(self, session_code):
+        with self._lock:
+            self._frames[session_code][0] += 1
+
+    def record(self, session_code, kind, nbytes):
+        now = time.monotonic()
+        with self._lock:
+            totals = self._totals[session_code][kind]
+            totals[0] += 1
+            totals[1] += nbytes
+            if kind in ('delta', 'full'):
+                self._frames[session_code][1] += 1
+            recent = self._recent[session_code]
+            recent.append((now, nbytes))
+            while recent and recent[0][0] < now - self.window:
+                recent.popleft()
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            result = {}
+            for session_code, kinds in self._totals.items():
+                recent = self._recent[session_code]
+                while recent and recent[0][0] < now - self.window:
+                    recent.popleft()
+                result[session_code] = {
+                    kind: {'messages': messages, 'bytes': nbytes}
+                    for kind, (messages, nbytes) in kinds.items()
+                }
+                result[session_code]['bytes_per_sec'] = round(sum(n for _, n in recent) / self.window, 1)
+                received, forwarded = self._frames[session_code]
+                result[session_code]['frames_received'] = received
+                result[session_code]['frames_forwarded'] = forwarded
+            return result
+
+
+code_sync_meter = TrafficMeter()
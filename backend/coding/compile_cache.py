@@ -0,0 +1,230 @@
+"""
+Content-addressed compile cache for C, C++ and Java submissions.
+
+Entries are keyed by a hash of (language, source, compiler command, toolchain
+version) and stored as one directory per key under
+CODE_EXECUTION_COMPILE_CACHE_DIR. Entries are published with an atomic
+rename, so several Daphne workers can share one cache directory: readers only
+ever see complete entries, and when two workers compile the same source the
+second rename simply loses. Total size is capped at
+CODE_EXECUTION_COMPILE_CACHE_MAX_BYTES by evicting least recently used entries.
+
+Native runs share the server's uid, so nothing on disk is out of a student
+program's reach. The directory therefore lives outside the temp directory
+programs run in, must be owned by the server with mode 0700 (the cache is
+disabled otherwise), and every artifact's SHA-256 is kept in this process's
+memory when it is stored: restore checks each copy against it and drops an
+entry that was tampered with. Entries this process has no digest for (left
+by another worker or an earlier run) are misses and get replaced.
+"""
+import collections
+import hashlib
+import logging
+import os
+import shutil
+import stat
+import threading
+import uuid
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CompileCache:
+    """On-disk LRU cache of compiled binaries and class files."""
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or getattr(
+            settings, 'CODE_EXECUTION_COMPILE_CACHE_DIR',
+            os.path.join(os.path.expanduser('~'), '.cache', 'observer', 'compile_cache')
+        )
+        self.max_bytes = max_bytes if max_bytes is not None else getattr(
+            settings, 'CODE_EXECUTION_COMPILE_CACHE_MAX_BYTES', 256 * 1024 * 1024
+        )
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+        self._usable = None
+        self._digests = collections.OrderedDict()  # key -> {artifact_name: sha256}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self._check_directory()
+
+    def _check_directory(self):
+        """Create the cache directory, or refuse one not private to the server."""
+        if self._usable is None:
+            try:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                info = os.lstat(self.directory)
+                self._usable = (
+                    stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid()
+                    and stat.S_IMODE(info.st_mode) == 0o700
+                )
+            except OSError:
+                self._usable = False
+            if not self._usable:
+                logger.warning(
+                    f"Compile cache disabled: {self.directory} must be a directory owned by "
+                    f"this user with mode 0700"
+                )
+        return self._usable
+
+    def key(self, language, source, command, toolchain_version):
+        """Return the cache key for a compilation."""
+        digest = hashlib.sha256()
+        for part in (language, ' '.join(command), toolchain_version or '', source):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def restore(self, key, dest_dir, rename=None):
+        """
+        Copy a cached entry's artifacts into dest_dir.
+
+        Artifacts are copied rather than linked so a running program can never
+        modify the shared cached copy, and each copy is checked against the
+        digest recorded when the entry was stored.
+
+        Args:
+            rename: optional {artifact_name: file_name} mapping for dest_dir
+
+        Returns:
+            True on a cache hit, False on a miss.
+        """
+        if not self.enabled:
+            return False
+        entry = os.path.join(self.directory, key)
+        rename = rename or {}
+        with self._lock:
+            digests = self._digests.get(key)
+            if digests is not None:
+                self._digests.move_to_end(key)
+        if digests is None:
+            with self._lock:
+                self.misses += 1
+            return False
+        copied = []
+        try:
+            if sorted(os.listdir(entry)) != sorted(digests):
+                raise ValueError(key)
+            for name, digest in digests.items():
+                dest = os.path.join(dest_dir, rename.get(name, name))
+                shutil.copy2(os.path.join(entry, name), dest)
+                copied.append(dest)
+                # Hash the copy that will run, not the shared file
+                if file_digest(dest) != digest:
+                    raise ValueError(key)
+            # Directory mtime doubles as the LRU timestamp
+            os.utime(entry)
+        except OSError:
+            # Missing entry, or evicted by another worker mid-copy
+            self._discard_copies(copied)
+            with self._lock:
+                self.misses += 1
+            return False
+        except ValueError:
+            logger.warning(f"Compile cache entry {key} does not match its digests; dropping it")
+            self._discard_copies(copied)
+            self._drop(key)
+            with self._lock:
+                self.misses += 1
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def _discard_copies(self, paths):
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _drop(self, key):
+        """Forget an entry and remove it from disk."""
+        with self._lock:
+            self._digests.pop(key, None)
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+
+    def store(self, key, artifacts):
+        """
+        Publish compiled artifacts under key.
+
+        Args:
+            artifacts: {artifact_name: path} of files produced by the compiler
+        """
+        if not self.enabled:
+            return
+        staging = os.path.join(self.directory, f'.{key}.{os.getpid()}.{uuid.uuid4().hex}')
+        entry = os.path.join(self.directory, key)
+        try:
+            os.mkdir(staging, mode=0o700)
+            digests = {}
+            for name, path in artifacts.items():
+                shutil.copy2(path, os.path.join(staging, name))
+                digests[name] = file_digest(os.path.join(staging, name))
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # An entry this process can't vouch for (another worker's, or an
+                # earlier run's) is replaced by ours
+                shutil.rmtree(entry, ignore_errors=True)
+                os.rename(staging, entry)
+        except OSError:
+            # Another worker published the same key meanwhile, or the disk is unhappy
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        with self._lock:
+            self._digests[key] = digests
+            self._digests.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if item.name.startswith('.') or not item.is_dir(follow_symlinks=False):
+                        continue
+                    size = sum(f.stat().st_size for f in os.scandir(item.path))
+                    entries.append((item.stat().st_mtime, size, item.path))
+                    total += size
+        except OSError:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self._digests.pop(os.path.basename(path), None)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'rejected': self.rejected,
+            }
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+compile_cache = CompileCache()
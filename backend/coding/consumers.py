@@ -2,29 +2,138 @@
 WebSocket consumer for real-time coding sessions.
 Handles bidirectional communication between teachers and students.
 """
+import os
 import json
+import time
+import codecs
+import signal
 import asyncio
 import logging
+import threading
+import collections
 from datetime import datetime
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from .scheduler import scheduler, SchedulerBusy
+from .output_limits import HeadTailBuffer, get_output_limit, truncate_text
+from .code_sync import apply_code_ops, CodeSyncError, CodeUpdateCoalescer, code_sync_meter
+from .presence import presence
+from .replay import replay_log, publish
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Interactive output streaming: frame size and coalescing window
+STREAM_FRAME_BYTES = getattr(settings, 'CODE_EXECUTION_STREAM_FRAME_BYTES', 8192)
+STREAM_FLUSH_INTERVAL = getattr(settings, 'CODE_EXECUTION_STREAM_FLUSH_INTERVAL', 0.016)
+# Stop an interactive program once it has printed this many times the output limit
+STREAM_RUNAWAY_FACTOR = 8
+# Streamed AI answers a single teacher socket may have in progress
+MAX_AI_STREAMS = 3
+
+
+def teachers_group_name(session_code):
+    """Channel group of a session's teacher connections."""
+    return f'session_{session_code}_teachers'
+
+
+def students_group_name(session_code):
+    """Channel group of a session's student connections."""
+    return f'session_{session_code}_students'
+
+
+def role_group_name(session_code, role):
+    return teachers_group_name(session_code) if role == 'teacher' else students_group_name(session_code)
+
+
+class Identity(collections.namedtuple('Identity', ['id', 'username', 'full_name', 'role'])):
+    """Immutable snapshot of the connected user, taken once at connect."""
+    
+    __slots__ = ()
+    
+    @classmethod
+    def from_user(cls, user):
+        if not user or not user.is_authenticated:
+            return None
+        return cls(user.id, user.username, user.full_name or user.username, user.role)
+
+
+def notify_user_sockets(user_id, event_type):
+    """Send a bare event to all of a user's open session sockets (sync callers)."""
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+    
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(f'user_{user_id}', {'type': event_type})
+    except Exception as e:
+        logger.warning(f"Could not send {event_type} to sockets of user {user_id}: {e}")
+
+
+def notify_identity_changed(user_id):
+    """Tell a user's open session sockets to reload their identity snapshot."""
+    notify_user_sockets(user_id, 'identity_changed')
+
+
+def flush_code_updates(user_id):
+    """Push a student's coalesced code updates to teachers now (on run or save)."""
+    notify_user_sockets(user_id, 'code_flush_requested')
+
+
+class HandlerLatency:
+    """Per-message-type handler latency of CodingConsumer.receive."""
+    
+    def __init__(self):
+        self._stats = {}  # message type -> [count, total_seconds, max_seconds]
+        self._lock = threading.Lock()
+    
+    def record(self, message_type, seconds):
+        with self._lock:
+            stats = self._stats.setdefault(message_type, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                message_type: {
+                    'messages': count,
+                    'avg_ms': round(total / count * 1000, 3),
+                    'max_ms': round(peak * 1000, 3),
+                }
+                for message_type, (count, total, peak) in self._stats.items()
+            }
+
+
+handler_latency = HandlerLatency()
+
 
 class CodingConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time code synchronization.
     
+    Student-originated events (code, output, activity, alerts) are sent to the
+    session's teachers group only; students never receive them.
+    
     Events:
-    - code_change: Student sends code updates → broadcasted to teacher
+    - code_change: Student sends code (full or as versioned deltas) → coalesced, broadcasted to teacher
+    - request_code_sync: Teacher asks for a student's full code after a missed delta
     - teacher_edit: Teacher sends code → sent to specific student
     - run_code: Execute code and broadcast output
     - request_control: Teacher requests control of student's editor
     - release_control: Teacher releases control
     - heartbeat: Keep connection alive and track activity
+    
+    State-changing events carry a per-session ``seq`` (see replay). A client
+    reconnecting with ?epoch=...&last_seq=... gets a ``replay`` of what it
+    missed, or a ``session_snapshot`` when the gap is too large.
     """
     
     async def connect(self):
@@ -33,26 +142,47 @@ class CodingConsumer(AsyncWebsocketConsumer):
         self.session_group_name = f'session_{self.session_code}'
         self.user = self.scope.get('user')
         self.is_connected = False
+        self.identity = None
+        self.session = None
+        self.role_group_name = None
+        self.ai_streams = {}  # request_id -> task streaming an AI answer
+        self.resume_seq = 0  # sequenced events up to here were already replayed
+        # Authoritative copy of this student's code for delta sync
+        self.code_buffer = None
+        self.code_version = 0
+        self.code_language = 'python'
+        self.code_coalescer = CodeUpdateCoalescer(
+            self.forward_code_event, lambda: self.build_code_snapshot_event(self.identity)
+        )
         logger.info(f"🔌 WebSocket Connect: code={self.session_code}, user={self.user}")
         
         # Check if user is authenticated
-        user_data = await self.get_user_data()
-        if not user_data:
+        identity = self.identity = Identity.from_user(self.user)
+        if not identity:
             # Reject connection for unauthenticated users
             await self.close(code=4001)
             return
         
-        # Join session group
+        # Resolve the session once; DB helpers use its id from here on
+        from sessions.cache import session_cache
+        self.session = await database_sync_to_async(session_cache.get)(self.session_code)
+        
+        # Join session group, plus the teachers or students group for this role
+        self.role_group_name = role_group_name(self.session_code, identity.role)
         await self.channel_layer.group_add(
             self.session_group_name,
             self.channel_name
         )
+        await self.channel_layer.group_add(
+            self.role_group_name,
+            self.channel_name
+        )
         
         await self.accept()
         self.is_connected = True
         
         # Create unique channel for this user
-        self.user_channel = f'user_{user_data["id"]}'
+        self.user_channel = f'user_{identity.id}'
         await self.channel_layer.group_add(
             self.user_channel,
             self.channel_name
@@ -61,57 +191,94 @@ class CodingConsumer(AsyncWebsocketConsumer):
         # Send confirmation to this client only first
         await self.send(text_data=json.dumps({
             'type': 'connection_confirmed',
-            'user_id': user_data['id'],
-            'username': user_data['username'],
-            'role': user_data['role'],
+            'user_id': identity.id,
+            'username': identity.username,
+            'role': identity.role,
             'session_code': self.session_code,
+            'epoch': replay_log.epoch,
+            'seq': replay_log.current(self.session_code),
             'timestamp': datetime.now().isoformat()
         }))
         
+        # A reconnecting client catches up on what it missed
+        query_params = parse_qs(self.scope.get('query_string', b'').decode())
+        if 'last_seq' in query_params:
+            try:
+                last_seq = int(query_params['last_seq'][0])
+            except ValueError:
+                last_seq = -1
+            await self.send_resync(query_params.get('epoch', [''])[0], last_seq)
+        
         # Notify others of connection (with delay to ensure connection is stable)
-        await self.channel_layer.group_send(
+        await publish(
+            self.channel_layer,
+            self.session_code,
             self.session_group_name,
             {
                 'type': 'user_connected',
-                'user_id': user_data['id'],
-                'username': user_data['username'],
-                'full_name': user_data['full_name'],
-                'role': user_data['role'],
+                'user_id': identity.id,
+                'username': identity.username,
+                'full_name': identity.full_name,
+                'role': identity.role,
                 'timestamp': datetime.now().isoformat()
             }
         )
         
-        # Update connection status
-        if user_data['role'] == 'student':
+        # Update connection status (written only if the student was offline)
+        if identity.role == 'student' and presence.connect(self.session_code, identity.id):
             await self.update_connection_status(True)
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
         self.is_connected = False
-        user_data = await self.get_user_data()
+        identity = getattr(self, 'identity', None)
+        
+        # Stop generating AI answers nobody will see
+        for task in list(getattr(self, 'ai_streams', {}).values()):
+            task.cancel()
+        
+        # Teachers still get the student's last keystrokes
+        coalescer = getattr(self, 'code_coalescer', None)
+        if coalescer:
+            try:
+                await coalescer.flush()
+            except Exception:
+                pass
+            coalescer.close()
         
-        if user_data:
-            # Update connection status first
-            if user_data['role'] == 'student':
+        if identity:
+            # Update connection status first (unless another tab is still open)
+            if identity.role == 'student' and presence.disconnect(self.session_code, identity.id):
                 await self.update_connection_status(False)
+                try:
+                    await publish(self.channel_layer, self.session_code, self.session_group_name, {
+                        'type': 'user_disconnected',
+                        'user_id': identity.id,
+                        'username': identity.username,
+                        'role': identity.role,
+                        'timestamp': datetime.now().isoformat()
+                    })
+                except Exception:
+                    pass
             
             # Leave user channel
             try:
                 await self.channel_layer.group_discard(
-                    f'user_{user_data["id"]}',
+                    f'user_{identity.id}',
                     self.channel_name
                 )
             except Exception:
                 pass
         
-        # Leave session group
-        try:
-            await self.channel_layer.group_discard(
-                self.session_group_name,
-                self.channel_name
-            )
-        except Exception:
-            pass
+        # Leave session and role groups
+        groups = [self.session_group_name]
+        if getattr(self, 'role_group_name', None):
+            groups.append(self.role_group_name)
+        for group in groups:
+            try:
+                await self.channel_layer.group_discard(group, self.channel_name)
+            except Exception:
+                pass
     
     async def receive(self, text_data):
         """Handle incoming WebSocket messages."""
@@ -128,11 +295,16 @@ class CodingConsumer(AsyncWebsocketConsumer):
                 'heartbeat': self.handle_heartbeat,
                 'console_clear': self.handle_console_clear,
                 'student_notification': self.handle_student_notification,
+                'request_code_sync': self.handle_request_code_sync,
+                'ai_solve': self.handle_ai_solve,
+                'ai_cancel': self.handle_ai_cancel,
             }
             
             handler = handlers.get(message_type)
             if handler:
+                started = time.perf_counter()
                 await handler(data)
+                handler_latency.record(message_type, time.perf_counter() - started)
             else:
                 await self.send_error(f'Unknown message type: {message_type}')
         
@@ -144,40 +316,199 @@ class CodingConsumer(AsyncWebsocketConsumer):
     # Message handlers
     
     async def handle_code_change(self, data):
-        """Handle code changes from student."""
-        user_data = await self.get_user_data()
-        if not user_data:
+        """Handle code changes from student (full code or versioned delta, see code_sync)."""
+        identity = self.identity
+        if not identity:
             return
         
-        code = data.get('code', '')
-        language = data.get('language', 'python')
+        language = data.get('language', self.code_language)
         cursor_position = data.get('cursor_position', 0)
+        ops = data.get('ops')
         
-        # OPTIMIZATION: Broadcast to session IMMEDIATELY (before any DB ops)
-        # This ensures the teacher sees the keystrokes instantly.
-        await self.channel_layer.group_send(
-            self.session_group_name,
-            {
-                'type': 'student_code_update',
-                'student_id': user_data['id'],
-                'username': user_data['username'],
-                'full_name': user_data['full_name'],
-                'code': code,
+        if ops is not None:
+            base_version = data.get('base_version')
+            if self.code_buffer is None or base_version != self.code_version:
+                await self.request_code_resync()
+                return
+            try:
+                self.code_buffer = apply_code_ops(self.code_buffer, ops)
+            except CodeSyncError:
+                await self.request_code_resync()
+                return
+            self.code_version += 1
+            self.code_language = language
+            event = {
+                'type': 'student_code_delta',
+                'student_id': identity.id,
+                'ops': ops,
+                'base_version': base_version,
+                'version': self.code_version,
                 'language': language,
                 'cursor_position': cursor_position,
                 'timestamp': datetime.now().isoformat()
             }
+        else:
+            self.code_buffer = data.get('code', '')
+            self.code_version += 1
+            self.code_language = language
+            event = self.build_code_snapshot_event(identity)
+            event['cursor_position'] = cursor_position
+        
+        # Let the client know which version the server now holds
+        await self.safe_send({'type': 'code_ack', 'version': self.code_version})
+        
+        # OPTIMIZATION: Broadcast to teachers before any DB ops, coalescing
+        # bursts so teacher tiles re-render at most once per interval
+        code_sync_meter.frame_received(self.session_code)
+        await self.code_coalescer.submit(event)
+        if data.get('flush'):
+            await self.code_coalescer.flush()
+    
+    async def forward_code_event(self, event):
+        """Fan a (possibly coalesced) code event out to the session's teachers."""
+        kind = 'delta' if event['type'] == 'student_code_delta' else 'full'
+        code_sync_meter.record(self.session_code, kind, len(json.dumps(event)))
+        await publish(self.channel_layer, self.session_code, teachers_group_name(self.session_code), event)
+    
+    async def request_code_resync(self):
+        """Ask the student client for a full copy of its buffer."""
+        await self.safe_send({
+            'type': 'code_resync_required',
+            'version': self.code_version,
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    async def send_resync(self, epoch, last_seq):
+        """Replay the events a reconnecting client missed, or send a snapshot."""
+        groups = {self.session_group_name, self.role_group_name, self.user_channel}
+        seq, events = replay_log.since(self.session_code, epoch, last_seq, groups)
+        if events is not None:
+            await self.safe_send({
+                'type': 'replay',
+                'epoch': replay_log.epoch,
+                'seq': seq,
+                'events': events
+            })
+        else:
+            snapshot = await self.load_session_snapshot()
+            await self.safe_send({
+                'type': 'session_snapshot',
+                'epoch': replay_log.epoch,
+                'seq': seq,
+                **snapshot
+            })
+        # Live copies of anything up to seq are still queued for this socket
+        self.resume_seq = seq
+    
+    def build_code_snapshot_event(self, identity):
+        """Full student_code_update event for the authoritative buffer."""
+        return {
+            'type': 'student_code_update',
+            'student_id': identity.id,
+            'username': identity.username,
+            'full_name': identity.full_name,
+            'code': self.code_buffer,
+            'language': self.code_language,
+            'version': self.code_version,
+            'cursor_position': 0,
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    async def handle_request_code_sync(self, data):
+        """Teacher's copy of a student's code diverged: ask for a full snapshot."""
+        identity = self.identity
+        if not identity or identity.role != 'teacher':
+            return
+        
+        await self.channel_layer.group_send(
+            f'user_{data.get("student_id")}',
+            {
+                'type': 'code_sync_requested',
+                'session_code': self.session_code,
+                'reply_channel': self.channel_name,
+            }
         )
-
-        # Skip DB saving here for speed. 
-        # Persistence is handled by the REST API (debounced auto-save).
-        # await self.save_code_snapshot(code, language)
-        # await self.update_last_active()
+    
+    async def handle_ai_solve(self, data):
+        """Stream an AI answer to this teacher (runs in the background, see stream_ai_answer)."""
+        identity = self.identity
+        if not identity or identity.role != 'teacher':
+            await self.send_error('Only teachers can use AI solver')
+            return
+        
+        prompt = data.get('prompt', '')
+        request_id = str(data.get('request_id', ''))
+        if not prompt or not request_id:
+            await self.send_error('Prompt and request_id are required')
+            return
+        if len(self.ai_streams) >= MAX_AI_STREAMS:
+            await self.safe_send({
+                'type': 'ai_stream_error',
+                'request_id': request_id,
+                'error': 'Too many AI requests in progress.'
+            })
+            return
+        
+        task = asyncio.ensure_future(self.stream_ai_answer(
+            request_id, prompt, data.get('code', ''), data.get('language', 'python')
+        ))
+        self.ai_streams[request_id] = task
+        task.add_done_callback(lambda _: self.ai_streams.pop(request_id, None))
+    
+    async def handle_ai_cancel(self, data):
+        """Stop a streamed AI answer (closes the provider connection)."""
+        task = self.ai_streams.get(str(data.get('request_id', '')))
+        if task:
+            task.cancel()
+    
+    async def stream_ai_answer(self, request_id, prompt, code, language):
+        """Relay an AI answer chunk by chunk: ai_stream_start, ai_stream_chunk..., ai_stream_end."""
+        from .ai_service import AIService, AIStreamError
+        started = time.monotonic()
+        first_token_ms = None
+        try:
+            service = AIService(await self.load_teacher_settings())
+            async for event in service.stream(prompt, code, language):
+                if event['type'] == 'start':
+                    await self.safe_send({
+                        'type': 'ai_stream_start',
+                        'request_id': request_id,
+                        'provider': event['provider'],
+                        'cached': event['cached']
+                    })
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = round((time.monotonic() - started) * 1000)
+                await self.safe_send({
+                    'type': 'ai_stream_chunk',
+                    'request_id': request_id,
+                    'text': event['text']
+                })
+            await self.safe_send({
+                'type': 'ai_stream_end',
+                'request_id': request_id,
+                'first_token_ms': first_token_ms,
+                'total_ms': round((time.monotonic() - started) * 1000)
+            })
+        except AIStreamError as e:
+            await self.safe_send({
+                'type': 'ai_stream_error',
+                'request_id': request_id,
+                'error': str(e),
+                'details': e.details
+            })
+        except Exception as e:
+            logger.error(f"AI stream failed: {e}")
+            await self.safe_send({
+                'type': 'ai_stream_error',
+                'request_id': request_id,
+                'error': 'AI request failed.'
+            })
     
     async def handle_teacher_edit(self, data):
         """Handle code edits from teacher."""
-        user_data = await self.get_user_data()
-        if not user_data or user_data['role'] != 'teacher':
+        identity = self.identity
+        if not identity or identity.role != 'teacher':
             await self.send_error('Only teachers can edit student code')
             return
         
@@ -190,12 +521,14 @@ class CodingConsumer(AsyncWebsocketConsumer):
         await self.save_code_for_student(student_id, code, language)
         
         # Send to specific student
-        await self.channel_layer.group_send(
+        await publish(
+            self.channel_layer,
+            self.session_code,
             f'user_{student_id}',
             {
                 'type': 'teacher_edit_received',
-                'teacher_id': user_data['id'],
-                'teacher_name': user_data['full_name'],
+                'teacher_id': identity.id,
+                'teacher_name': identity.full_name,
                 'code': code,
                 'language': language,
                 'cursor_position': cursor_position,
@@ -205,43 +538,66 @@ class CodingConsumer(AsyncWebsocketConsumer):
     
     async def handle_run_code(self, data):
         """Handle code execution request."""
-        user_data = await self.get_user_data()
-        if not user_data:
+        identity = self.identity
+        if not identity:
             return
         
         code = data.get('code', '')
         language = data.get('language', 'python')
         
-        # Execute code
-        result = await self.execute_code(code, language)
+        # Teachers should see the code that is about to run
+        await self.code_coalescer.flush()
+        
+        # Execute code (queued behind the execution scheduler)
+        try:
+            result = await self.execute_code(code, language)
+        except SchedulerBusy as e:
+            await self.safe_send({
+                'type': 'code_output',
+                'status': 'rejected',
+                'success': False,
+                'output': '',
+                'error': str(e),
+                'execution_time': 0,
+                'timestamp': datetime.now().isoformat()
+            })
+            return
+        
+        # Executor output is already capped; re-apply the cap to everything that
+        # leaves this consumer in case a result came from elsewhere
+        output = truncate_text(result.get('output', ''))
+        error = truncate_text(result.get('error', ''))
         
         # Save console log
         await self.save_console_log(
-            result['output'] if result['success'] else result['error'],
+            output if result['success'] else error,
             'output' if result['success'] else 'error'
         )
         
         # Send result back to user
         await self.send(text_data=json.dumps({
             'type': 'code_output',
+            'status': 'finished',
             'success': result['success'],
-            'output': result.get('output', ''),
-            'error': result.get('error', ''),
+            'output': output,
+            'error': error,
             'execution_time': result.get('execution_time', 0),
             'timestamp': datetime.now().isoformat()
         }))
         
-        # Broadcast to session for teachers
-        await self.channel_layer.group_send(
-            self.session_group_name,
+        # Broadcast to the session's teachers
+        await publish(
+            self.channel_layer,
+            self.session_code,
+            teachers_group_name(self.session_code),
             {
                 'type': 'student_output',
-                'student_id': user_data['id'],
-                'username': user_data['username'],
-                'full_name': user_data['full_name'],
+                'student_id': identity.id,
+                'username': identity.username,
+                'full_name': identity.full_name,
                 'success': result['success'],
-                'output': result.get('output', ''),
-                'error': result.get('error', ''),
+                'output': output,
+                'error': error,
                 'language': language,
                 'timestamp': datetime.now().isoformat()
             }
@@ -253,8 +609,8 @@ class CodingConsumer(AsyncWebsocketConsumer):
 
     async def handle_student_notification(self, data):
         """Handle manual notification from student."""
-        user_data = await self.get_user_data()
-        if not user_data:
+        identity = self.identity
+        if not identity:
             return
 
         message = data.get('message', 'Help requested')
@@ -263,13 +619,15 @@ class CodingConsumer(AsyncWebsocketConsumer):
         await self.create_error_notification(message)
         
         # Broadcast to teachers
-        await self.channel_layer.group_send(
-            self.session_group_name,
+        await publish(
+            self.channel_layer,
+            self.session_code,
+            teachers_group_name(self.session_code),
             {
                 'type': 'student_alert',
-                'student_id': user_data['id'],
-                'username': user_data['username'],
-                'full_name': user_data['full_name'],
+                'student_id': identity.id,
+                'username': identity.username,
+                'full_name': identity.full_name,
                 'message': message,
                 'timestamp': datetime.now().isoformat()
             }
@@ -277,51 +635,57 @@ class CodingConsumer(AsyncWebsocketConsumer):
     
     async def handle_request_control(self, data):
         """Handle teacher requesting control of student's editor."""
-        user_data = await self.get_user_data()
-        if not user_data or user_data['role'] != 'teacher':
+        identity = self.identity
+        if not identity or identity.role != 'teacher':
             return
         
         student_id = data.get('student_id')
         
-        await self.channel_layer.group_send(
+        await publish(
+            self.channel_layer,
+            self.session_code,
             f'user_{student_id}',
             {
                 'type': 'control_requested',
-                'teacher_id': user_data['id'],
-                'teacher_name': user_data['full_name'],
+                'teacher_id': identity.id,
+                'teacher_name': identity.full_name,
                 'timestamp': datetime.now().isoformat()
             }
         )
     
     async def handle_release_control(self, data):
         """Handle teacher releasing control."""
-        user_data = await self.get_user_data()
-        if not user_data or user_data['role'] != 'teacher':
+        identity = self.identity
+        if not identity or identity.role != 'teacher':
             return
         
         student_id = data.get('student_id')
         
-        await self.channel_layer.group_send(
+        await publish(
+            self.channel_layer,
+            self.session_code,
             f'user_{student_id}',
             {
                 'type': 'control_released',
-                'teacher_id': user_data['id'],
+                'teacher_id': identity.id,
                 'timestamp': datetime.now().isoformat()
             }
         )
     
     async def handle_heartbeat(self, data):
         """Handle heartbeat for activity tracking."""
-        user_data = await self.get_user_data()
-        if user_data and user_data['role'] == 'student':
-            await self.update_last_active()
+        identity = self.identity
+        if identity and identity.role == 'student':
+            # In-memory only unless the student had gone offline
+            if presence.touch(self.session_code, identity.id):
+                await self.update_connection_status(True)
             
-            # Broadcast activity status
+            # Broadcast activity status, unsequenced: heartbeats are not worth replaying
             await self.channel_layer.group_send(
-                self.session_group_name,
+                teachers_group_name(self.session_code),
                 {
                     'type': 'student_activity',
-                    'student_id': user_data['id'],
+                    'student_id': identity.id,
                     'status': 'active',
                     'timestamp': datetime.now().isoformat()
                 }
@@ -334,13 +698,28 @@ class CodingConsumer(AsyncWebsocketConsumer):
             'timestamp': datetime.now().isoformat()
         }))
     
+    async def send_queue_position(self, position):
+        """Tell the client where its run is in the execution queue."""
+        await self.safe_send({
+            'type': 'code_output',
+            'status': 'queued',
+            'queue_position': position,
+            'timestamp': datetime.now().isoformat()
+        })
+    
     # Safe send method to prevent "closed protocol" errors
     async def safe_send(self, data):
-        """Send data only if connection is still open."""
+        """Send data only if connection is still open (and not already replayed)."""
         if not getattr(self, 'is_connected', False):
             return
+        if 'seq' in data:
+            if data.get('seq_session', self.session_code) != self.session_code:
+                # Sequenced in another of the user's sessions: not part of this socket's stream
+                data = {key: value for key, value in data.items() if key not in ('seq', 'seq_session')}
+            elif data['seq'] <= getattr(self, 'resume_seq', 0):
+                return
         try:
-            await self.send(text_data=json.dumps(data))
+            await self.send(text_data=json.dumps(data, cls=DjangoJSONEncoder))
         except Exception as e:
             # Connection closed, ignore the error
             pass
@@ -357,19 +736,37 @@ class CodingConsumer(AsyncWebsocketConsumer):
     
     async def student_code_update(self, event):
         """Send student code update to teachers."""
-        user_data = await self.get_user_data()
-        if user_data and user_data['role'] == 'teacher':
-            await self.safe_send(event)
+        await self.safe_send(event)
+    
+    async def student_code_delta(self, event):
+        """Send student code delta to teachers."""
+        await self.safe_send(event)
+    
+    async def code_sync_requested(self, event):
+        """Reply to a teacher's resync request with this student's full buffer."""
+        if event['session_code'] != self.session_code or self.code_buffer is None:
+            return
+        identity = self.identity
+        if identity and identity.role == 'student':
+            # Send pending deltas first so they don't arrive after the snapshot
+            await self.code_coalescer.flush()
+            snapshot = self.build_code_snapshot_event(identity)
+            code_sync_meter.record(self.session_code, 'resync', len(json.dumps(snapshot)))
+            await self.channel_layer.send(event['reply_channel'], snapshot)
+    
+    async def code_flush_requested(self, event):
+        """The student ran or saved code over REST: send coalesced updates now."""
+        await self.code_coalescer.flush()
     
     async def teacher_edit_received(self, event):
         """Send teacher edit to student."""
+        # The teacher replaced the buffer; the client must resend it in full
+        self.code_buffer = None
         await self.safe_send(event)
     
     async def student_output(self, event):
         """Send student output to teachers."""
-        user_data = await self.get_user_data()
-        if user_data and user_data['role'] == 'teacher':
-            await self.safe_send(event)
+        await self.safe_send(event)
     
     async def control_requested(self, event):
         """Send control requested notification."""
@@ -381,24 +778,15 @@ class CodingConsumer(AsyncWebsocketConsumer):
     
     async def student_activity(self, event):
         """Send student activity update to teachers."""
-        # logger.debug(f"🔔 student_activity received: {event}")
-        user_data = await self.get_user_data()
-        # logger.debug(f"👤 User data: {user_data}")
-        if user_data and user_data['role'] == 'teacher':
-            # logger.debug(f"✅ Sending to teacher: {event}")
-            await self.safe_send(event)
+        await self.safe_send(event)
 
     async def student_alert(self, event):
         """Send student alert to teachers."""
-        user_data = await self.get_user_data()
-        if user_data and user_data['role'] == 'teacher':
-            await self.safe_send(event)
+        await self.safe_send(event)
     
     async def student_error(self, event):
         """Send student error notification to teachers."""
-        user_data = await self.get_user_data()
-        if user_data and user_data['role'] == 'teacher':
-            await self.safe_send(event)
+        await self.safe_send(event)
     
     # Helper methods
     
@@ -410,121 +798,101 @@ class CodingConsumer(AsyncWebsocketConsumer):
             'timestamp': datetime.now().isoformat()
         })
     
+    async def identity_changed(self, event):
+        """The user's profile changed: refresh the identity snapshot."""
+        user = await self.load_user()
+        identity = Identity.from_user(user)
+        if not identity:
+            await self.close(code=4001)
+            return
+        if identity.role != self.identity.role:
+            await self.channel_layer.group_discard(self.role_group_name, self.channel_name)
+            self.role_group_name = role_group_name(self.session_code, identity.role)
+            await self.channel_layer.group_add(self.role_group_name, self.channel_name)
+        self.scope['user'] = self.user = user
+        self.identity = identity
+    
     @database_sync_to_async
-    def get_user_data(self):
-        """Get current user data."""
-        user = self.scope.get('user')
-        if user and user.is_authenticated:
-            return {
-                'id': user.id,
-                'username': user.username,
-                'full_name': user.full_name or user.username,
-                'role': user.role
-            }
-        return None
+    def load_teacher_settings(self):
+        """AI settings of the connected teacher."""
+        from authentication.models import TeacherSettings
+        teacher_settings, _ = TeacherSettings.objects.get_or_create(user_id=self.identity.id)
+        return teacher_settings
     
     @database_sync_to_async
-    def update_connection_status(self, is_connected):
-        """Update participant connection status."""
-        from sessions.models import SessionParticipant, CodingSession
-        try:
-            session = CodingSession.objects.get(session_code=self.session_code)
-            participant = SessionParticipant.objects.filter(
-                session=session,
-                student=self.scope['user']
-            ).first()
-            if participant:
-                participant.is_connected = is_connected
-                participant.save()
-        except (CodingSession.DoesNotExist, Exception):
-            pass
+    def load_user(self):
+        """Reload the connected user from the database."""
+        return User.objects.filter(id=self.identity.id, is_active=True).first()
     
     @database_sync_to_async
-    def update_last_active(self):
-        """Update last active timestamp."""
-        from sessions.models import SessionParticipant, CodingSession
-        try:
-            session = CodingSession.objects.get(session_code=self.session_code)
-            SessionParticipant.objects.filter(
-                session=session,
-                student=self.scope['user']
-            ).update(last_active=datetime.now())
-        except Exception:
-            pass
+    def load_session_snapshot(self):
+        """Current state for a client that missed too much: the dashboard, or the student's code."""
+        from .live_code import live_code
+        if self.session is None:
+            return {}
+        if self.identity.role == 'teacher':
+            from sessions.dashboard import dashboard_students
+            return {'students': dashboard_students(self.session.id, self.session_code)}
+        current = live_code.get(self.session.id, self.identity.id)
+        return {
+            'code': current['code'] if current else '',
+            'language': current['language'] if current else 'python'
+        }
     
     @database_sync_to_async
-    def save_code_snapshot(self, code, language):
-        """Save code snapshot for current user."""
-        from sessions.models import CodeSnapshot, CodingSession
+    def update_connection_status(self, is_connected):
+        """Persist a presence transition to the participant row."""
         try:
-            session = CodingSession.objects.get(session_code=self.session_code)
-            snapshot, _ = CodeSnapshot.objects.get_or_create(
-                session=session,
-                student=self.scope['user']
-            )
-            snapshot.code_content = code
-            snapshot.language = language
-            snapshot.save()
-        except Exception:
-            pass
+            presence.persist(self.session_code, self.identity.id, is_connected)
+        except Exception as e:
+            logger.warning(f"Failed to update connection status: {e}")
     
     @database_sync_to_async
     def save_code_for_student(self, student_id, code, language):
         """Save code snapshot for a specific student."""
-        from sessions.models import CodeSnapshot, CodingSession
+        from .live_code import live_code
+        if self.session is None:
+            return
         try:
-            session = CodingSession.objects.get(session_code=self.session_code)
-            snapshot = CodeSnapshot.objects.filter(
-                session=session,
-                student_id=student_id
-            ).first()
-            if snapshot:
-                snapshot.code_content = code
-                snapshot.language = language
-                snapshot.save()
+            if live_code.get(self.session.id, int(student_id)) is not None:
+                live_code.put(self.session.id, int(student_id), code, language)
         except Exception:
             pass
     
-    @database_sync_to_async
-    def save_console_log(self, message, log_type):
-        """Save console log."""
-        from sessions.models import ConsoleLog, CodingSession
-        try:
-            session = CodingSession.objects.get(session_code=self.session_code)
-            ConsoleLog.objects.create(
-                session=session,
-                student=self.scope['user'],
-                log_type=log_type,
-                message=message
-            )
-        except Exception:
-            pass
+    async def save_console_log(self, message, log_type):
+        """Queue a console log row (written in batches off the request path)."""
+        from .log_writer import console_log_writer
+        if self.session is None:
+            return
+        console_log_writer.submit(
+            self.identity.id, log_type, truncate_text(message), session_id=self.session.id
+        )
     
     @database_sync_to_async
     def create_error_notification(self, error_message):
         """Create error notification for teacher."""
-        from sessions.models import ErrorNotification, CodingSession
+        from sessions.models import ErrorNotification
         import re
         
+        if self.session is None:
+            return None
         try:
-            session = CodingSession.objects.get(session_code=self.session_code)
-            
             # Try to parse line number from error
             line_match = re.search(r'line (\d+)', error_message, re.IGNORECASE)
             error_line = int(line_match.group(1)) if line_match else None
             
             ErrorNotification.objects.create(
-                session=session,
-                student=self.scope['user'],
+                session_id=self.session.id,
+                student_id=self.identity.id,
                 error_message=error_message,
                 error_line=error_line
             )
             
             # Broadcast error notification
             user_data = {
-                'id': self.scope['user'].id,
-                'username': self.scope['user'].username,
-                'full_name': self.scope['user'].full_name or self.scope['user'].username
+                'id': self.identity.id,
+                'username': self.identity.username,
+                'full_name': self.identity.full_name
             }
             
             return user_data
@@ -534,9 +902,11 @@ class CodingConsumer(AsyncWebsocketConsumer):
     
     async def execute_code(self, code, language):
         """Execute code in sandboxed environment."""
-        from .executor import CodeExecutor
-        executor = CodeExecutor()
-        return await database_sync_to_async(executor.execute)(code, language)
+        from .executor import get_executor
+        return await scheduler.run_async(
+            self.session_code, self.identity.id, get_executor().execute, code, language,
+            on_position=self.send_queue_position
+        )
 
 class InteractiveExecutionConsumer(AsyncWebsocketConsumer):
     """
@@ -552,6 +922,8 @@ class InteractiveExecutionConsumer(AsyncWebsocketConsumer):
         await self.accept()
         self.process = None
         self.files_to_cleanup = []
+        self.output_limit = get_output_limit()
+        self.output_limit_hit = False
 
     async def disconnect(self, close_code):
         if self.process:
@@ -608,7 +980,7 @@ class InteractiveExecutionConsumer(AsyncWebsocketConsumer):
             }))
 
     async def start_execution(self, code, language):
-        from .executor import CodeExecutor
+        from .executor import get_executor
         import asyncio
 
         if self.process:
@@ -619,11 +991,17 @@ class InteractiveExecutionConsumer(AsyncWebsocketConsumer):
 
 
         try:
-            executor = CodeExecutor()
-            # Directly await the async method, no database_sync_to_async needed
-            process, f1, f2 = await executor.start_async_interactive(code, language)
+            executor = get_executor()
+            # Hold an execution slot while compiling and spawning, so a class-wide
+            # stampede can't fork unbounded compilers
+            async with scheduler.slot(
+                f'personal_{self.user.id}', self.user.id, on_position=self.send_queue_position
+            ):
+                # Directly await the async method, no database_sync_to_async needed
+                process, f1, f2 = await executor.start_async_interactive(code, language)
             
             self.process = process
+            self.output_limit_hit = False
             if f1: self.files_to_cleanup.append(f1)
             if f2: self.files_to_cleanup.append(f2)
 
@@ -645,11 +1023,15 @@ class InteractiveExecutionConsumer(AsyncWebsocketConsumer):
                 # Wait for output to be fully read
                 await asyncio.gather(stdout_task, stderr_task)
 
-                await self.send(text_data=json.dumps({
+                finished = {
                     "type": "status",
                     "status": "finished",
                     "exit_code": return_code
-                }))
+                }
+                if self.output_limit_hit:
+                    finished["output_limit"] = True
+                    finished["message"] = "Program stopped: it produced far more output than the console can show"
+                await self.send(text_data=json.dumps(finished))
             except asyncio.TimeoutError:
                 # Kill process group to ensure child processes are terminated
                 try:
@@ -672,29 +1054,116 @@ class InteractiveExecutionConsumer(AsyncWebsocketConsumer):
             }))
 
     async def read_stream(self, stream, stream_type):
-        """Read data from a stream and send it to websocket."""
+        """
+        Read a process stream and forward it to the websocket in coalesced frames.
+        
+        Output is read in large chunks and buffered for at most STREAM_FLUSH_INTERVAL
+        seconds or STREAM_FRAME_BYTES bytes per frame, so a chatty program sends a
+        handful of frames instead of one per byte. StreamReader.read() returns as
+        soon as any data is available, so an input() prompt without a trailing
+        newline still reaches the client within one flush interval.
+        
+        Like every execution path, each stream is capped at the output limit: the
+        first half is streamed live, only the last half of the rest is kept and
+        sent (after a truncation marker) when the stream ends. A program that
+        keeps printing far past the limit is stopped.
+        """
+        loop = asyncio.get_running_loop()
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        live_limit = self.output_limit - self.output_limit // 2
+        overflow = HeadTailBuffer(self.output_limit // 2, head_limit=0)
+        streamed = 0
+        runaway = False
+        pending = []
+        pending_size = 0
+        flush_at = None
+
+        async def send_text(text):
+            await self.send(text_data=json.dumps({
+                "type": "output",
+                "stream": stream_type,
+                "data": text
+            }))
+
+        async def flush():
+            nonlocal pending, pending_size, flush_at
+            if pending:
+                await send_text(''.join(pending))
+            pending, pending_size, flush_at = [], 0, None
+
         try:
             while True:
-                # Read 1 byte at a time for responsiveness
-                # StreamReader.read(n) is a coroutine
-                chunk = await stream.read(1)
+                try:
+                    if flush_at is None:
+                        chunk = await stream.read(STREAM_FRAME_BYTES)
+                    else:
+                        chunk = await asyncio.wait_for(
+                            stream.read(STREAM_FRAME_BYTES), max(0, flush_at - loop.time())
+                        )
+                except asyncio.TimeoutError:
+                    await flush()
+                    continue
+                
                 if not chunk:
                     break
                 
-                # Decode bytes to string, replacing errors
-                decoded_chunk = chunk.decode('utf-8', errors='replace')
+                # Past the live head, only keep the tail
+                live = chunk[:max(live_limit - streamed, 0)]
+                streamed += len(live)
+                if len(live) < len(chunk):
+                    overflow.write(chunk[len(live):])
                 
-
-
-                await self.send(text_data=json.dumps({
-                    "type": "output",
-                    "stream": stream_type,
-                    "data": decoded_chunk
-                }))
+                # Incremental decoding keeps multi-byte characters split across reads intact
+                text = decoder.decode(live, final=streamed >= live_limit)
+                if text:
+                    pending.append(text)
+                    pending_size += len(live)
+                    if flush_at is None:
+                        flush_at = loop.time() + STREAM_FLUSH_INTERVAL
+                if pending_size >= STREAM_FRAME_BYTES:
+                    await flush()
+                
+                if overflow.total > self.output_limit * STREAM_RUNAWAY_FACTOR:
+                    runaway = True
+                    break
+            
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                pending.append(tail)
+            await flush()
+            if overflow.total:
+                await send_text(overflow.getvalue())
+            if runaway:
+                await self.stop_for_output_limit()
         except Exception as e:
-            # print(f"DEBUG: Error reading stream {stream_type}: {e}")
+            # Socket closed or process killed mid-read
             pass
 
+    async def stop_for_output_limit(self):
+        """
+        Kill the running program once it has produced too much output. The
+        client is told through the ``finished`` status start_execution sends
+        when the process exits, flagged with ``output_limit``.
+        """
+        if self.output_limit_hit:
+            return
+        self.output_limit_hit = True
+        if self.process:
+            try:
+                os.killpg(os.getpgid(self.process.pid), signal.SIGKILL)
+            except Exception:
+                try:
+                    self.process.kill()
+                except Exception:
+                    pass
+
+    async def send_queue_position(self, position):
+        await self.send(text_data=json.dumps({
+            "type": "status",
+            "status": "queued",
+            "queue_position": position
+        }))
+
     async def send_input(self, input_text):
         if self.process and self.process.stdin:
             try:
@@ -9,33 +9,115 @@ import os
 import asyncio
 import shutil
 import resource
+import threading
+import logging
 from django.conf import settings
+from .warm_pool import WarmPool, PythonWorker, NodeWorker
+from .compile_cache import compile_cache
+from .output_limits import run_captured, truncate_text
+
+logger = logging.getLogger(__name__)
+
+
+# Toolchain commands probed once per worker: (name, argv)
+TOOLCHAIN_COMMANDS = [
+    ('python3', ['python3', '--version']),
+    ('gcc', ['gcc', '--version']),
+    ('g++', ['g++', '--version']),
+    ('node', ['node', '--version']),
+    ('javac', ['javac', '-version']),
+    ('java', ['java', '-version']),
+]
+
+
+def _probe_version(argv):
+    """Return the first line of a version command's output, or None if unavailable."""
+    try:
+        result = subprocess.run(argv, capture_output=True, text=True, timeout=2)
+    except (FileNotFoundError, PermissionError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    # javac/java print their version on stderr
+    output = (result.stdout or result.stderr or '').strip()
+    return output.splitlines()[0] if output else ''
+
+
+def probe_toolchain():
+    """
+    Probe the container runtime and language toolchains available on this host.
+    
+    Returns:
+        dict with keys: container_runtime, versions, probe_time
+    """
+    start_time = time.perf_counter()
+    
+    container_runtime = None
+    for cmd in ['podman', 'docker']:
+        if _probe_version([cmd, '--version']) is not None:
+            container_runtime = cmd
+            break
+    
+    versions = {name: _probe_version(argv) for name, argv in TOOLCHAIN_COMMANDS}
+    
+    return {
+        'container_runtime': container_runtime,
+        'versions': versions,
+        'probe_time': round(time.perf_counter() - start_time, 3),
+    }
+
+
+# Compiler per compiled language (also the toolchain version used in cache keys)
+COMPILERS = {'c': 'gcc', 'cpp': 'g++', 'java': 'javac'}
 
 
 class CodeExecutor:
     """
     Executes code in a sandboxed environment with timeout and memory limits.
     Supports both native execution and container-based sandboxing (Docker/Podman).
+    
+    Instances hold no per-run state, so one executor can be shared by every
+    request and consumer in the process (see get_executor()).
     """
     
     SUPPORTED_LANGUAGES = ['python', 'javascript', 'c', 'cpp', 'java']
     
-    def __init__(self):
+    def __init__(self, toolchain=None):
         self.timeout = getattr(settings, 'CODE_EXECUTION_TIMEOUT', 10)
         self.memory_limit = getattr(settings, 'CODE_EXECUTION_MEMORY_LIMIT', 50 * 1024 * 1024)  # 50MB
-        self.use_container = self._detect_container_runtime()
+        self.warm_pools = {}
+        self.apply_toolchain(toolchain if toolchain is not None else probe_toolchain())
+    
+    def apply_toolchain(self, toolchain):
+        """Adopt the result of a toolchain probe."""
+        self.toolchain = toolchain
+        self.use_container = toolchain['container_runtime']
         self.container_cmd = self._get_container_command()
     
+    def start_warm_pools(self):
+        """Pre-spawn warm Python/Node workers (CODE_EXECUTION_WARM_POOL_SIZE per language)."""
+        size = getattr(settings, 'CODE_EXECUTION_WARM_POOL_SIZE', 2)
+        max_runs = getattr(settings, 'CODE_EXECUTION_WARM_POOL_MAX_RUNS', 50)
+        if size <= 0:
+            return
+        
+        worker_classes = {'python': ('python3', PythonWorker), 'javascript': ('node', NodeWorker)}
+        for language, (interpreter, worker_class) in worker_classes.items():
+            if language in self.warm_pools or self.toolchain['versions'].get(interpreter) is None:
+                continue
+            # Fork servers fork once per run, so the process and CPU caps are applied to each child instead
+            pool = WarmPool(
+                worker_class, size, max_runs,
+                preexec_fn=self._set_resource_limits(
+                    limit_processes=not worker_class.reusable, limit_cpu=not worker_class.reusable
+                )
+            )
+            pool.start()
+            self.warm_pools[language] = pool
+    
     def _detect_container_runtime(self):
         """Detect if Docker or Podman is available."""
-        for cmd in ['podman', 'docker']:
-            try:
-                result = subprocess.run([cmd, '--version'], capture_output=True, timeout=2)
-                if result.returncode == 0:
-                    return cmd
-            except (FileNotFoundError, subprocess.TimeoutExpired):
-                continue
-        return None
+        return self.toolchain['container_runtime']
     
     def _get_container_command(self):
         """Get the container runtime command."""
@@ -53,22 +135,72 @@ class CodeExecutor:
             '--security-opt', 'no-new-privileges',  # Prevent privilege escalation
         ]
     
-    def _set_resource_limits(self):
+    def _set_resource_limits(self, limit_processes=True, limit_cpu=True):
         """Set resource limits for subprocess (Linux only)."""
         def limit_resources():
             try:
                 # Set memory limit (RLIMIT_AS = address space)
                 resource.setrlimit(resource.RLIMIT_AS, (self.memory_limit, self.memory_limit))
                 # Set CPU time limit
-                resource.setrlimit(resource.RLIMIT_CPU, (self.timeout, self.timeout))
+                if limit_cpu:
+                    resource.setrlimit(resource.RLIMIT_CPU, (self.timeout, self.timeout))
                 # Set file size limit (10MB)
                 resource.setrlimit(resource.RLIMIT_FSIZE, (10 * 1024 * 1024, 10 * 1024 * 1024))
                 # Set number of processes limit
-                resource.setrlimit(resource.RLIMIT_NPROC, (10, 10))
+                if limit_processes:
+                    resource.setrlimit(resource.RLIMIT_NPROC, (10, 10))
             except Exception:
                 pass  # Not on Linux or limits not supported
         return limit_resources
     
+    def _compile(self, language, code, source_file, output_path, timeout):
+        """
+        Compile a C/C++/Java source, skipping the compiler on a compile cache hit.
+        
+        Args:
+            output_path: binary path for C/C++, class directory for Java
+        
+        Returns:
+            subprocess.CompletedProcess (returncode 0 with empty output on a hit)
+        """
+        compiler = COMPILERS[language]
+        if language == 'java':
+            command = [compiler, source_file]
+            cwd = output_path
+        else:
+            command = [compiler, source_file, '-o', output_path]
+            cwd = tempfile.gettempdir()
+        
+        # Temp file names vary per run, so they are left out of the key
+        key = compile_cache.key(language, code, [compiler], self.toolchain['versions'].get(compiler))
+        if language == 'java':
+            hit = compile_cache.restore(key, output_path)
+        else:
+            hit = compile_cache.restore(
+                key, os.path.dirname(output_path), rename={'program': os.path.basename(output_path)}
+            )
+        if hit:
+            return subprocess.CompletedProcess(command, 0, '', '')
+        
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout, cwd=cwd)
+        result.stderr = truncate_text(result.stderr)
+        if result.returncode == 0:
+            if language == 'java':
+                artifacts = {
+                    name: os.path.join(output_path, name)
+                    for name in os.listdir(output_path) if name.endswith('.class')
+                }
+            else:
+                artifacts = {'program': output_path}
+            compile_cache.store(key, artifacts)
+        return result
+    
+    async def _compile_async(self, language, code, source_file, output_path):
+        """Compile off the event loop; raises CalledProcessError on failure."""
+        result = await asyncio.to_thread(self._compile, language, code, source_file, output_path, 10)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+    
     def execute(self, code, language):
         """
         Execute code and return result.
@@ -158,8 +290,8 @@ class CodeExecutor:
         
         output_file = source_file.replace('.c', '')
         
-        # Compile first (run_in_executor to avoid blocking event loop)
-        await asyncio.to_thread(subprocess.run, ['gcc', source_file, '-o', output_file], check=True, timeout=10)
+        # Compile first (in a thread to avoid blocking event loop)
+        await self._compile_async('c', code, source_file, output_file)
         
         process = await asyncio.create_subprocess_exec(
             output_file,
@@ -180,7 +312,7 @@ class CodeExecutor:
         output_file = source_file.replace('.cpp', '')
         
         # Compile
-        await asyncio.to_thread(subprocess.run, ['g++', source_file, '-o', output_file], check=True, timeout=10)
+        await self._compile_async('cpp', code, source_file, output_file)
         
         process = await asyncio.create_subprocess_exec(
             output_file,
@@ -208,7 +340,7 @@ class CodeExecutor:
             f.write(code)
             
         # Compile
-        await asyncio.to_thread(subprocess.run, ['javac', source_file], check=True, timeout=10, cwd=temp_dir)
+        await self._compile_async('java', code, source_file, temp_dir)
         
         process = await asyncio.create_subprocess_exec(
             'java', class_name,
@@ -221,8 +353,68 @@ class CodeExecutor:
         )
         return process, temp_dir, None
     
+    def _execute_warm(self, language, code):
+        """
+        Run code on a warm pooled worker.
+        
+        Returns the result dict, or None when no warm worker is ready and the
+        caller should use the cold path.
+        """
+        pool = self.warm_pools.get(language)
+        worker = pool.acquire() if pool else None
+        if worker is None:
+            return None
+        
+        start_time = time.time()
+        try:
+            outcome = worker.run(code, self.timeout)
+        except TimeoutError:
+            pool.release(worker, healthy=False)
+            return {
+                'success': False,
+                'error': f'Execution timeout ({self.timeout}s exceeded).',
+                'execution_time': self.timeout
+            }
+        except Exception as e:
+            pool.release(worker, healthy=False)
+            if not worker.program_started:
+                logger.warning(f"Warm {language} worker failed, falling back to cold start: {e}")
+                return None
+            # Running it again cold would repeat its side effects and output
+            logger.warning(f"Warm {language} worker failed mid-run: {e}")
+            return {
+                'success': False,
+                'error': 'Execution failed: the runner stopped while running your program. Please run it again.',
+                'execution_time': round(time.time() - start_time, 3)
+            }
+        
+        pool.release(worker, healthy=not outcome['timed_out'])
+        execution_time = time.time() - start_time
+        
+        if outcome['timed_out']:
+            return {
+                'success': False,
+                'error': f'Execution timeout ({self.timeout}s exceeded).\nOutput before timeout:\n{outcome["stdout"]}\nError:\n{outcome["stderr"]}',
+                'execution_time': self.timeout
+            }
+        if outcome['returncode'] == 0:
+            return {
+                'success': True,
+                'output': outcome['stdout'] or '(No output)',
+                'execution_time': round(execution_time, 3)
+            }
+        return {
+            'success': False,
+            'error': outcome['stderr'] or 'Unknown error',
+            'execution_time': round(execution_time, 3)
+        }
+    
     def _execute_python(self, code):
         """Execute Python code."""
+        warm_result = self._execute_warm('python', code)
+        if warm_result is not None:
+            return warm_result
+        
         start_time = time.time()
         
         # Create temporary file
@@ -232,10 +424,8 @@ class CodeExecutor:
         
         try:
             # Run with timeout and resource limits
-            result = subprocess.run(
+            result = run_captured(
                 ['python3', temp_file],
-                capture_output=True,
-                text=True,
                 timeout=self.timeout,
                 cwd=tempfile.gettempdir(),
                 preexec_fn=self._set_resource_limits()
@@ -279,6 +469,10 @@ class CodeExecutor:
     
     def _execute_javascript(self, code):
         """Execute JavaScript code using Node.js."""
+        warm_result = self._execute_warm('javascript', code)
+        if warm_result is not None:
+            return warm_result
+        
         start_time = time.time()
         
         # Create temporary file
@@ -288,10 +482,8 @@ class CodeExecutor:
         
         try:
             # Run with timeout and resource limits
-            result = subprocess.run(
+            result = run_captured(
                 ['node', temp_file],
-                capture_output=True,
-                text=True,
                 timeout=self.timeout,
                 cwd=tempfile.gettempdir(),
                 preexec_fn=self._set_resource_limits()
@@ -353,13 +545,7 @@ class CodeExecutor:
         
         try:
             # Compile the C code
-            compile_result = subprocess.run(
-                ['gcc', source_file, '-o', output_file],
-                capture_output=True,
-                text=True,
-                timeout=self.timeout,
-                cwd=tempfile.gettempdir()
-            )
+            compile_result = self._compile('c', code, source_file, output_file, self.timeout)
             
             if compile_result.returncode != 0:
                 return {
@@ -369,10 +555,8 @@ class CodeExecutor:
                 }
             
             # Run the compiled binary with resource limits
-            result = subprocess.run(
+            result = run_captured(
                 [output_file],
-                capture_output=True,
-                text=True,
                 timeout=self.timeout,
                 cwd=tempfile.gettempdir(),
                 preexec_fn=self._set_resource_limits()
@@ -438,13 +622,7 @@ class CodeExecutor:
         
         try:
             # Compile the C++ code
-            compile_result = subprocess.run(
-                ['g++', source_file, '-o', output_file],
-                capture_output=True,
-                text=True,
-                timeout=self.timeout,
-                cwd=tempfile.gettempdir()
-            )
+            compile_result = self._compile('cpp', code, source_file, output_file, self.timeout)
             
             if compile_result.returncode != 0:
                 return {
@@ -454,10 +632,8 @@ class CodeExecutor:
                 }
             
             # Run the compiled binary with resource limits
-            result = subprocess.run(
+            result = run_captured(
                 [output_file],
-                capture_output=True,
-                text=True,
                 timeout=self.timeout,
                 cwd=tempfile.gettempdir(),
                 preexec_fn=self._set_resource_limits()
@@ -539,13 +715,7 @@ class CodeExecutor:
                 f.write(code)
             
             # Compile the Java code
-            compile_result = subprocess.run(
-                ['javac', source_file],
-                capture_output=True,
-                text=True,
-                timeout=self.timeout,
-                cwd=temp_dir
-            )
+            compile_result = self._compile('java', code, source_file, temp_dir, self.timeout)
             
             if compile_result.returncode != 0:
                 return {
@@ -555,10 +725,8 @@ class CodeExecutor:
                 }
             
             # Run the compiled Java class with resource limits
-            result = subprocess.run(
+            result = run_captured(
                 ['java', class_name],
-                capture_output=True,
-                text=True,
                 timeout=self.timeout,
                 cwd=temp_dir,
                 preexec_fn=self._set_resource_limits()
@@ -607,5 +775,88 @@ class CodeExecutor:
                 pass
 
 
-# Singleton instance
-executor = CodeExecutor()
+class ExecutorRegistry:
+    """
+    Process-wide cache of the toolchain probe and the shared CodeExecutor.
+    
+    The probe forks one process per tool, so it runs once per worker instead of
+    once per execution. Set CODE_EXECUTION_TOOLCHAIN_REPROBE_INTERVAL (seconds)
+    to re-probe periodically, e.g. after installing a compiler on a live host.
+    Re-probes run in a background thread (callers may be on the event loop);
+    the previous probe is served until the new one is swapped in.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._toolchain = None
+        self._probed_at = 0.0
+        self._reprobing = False
+    
+    def _is_stale(self):
+        interval = getattr(settings, 'CODE_EXECUTION_TOOLCHAIN_REPROBE_INTERVAL', 0)
+        return bool(interval) and time.monotonic() - self._probed_at > interval
+    
+    def get_toolchain(self):
+        """Return the cached toolchain probe, probing on first use (re-probing in the background when stale)."""
+        with self._lock:
+            if self._toolchain is None:
+                self._adopt(probe_toolchain())
+            elif self._is_stale() and not self._reprobing:
+                self._reprobing = True
+                threading.Thread(target=self._reprobe, name='toolchain-reprobe', daemon=True).start()
+            return self._toolchain
+    
+    def _reprobe(self):
+        try:
+            toolchain = probe_toolchain()
+        except Exception as e:
+            logger.error(f"Toolchain re-probe failed: {e}")
+            toolchain = None
+        with self._lock:
+            self._reprobing = False
+            if toolchain is not None:
+                self._adopt(toolchain)
+            else:
+                # Keep the previous probe until the next interval
+                self._probed_at = time.monotonic()
+    
+    def _adopt(self, toolchain):
+        """Swap in a new probe result (lock held)."""
+        self._toolchain = toolchain
+        self._probed_at = time.monotonic()
+        available = [name for name, version in toolchain['versions'].items() if version is not None]
+        logger.info(
+            f"Toolchain probe took {toolchain['probe_time']}s "
+            f"(container runtime: {toolchain['container_runtime'] or 'none'}, "
+            f"available: {', '.join(available) or 'none'})"
+        )
+        if self._executor is not None:
+            self._executor.apply_toolchain(toolchain)
+    
+    def get_executor(self):
+        """Return the shared CodeExecutor for this process."""
+        toolchain = self.get_toolchain()
+        with self._lock:
+            if self._executor is None:
+                self._executor = CodeExecutor(toolchain=toolchain)
+                self._executor.start_warm_pools()
+            return self._executor
+    
+    def reset(self):
+        """Drop the cached probe and executor; the next call probes again."""
+        with self._lock:
+            if self._executor is not None:
+                for pool in self._executor.warm_pools.values():
+                    pool.shutdown()
+            self._executor = None
+            self._toolchain = None
+            self._probed_at = 0.0
+
+
+executor_registry = ExecutorRegistry()
+
+
+def get_executor():
+    """Return the process-wide shared CodeExecutor."""
+    return executor_registry.get_executor()
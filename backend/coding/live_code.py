@@ -0,0 +1,269 @@
+"""
+Live code state for every (session, student), held in memory with
+write-behind to CodeSnapshot.
+
+Auto-saves, runs and teacher edits update the in-memory entry only; reads
+(GetMyCodeView, the teacher dashboard, StudentCodeView) are served from it.
+A background thread upserts changed entries into CodeSnapshot every
+LIVE_CODE_FLUSH_INTERVAL seconds in one batched statement, and a session's
+entries are flushed immediately when the session ends.
+
+Crash recovery: the database lags memory by at most one flush interval. A
+clean shutdown flushes everything (atexit); if the process is killed, edits
+made since the last flush are lost and students fall back to the last
+flushed snapshot (their editor still holds the text and re-saves it on the
+next change). A failed flush keeps entries dirty and is retried on the next
+tick.
+
+The store is per process, so it assumes one ASGI process serves a session,
+which is how the app is deployed (a single Daphne). For multi-process
+deployments set LIVE_CODE_FLUSH_INTERVAL = 0, which turns the store into a
+write-through pass to the database.
+"""
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LiveCode:
+    """Latest code of one student in one session."""
+
+    __slots__ = ('code', 'language', 'version', 'flushed_version', 'updated_at', 'last_access')
+
+    def __init__(self, code, language, version=0, updated_at=None):
+        self.code = code
+        self.language = language
+        self.version = version
+        self.flushed_version = version
+        self.updated_at = updated_at or timezone.now()
+        self.last_access = time.monotonic()
+
+    @property
+    def dirty(self):
+        return self.version > self.flushed_version
+
+
+class LiveCodeStore:
+    """Process-wide map of (session_id, student_id) -> LiveCode with write-behind."""
+
+    def __init__(self, flush_interval=None, idle_ttl=None):
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(
+            settings, 'LIVE_CODE_FLUSH_INTERVAL', 5
+        )
+        # Clean entries untouched for this long are dropped from memory
+        self.idle_ttl = idle_ttl if idle_ttl is not None else getattr(settings, 'LIVE_CODE_IDLE_TTL', 3600)
+        self.flushes = 0
+        self.rows_written = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.flush_interval > 0
+
+    def put(self, session_id, student_id, code, language):
+        """Record a student's latest code. Returns True if the store had no entry yet."""
+        if not self.enabled:
+            from sessions.models import CodeSnapshot
+            _, created = CodeSnapshot.objects.update_or_create(
+                session_id=session_id, student_id=student_id,
+                defaults={'code_content': code, 'language': language}
+            )
+            return created
+
+        with self._lock:
+            entry = self._entries.get((session_id, student_id))
+            created = entry is None
+            if created:
+                entry = self._entries[(session_id, student_id)] = LiveCode(code, language)
+            entry.code = code
+            entry.language = language
+            entry.version += 1
+            entry.updated_at = timezone.now()
+            entry.last_access = time.monotonic()
+        self._start_flusher()
+        return created
+
+    def get(self, session_id, student_id):
+        """
+        Latest {code, language, updated_at} for a student, loading it from
+        CodeSnapshot on a miss. Returns None if the student has no code.
+        """
+        if self.enabled:
+            with self._lock:
+                entry = self._entries.get((session_id, student_id))
+                if entry is not None:
+                    self.hits += 1
+                    entry.last_access = time.monotonic()
+                    return self._as_dict(entry)
+                self.misses += 1
+
+        from sessions.models import CodeSnapshot
+        snapshot = CodeSnapshot.objects.filter(
+            session_id=session_id, student_id=student_id
+        ).only('code_content', 'language', 'updated_at').first()
+        if snapshot is None:
+            return None
+        if self.enabled:
+            with self._lock:
+                # A put() may have raced the query; it wins
+                entry = self._entries.setdefault(
+                    (session_id, student_id),
+                    LiveCode(snapshot.code_content, snapshot.language, updated_at=snapshot.updated_at)
+                )
+                return self._as_dict(entry)
+        return {
+            'code': snapshot.code_content,
+            'language': snapshot.language,
+            'updated_at': snapshot.updated_at,
+        }
+
+    def session_entries(self, session_id):
+        """{student_id: {code, language, updated_at}} for a session's entries held in memory."""
+        with self._lock:
+            return {
+                student_id: self._as_dict(entry)
+                for (entry_session_id, student_id), entry in self._entries.items()
+                if entry_session_id == session_id
+            }
+
+    def flush(self, session_id=None):
+        """Write dirty entries (optionally of one session) to CodeSnapshot. Returns rows written."""
+        if not self.enabled:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                dirty = [
+                    (key, entry.code, entry.language, entry.version)
+                    for key, entry in self._entries.items()
+                    if entry.dirty and (session_id is None or key[0] == session_id)
+                ]
+            if not dirty:
+                return 0
+
+            written = self._write(dirty)
+
+            with self._lock:
+                for key, _, _, version in written:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        entry.flushed_version = max(entry.flushed_version, version)
+                self.flushes += 1
+                self.rows_written += len(written)
+            return len(written)
+
+    def forget_session(self, session_id):
+        """Drop a session's entries after its final flush."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == session_id]:
+                if not self._entries[key].dirty:
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'dirty': sum(1 for entry in self._entries.values() if entry.dirty),
+                'hits': self.hits,
+                'misses': self.misses,
+                'flushes': self.flushes,
+                'rows_written': self.rows_written,
+                'flush_interval': self.flush_interval,
+            }
+
+    def _write(self, dirty):
+        """Upsert rows in one statement; fall back to row by row so one bad row can't wedge the rest."""
+        from sessions.models import CodeSnapshot
+        now = timezone.now()
+        snapshots = [
+            CodeSnapshot(
+                session_id=session_id, student_id=student_id,
+                code_content=code, language=language, updated_at=now
+            )
+            for (session_id, student_id), code, language, _ in dirty
+        ]
+        try:
+            CodeSnapshot.objects.bulk_create(
+                snapshots,
+                update_conflicts=True,
+                unique_fields=['session', 'student'],
+                update_fields=['code_content', 'language', 'updated_at'],
+                batch_size=500
+            )
+            return dirty
+        except IntegrityError as e:
+            logger.warning(f"Batched live code flush failed, retrying row by row: {e}")
+        except DatabaseError as e:
+            # Database unreachable or connection lost: everything stays dirty for the next tick
+            logger.warning(f"Live code flush of {len(dirty)} entries failed, will retry: {e}")
+            return []
+
+        written = []
+        for item in dirty:
+            (session_id, student_id), code, language, _ = item
+            try:
+                CodeSnapshot.objects.update_or_create(
+                    session_id=session_id, student_id=student_id,
+                    defaults={'code_content': code, 'language': language}
+                )
+                written.append(item)
+            except IntegrityError as e:
+                # Session or student deleted: nothing left to save it to
+                logger.warning(f"Dropping live code for session {session_id}, student {student_id}: {e}")
+                with self._lock:
+                    self._entries.pop((session_id, student_id), None)
+            except DatabaseError as e:
+                # The connection failed, not this row: the rest would fail too
+                logger.warning(f"Live code flush stopped after {len(written)} rows, will retry: {e}")
+                break
+        return written
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            for key in [key for key, entry in self._entries.items()
+                        if not entry.dirty and entry.last_access < cutoff]:
+                del self._entries[key]
+
+    def _start_flusher(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='live-code-flush', daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                self._evict_idle()
+            except Exception as e:
+                logger.error(f"Live code flush failed: {e}")
+            finally:
+                # This thread's connection would otherwise live forever
+                connection.close()
+
+    @staticmethod
+    def _as_dict(entry):
+        return {
+            'code': entry.code,
+            'language': entry.language,
+            'updated_at': entry.updated_at,
+        }
+
+
+live_code = LiveCodeStore()
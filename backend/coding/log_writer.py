@@ -0,0 +1,172 @@
+"""
+Buffered, batched ConsoleLog writer.
+
+Execution paths hand their console log entry to ``console_log_writer.submit``
+and return immediately; a background thread inserts queued entries with one
+``bulk_create`` per batch, as soon as CONSOLE_LOG_BATCH_SIZE entries are
+waiting or CONSOLE_LOG_FLUSH_INTERVAL seconds have passed. Rows get their
+created_at when the batch is written, so timestamps may lag the run by up to
+one flush interval (order within a batch is preserved).
+
+The queue is bounded by CONSOLE_LOG_QUEUE_SIZE entries and by
+CONSOLE_LOG_QUEUE_BYTES of message text, since a single message can be
+hundreds of kilobytes. When the database is slow or down and the queue fills
+up, the oldest entries are dropped to make room
+(drop-oldest: the newest output is what teachers look at) and counted in
+``stats()['dropped']``. A failed batch goes back to the front of the queue and
+is retried after a back-off. Remaining entries are flushed at interpreter exit.
+"""
+import atexit
+import collections
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection
+
+logger = logging.getLogger(__name__)
+
+
+class ConsoleLogWriter:
+    """Bounded queue of ConsoleLog rows drained by a background thread."""
+
+    drop_policy = 'drop-oldest'
+
+    def __init__(self, batch_size=None, flush_interval=None, max_queue=None, max_bytes=None):
+        self.batch_size = batch_size or getattr(settings, 'CONSOLE_LOG_BATCH_SIZE', 200)
+        self.flush_interval = flush_interval or getattr(settings, 'CONSOLE_LOG_FLUSH_INTERVAL', 1.0)
+        self.max_queue = max_queue or getattr(settings, 'CONSOLE_LOG_QUEUE_SIZE', 10000)
+        self.max_bytes = max_bytes or getattr(settings, 'CONSOLE_LOG_QUEUE_BYTES', 64 * 1024 * 1024)
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self._queue = collections.deque()  # (session_id, student_id, log_type, message)
+        self._queued_bytes = 0
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, student_id, log_type, message, session_id):
+        """Queue a log entry. Never blocks."""
+        with self._condition:
+            while self._queue and (
+                len(self._queue) >= self.max_queue or self._queued_bytes + len(message) > self.max_bytes
+            ):
+                self._queued_bytes -= len(self._queue.popleft()[3])
+                self.dropped += 1
+            self._queue.append((session_id, student_id, log_type, message))
+            self._queued_bytes += len(message)
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify()
+        self._start()
+
+    def flush(self):
+        """Write everything queued so far (used at shutdown)."""
+        while self._write_batch():
+            pass
+
+    def stats(self):
+        with self._condition:
+            return {
+                'queue_depth': len(self._queue),
+                'queue_bytes': self._queued_bytes,
+                'max_queue': self.max_queue,
+                'max_bytes': self.max_bytes,
+                'drop_policy': self.drop_policy,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches,
+                'failed_batches': self.failed_batches,
+            }
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='console-log-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._queue) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+            try:
+                ok = True
+                while ok and self._queue:
+                    ok = self._write_batch()
+                if not ok:
+                    # Give a struggling database some room before retrying
+                    time.sleep(min(self.flush_interval * 5, 30))
+            except Exception as e:
+                logger.error(f"Console log writer error: {e}")
+            finally:
+                connection.close()
+
+    def _write_batch(self):
+        """Insert up to batch_size queued entries. Returns False if nothing was written."""
+        with self._flush_lock:
+            with self._condition:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._queued_bytes -= sum(len(entry[3]) for entry in batch)
+            if not batch:
+                return False
+            try:
+                rows = self._build_rows(batch)
+                from sessions.models import ConsoleLog
+                try:
+                    ConsoleLog.objects.bulk_create(rows)
+                except IntegrityError:
+                    # A session or student was deleted meanwhile: keep the rest
+                    rows = self._insert_each(rows)
+            except DatabaseError as e:
+                logger.warning(f"Console log batch of {len(batch)} failed, will retry: {e}")
+                with self._condition:
+                    self.failed_batches += 1
+                    self._requeue(batch)
+                return False
+            with self._condition:
+                self.written += len(rows)
+                self.batches += 1
+            return True
+
+    def _requeue(self, batch):
+        """Put a failed batch back at the front, still within both bounds (lock held)."""
+        size = sum(len(entry[3]) for entry in batch)
+        start = 0
+        # The batch is older than anything queued since, so it is trimmed first
+        while start < len(batch) and (
+            len(self._queue) + len(batch) - start > self.max_queue
+            or self._queued_bytes + size > self.max_bytes
+        ):
+            size -= len(batch[start][3])
+            start += 1
+        self.dropped += start
+        self._queue.extendleft(reversed(batch[start:]))
+        self._queued_bytes += size
+
+    def _insert_each(self, rows):
+        inserted = []
+        for row in rows:
+            try:
+                row.save(force_insert=True)
+                inserted.append(row)
+            except IntegrityError:
+                with self._condition:
+                    self.dropped += 1
+        return inserted
+
+    @staticmethod
+    def _build_rows(batch):
+        from sessions.models import ConsoleLog
+        return [
+            ConsoleLog(session_id=session_id, student_id=student_id, log_type=log_type, message=message)
+            for session_id, student_id, log_type, message in batch
+        ]
+
+
+console_log_writer = ConsoleLogWriter()
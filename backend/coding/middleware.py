@@ -1,7 +1,10 @@
 """
 WebSocket authentication middleware.
 Authenticates WebSocket connections using JWT tokens.
+Users are served from authentication.cache, so reconnecting with the same
+token doesn't read the user row again.
 """
+import time
 import logging
 from channels.middleware import BaseMiddleware
 from channels.db import database_sync_to_async
@@ -10,6 +13,7 @@ from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import TokenError
 from urllib.parse import parse_qs
+from authentication.cache import user_cache
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -17,13 +21,30 @@ User = get_user_model()
 
 @database_sync_to_async
 def get_user(user_id):
-    try:
-        user = User.objects.get(id=user_id)
-        logger.info(f"WebSocket auth: Found user {user.username} (role: {user.role})")
-        return user
-    except User.DoesNotExist:
+    user = User.objects.filter(id=user_id, is_active=True).first()
+    if user is None:
         logger.warning(f"WebSocket auth: User with id {user_id} not found")
         return AnonymousUser()
+    logger.debug(f"WebSocket auth: Found user {user.username} (role: {user.role})")
+    return user
+
+
+async def get_cached_user(access_token):
+    """User of a validated token, and whether it came from the cache."""
+    user_id = access_token['user_id']
+    jti = access_token.get('jti')
+    if jti and user_cache.is_revoked(jti):
+        logger.warning(f"WebSocket auth: Token of user_id={user_id} was revoked")
+        return AnonymousUser(), True
+    user = user_cache.get(user_id, jti)
+    if user is not None:
+        return user, True
+    # A save committed while we read must not leave the old row cached
+    generation = user_cache.generation(user_id)
+    user = await get_user(user_id)
+    if user.is_authenticated:
+        user_cache.put(user_id, jti, user, generation)
+    return user, False
 
 
 class JWTAuthMiddleware(BaseMiddleware):
@@ -39,17 +60,18 @@ class JWTAuthMiddleware(BaseMiddleware):
         token = query_params.get('token', [None])[0]
         
         if token:
+            started = time.perf_counter()
+            cached = False
             try:
                 access_token = AccessToken(token)
-                user_id = access_token['user_id']
-                logger.info(f"WebSocket auth: Token valid, user_id={user_id}")
-                scope['user'] = await get_user(user_id)
+                scope['user'], cached = await get_cached_user(access_token)
             except TokenError as e:
                 logger.warning(f"WebSocket auth: Token error - {e}")
                 scope['user'] = AnonymousUser()
             except Exception as e:
                 logger.error(f"WebSocket auth: Unexpected error - {e}")
                 scope['user'] = AnonymousUser()
+            user_cache.record_handshake(cached, time.perf_counter() - started)
         else:
             logger.warning("WebSocket auth: No token provided")
             scope['user'] = AnonymousUser()
@@ -0,0 +1,168 @@
+"""
+Output size limiting for every execution path.
+
+Program output is captured through bounded buffers that keep the first and
+last halves of CODE_EXECUTION_OUTPUT_LIMIT bytes per stream and drop the
+middle, so a ``while True: print(...)`` loop can't balloon worker memory,
+ConsoleLog rows or session broadcasts. Truncated output carries a marker saying
+how much was omitted.
+"""
+import os
+import selectors
+import signal
+import subprocess
+import time
+from django.conf import settings
+
+
+def get_output_limit():
+    """Per-stream output cap in bytes."""
+    return getattr(settings, 'CODE_EXECUTION_OUTPUT_LIMIT', 256 * 1024)
+
+
+def truncation_marker(omitted):
+    return f'\n\n... [output truncated: {omitted:,} bytes omitted] ...\n\n'
+
+
+class HeadTailBuffer:
+    """Accumulates a byte stream, keeping only its head and tail."""
+
+    def __init__(self, limit=None, head_limit=None):
+        limit = get_output_limit() if limit is None else limit
+        self.head_limit = limit - limit // 2 if head_limit is None else head_limit
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data and self.tail_limit:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    @property
+    def omitted(self):
+        return self.total - len(self.head) - len(self.tail)
+
+    @property
+    def truncated(self):
+        return self.omitted > 0
+
+    def getvalue(self):
+        """Decoded text, with a truncation marker between head and tail if needed."""
+        head = self.head.decode('utf-8', errors='replace')
+        tail = self.tail.decode('utf-8', errors='replace')
+        if self.truncated:
+            return head + truncation_marker(self.omitted) + tail
+        return head + tail
+
+
+def truncate_text(text, limit=None):
+    """Apply the head/tail cap to text that is already in memory."""
+    if not text:
+        return text
+    limit = get_output_limit() if limit is None else limit
+    data = text.encode('utf-8', errors='replace')
+    if len(data) <= limit:
+        return text
+    buffer = HeadTailBuffer(limit)
+    buffer.write(data)
+    return buffer.getvalue()
+
+
+def _kill_group(process):
+    try:
+        os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError):
+        try:
+            process.kill()
+        except Exception:
+            pass
+
+
+def capture_process(process, timeout, limit=None, input=None):
+    """
+    Drain a Popen's stdout/stderr into bounded buffers.
+
+    Args:
+        input: optional bytes written to stdin (which is then closed)
+
+    Returns:
+        (returncode, stdout, stderr, timed_out) with stdout/stderr as text
+    """
+    stdout_buffer = HeadTailBuffer(limit)
+    stderr_buffer = HeadTailBuffer(limit)
+    buffers = {}
+    with selectors.DefaultSelector() as selector:
+        for stream, buffer in ((process.stdout, stdout_buffer), (process.stderr, stderr_buffer)):
+            if stream is not None:
+                buffers[stream.fileno()] = buffer
+                selector.register(stream.fileno(), selectors.EVENT_READ)
+
+        if process.stdin is not None:
+            try:
+                if input:
+                    process.stdin.write(input)
+                process.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+        deadline = time.monotonic() + timeout
+        timed_out = False
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            for key, _ in selector.select(remaining):
+                chunk = os.read(key.fd, 65536)
+                if chunk:
+                    buffers[key.fd].write(chunk)
+                else:
+                    selector.unregister(key.fd)
+
+    if timed_out:
+        _kill_group(process)
+    try:
+        returncode = process.wait(timeout=max(deadline - time.monotonic(), 0) + 1)
+    except subprocess.TimeoutExpired:
+        # Output closed but the process lingers
+        _kill_group(process)
+        returncode = process.wait()
+        timed_out = True
+    for stream in (process.stdout, process.stderr):
+        if stream is not None:
+            stream.close()
+
+    return returncode, stdout_buffer.getvalue(), stderr_buffer.getvalue(), timed_out
+
+
+def run_captured(args, timeout, limit=None, input=None, **popen_kwargs):
+    """
+    Drop-in replacement for ``subprocess.run(args, capture_output=True, text=True, timeout=...)``
+    whose captured output is bounded by the output limit.
+
+    Like subprocess.run, raises subprocess.TimeoutExpired (carrying the
+    captured output) when the timeout expires. The program runs in its own
+    session so the whole process group is killed on timeout.
+    """
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.PIPE if input is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+        **popen_kwargs
+    )
+    returncode, stdout, stderr, timed_out = capture_process(
+        process, timeout, limit, input.encode('utf-8') if input is not None else None
+    )
+    if timed_out:
+        raise subprocess.TimeoutExpired(args, timeout, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(args, returncode, stdout, stderr)
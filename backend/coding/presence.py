@@ -0,0 +1,197 @@
+"""
+Student presence held in memory, persisted to SessionParticipant on change.
+
+Heartbeats (WebSocket and REST), runs and saves only refresh an in-memory
+last-seen time. The database is written when a student comes online or goes
+offline, and otherwise at most every PRESENCE_PERSIST_INTERVAL seconds, when
+a background sweep refreshes last_active for everyone seen since (one UPDATE
+per session).
+
+A student is online while one of their sockets is open or for PRESENCE_TTL
+seconds after their last heartbeat; the sweep marks the rest offline. Readers
+that need live state (the teacher dashboard) overlay ``session_presence``
+on the database rows.
+
+Like the live code store this is per process, matching the single Daphne
+deployment. Set PRESENCE_PERSIST_INTERVAL = 0 to write every heartbeat
+through to the database instead.
+"""
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class Presence:
+    """Last-seen state of one student in one session."""
+
+    __slots__ = ('sockets', 'online', 'last_seen', 'last_seen_at', 'persisted_at', 'participant')
+
+    def __init__(self):
+        self.sockets = 0
+        self.online = False
+        self.last_seen = time.monotonic()
+        self.last_seen_at = timezone.now()
+        self.persisted_at = 0.0
+        self.participant = None  # unknown until the first database write
+
+
+class PresenceTracker:
+    """Process-wide map of (session_code, student_id) -> Presence."""
+
+    def __init__(self, ttl=None, persist_interval=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'PRESENCE_TTL', 45)
+        self.persist_interval = persist_interval if persist_interval is not None else getattr(
+            settings, 'PRESENCE_PERSIST_INTERVAL', 60
+        )
+        self.heartbeats = 0
+        self.writes = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def touch(self, session_code, student_id):
+        """Record activity. Returns True if the student just came online and must be persisted."""
+        return self._seen(session_code, student_id, sockets=0)
+
+    def connect(self, session_code, student_id):
+        """A socket opened. Returns True if the student just came online."""
+        return self._seen(session_code, student_id, sockets=1)
+
+    def disconnect(self, session_code, student_id):
+        """A socket closed. Returns True if that was the student's last one."""
+        with self._lock:
+            entry = self._entries.get((session_code, student_id))
+            if entry is None:
+                return True
+            entry.sockets = max(entry.sockets - 1, 0)
+            if entry.sockets or not entry.online:
+                return False
+            entry.online = False
+            return True
+
+    def persist(self, session_code, student_id, is_connected):
+        """Write a transition to SessionParticipant. Returns True if the student is a participant."""
+        from sessions.models import SessionParticipant
+        with self._lock:
+            entry = self._entries.get((session_code, student_id))
+            last_active = entry.last_seen_at if entry else timezone.now()
+        updated = SessionParticipant.objects.filter(
+            session__session_code=session_code, student_id=student_id
+        ).update(is_connected=is_connected, last_active=last_active)
+        with self._lock:
+            self.writes += 1
+            if entry is not None:
+                entry.persisted_at = time.monotonic()
+                entry.participant = updated > 0
+        return updated > 0
+
+    def record_activity(self, session_code, student_id):
+        """Touch and persist if needed (for sync callers). Returns True if the student is a participant."""
+        if self.touch(session_code, student_id):
+            return self.persist(session_code, student_id, True)
+        with self._lock:
+            entry = self._entries.get((session_code, student_id))
+            return bool(entry and entry.participant)
+
+    def session_presence(self, session_code):
+        """{student_id: (online, last_seen_at)} for students of a session tracked in memory."""
+        with self._lock:
+            return {
+                student_id: (entry.online, entry.last_seen_at)
+                for (code, student_id), entry in self._entries.items()
+                if code == session_code
+            }
+
+    def forget_session(self, session_code):
+        """Drop a session's entries (its participants were marked offline in bulk)."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == session_code]:
+                del self._entries[key]
+
+    def sweep(self):
+        """Mark expired students offline and refresh stale last_active values."""
+        from sessions.models import SessionParticipant
+        now = time.monotonic()
+        expired, refresh = {}, {}
+        with self._lock:
+            for (session_code, student_id), entry in list(self._entries.items()):
+                if entry.online and not entry.sockets and entry.last_seen < now - self.ttl:
+                    entry.online = False
+                    if entry.participant:
+                        expired.setdefault(session_code, []).append(student_id)
+                elif entry.online and entry.participant and entry.last_seen > entry.persisted_at \
+                        and entry.persisted_at < now - self.persist_interval:
+                    refresh.setdefault(session_code, []).append(student_id)
+                elif not entry.online and entry.last_seen < now - self.ttl:
+                    del self._entries[(session_code, student_id)]
+
+        for session_code, student_ids in expired.items():
+            SessionParticipant.objects.filter(
+                session__session_code=session_code, student_id__in=student_ids
+            ).update(is_connected=False)
+        for session_code, student_ids in refresh.items():
+            SessionParticipant.objects.filter(
+                session__session_code=session_code, student_id__in=student_ids
+            ).update(last_active=timezone.now())
+
+        with self._lock:
+            self.writes += len(expired) + len(refresh)
+            for session_code, student_ids in refresh.items():
+                for student_id in student_ids:
+                    entry = self._entries.get((session_code, student_id))
+                    if entry is not None:
+                        entry.persisted_at = now
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracked': len(self._entries),
+                'online': sum(1 for entry in self._entries.values() if entry.online),
+                'heartbeats': self.heartbeats,
+                'writes': self.writes,
+                'ttl': self.ttl,
+                'persist_interval': self.persist_interval,
+            }
+
+    def _seen(self, session_code, student_id, sockets):
+        with self._lock:
+            self.heartbeats += 1
+            entry = self._entries.get((session_code, student_id))
+            if entry is None:
+                entry = self._entries[(session_code, student_id)] = Presence()
+            entry.sockets += sockets
+            entry.last_seen = time.monotonic()
+            entry.last_seen_at = timezone.now()
+            came_online = not entry.online
+            entry.online = True
+        self._start_sweeper()
+        return came_online or self.persist_interval <= 0
+
+    def _start_sweeper(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='presence-sweep', daemon=True)
+            self._thread.start()
+        atexit.register(self.sweep)
+
+    def _run(self):
+        while True:
+            time.sleep(min(self.ttl, self.persist_interval or self.ttl) / 3)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Presence sweep failed: {e}")
+            finally:
+                connection.close()
+
+
+presence = PresenceTracker()
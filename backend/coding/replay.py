@@ -0,0 +1,150 @@
+"""
+Per-session event sequence and replay buffer for reconnecting sockets.
+
+State-changing events (code, output, alerts, activity, presence, teacher
+edits) are published through here: each gets the next ``seq`` of its
+session and is kept, with the channel group it was sent to, in a buffer of
+at most REPLAY_BUFFER_SIZE events and REPLAY_BUFFER_BYTES bytes of text per
+session. A client that reconnects presents the epoch and last seq it saw and
+is sent only the events it missed, or a snapshot of the session when the
+buffer no longer reaches back that far. Heartbeats are sent unsequenced so
+they don't push real history out. A session nobody published to for
+REPLAY_IDLE_TIMEOUT seconds is forgotten, like an ended one.
+
+The epoch changes when the process restarts, so a client never resumes
+against a counter that started over. Like the presence tracker this is per
+process, matching the single Daphne deployment.
+"""
+import collections
+import threading
+import time
+import uuid
+from django.conf import settings
+
+
+def event_size(event):
+    """Rough size of an event: its text values (code, output) dominate."""
+    return sum(len(value) if isinstance(value, str) else 16 for value in event.values())
+
+
+class SessionReplay:
+    """Sequence counter and recent events of one session."""
+
+    __slots__ = ('seq', 'events', 'bytes', 'last_used')
+
+    def __init__(self):
+        self.seq = 0
+        self.events = collections.deque()  # (seq, group, event, size)
+        self.bytes = 0
+        self.last_used = time.monotonic()
+
+
+class ReplayLog:
+    """Process-wide map of session_code -> SessionReplay."""
+
+    def __init__(self, size=None, max_bytes=None, idle_timeout=None):
+        self.size = size or getattr(settings, 'REPLAY_BUFFER_SIZE', 2000)
+        self.max_bytes = max_bytes or getattr(settings, 'REPLAY_BUFFER_BYTES', 8 * 1024 * 1024)
+        self.idle_timeout = idle_timeout or getattr(settings, 'REPLAY_IDLE_TIMEOUT', 6 * 3600)
+        self.epoch = uuid.uuid4().hex[:12]
+        self.replays = 0
+        self.snapshots = 0
+        self.evicted_sessions = 0
+        self._sessions = {}
+        self._next_sweep = time.monotonic() + min(self.idle_timeout, 60)
+        self._lock = threading.Lock()
+
+    def record(self, session_code, group, event):
+        """
+        Stamp an event with the session's next seq and keep it for replay.
+        
+        ``seq_session`` says whose sequence the seq belongs to: user_<id>
+        groups reach a user's sockets in every session.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            replay = self._sessions.get(session_code)
+            if replay is None:
+                replay = self._sessions[session_code] = SessionReplay()
+            replay.seq += 1
+            replay.last_used = now
+            event = dict(event, seq=replay.seq, seq_session=session_code)
+            size = event_size(event)
+            replay.events.append((replay.seq, group, event, size))
+            replay.bytes += size
+            # Keep the newest event even if it alone is over the byte budget
+            while len(replay.events) > 1 and (
+                len(replay.events) > self.size or replay.bytes > self.max_bytes
+            ):
+                replay.bytes -= replay.events.popleft()[3]
+        return event
+
+    def _sweep(self, now):
+        """Forget sessions nobody published to for idle_timeout seconds (lock held)."""
+        idle = [code for code, replay in self._sessions.items() if now - replay.last_used > self.idle_timeout]
+        for code in idle:
+            del self._sessions[code]
+        self.evicted_sessions += len(idle)
+        self._next_sweep = now + min(self.idle_timeout, 60)
+
+    def current(self, session_code):
+        with self._lock:
+            replay = self._sessions.get(session_code)
+            return replay.seq if replay else 0
+
+    def since(self, session_code, epoch, last_seq, groups):
+        """(current seq, events for these groups after last_seq), with None for a snapshot."""
+        with self._lock:
+            replay = self._sessions.get(session_code)
+            seq = replay.seq if replay else 0
+            if epoch != self.epoch or last_seq < 0 or last_seq > seq:
+                self.snapshots += 1
+                return seq, None
+            if replay and replay.events and replay.events[0][0] > last_seq + 1:
+                # Older events were dropped from the buffer
+                self.snapshots += 1
+                return seq, None
+            self.replays += 1
+            if not replay:
+                return seq, []
+            return seq, [event for event_seq, group, event, _ in replay.events
+                         if event_seq > last_seq and group in groups]
+
+    def forget_session(self, session_code):
+        with self._lock:
+            self._sessions.pop(session_code, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'epoch': self.epoch,
+                'sessions': len(self._sessions),
+                'buffered': sum(len(replay.events) for replay in self._sessions.values()),
+                'buffered_bytes': sum(replay.bytes for replay in self._sessions.values()),
+                'buffer_size': self.size,
+                'buffer_bytes': self.max_bytes,
+                'evicted_sessions': self.evicted_sessions,
+                'replays': self.replays,
+                'snapshots': self.snapshots,
+            }
+
+
+replay_log = ReplayLog()
+
+
+async def publish(channel_layer, session_code, group, event):
+    """Sequence an event and send it to a channel group."""
+    await channel_layer.group_send(group, replay_log.record(session_code, group, event))
+
+
+def publish_sync(session_code, group, event):
+    """publish() for sync callers (views)."""
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(publish)(channel_layer, session_code, group, event)
@@ -0,0 +1,245 @@
+"""
+Bounded execution scheduler with per-session fairness.
+
+Every code run (REST, session socket and interactive startup) takes a slot from
+one process-wide scheduler before it may fork a compiler or interpreter:
+
+- at most CODE_EXECUTION_MAX_CONCURRENT runs hold a slot at once (default: cores)
+- waiting runs are queued per session and granted round-robin across sessions,
+  so one busy class cannot starve another
+- a session may have at most CODE_EXECUTION_SESSION_QUOTA runs outstanding and a
+  student CODE_EXECUTION_STUDENT_QUOTA; beyond that, or beyond
+  CODE_EXECUTION_MAX_QUEUE waiting runs overall, new runs are rejected with
+  SchedulerBusy instead of piling up more forks.
+
+The scheduler is thread-safe and can be awaited from consumers or blocked on
+from synchronous views.
+"""
+import asyncio
+import collections
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from django.conf import settings
+
+
+class SchedulerBusy(Exception):
+    """Raised when a run is rejected by backpressure (queue full or quota hit)."""
+
+
+class Ticket:
+    """A run's place in the scheduler: queued until granted, then holds a slot."""
+
+    def __init__(self, scheduler, session_key, student_key):
+        self.scheduler = scheduler
+        self.session_key = session_key
+        self.student_key = student_key
+        self.granted = False
+        self.released = False
+        self._event = threading.Event()
+        self._waiters = []  # (loop, future) pairs from wait_async
+
+    def _grant(self):
+        # Called with the scheduler lock held
+        self.granted = True
+        self._event.set()
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        self._waiters.clear()
+
+    def position(self):
+        """1-based queue position, or 0 once the run holds a slot."""
+        return self.scheduler.position(self)
+
+    def wait(self, timeout=None):
+        """Block until granted; returns False on timeout."""
+        return self._event.wait(timeout)
+
+    async def wait_async(self, on_position=None, poll_interval=0.5):
+        """
+        Await the grant, calling ``await on_position(n)`` whenever the queue
+        position changes.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.scheduler._lock:
+            if self.granted:
+                return
+            self._waiters.append((loop, future))
+
+        last_position = None
+        while not future.done():
+            position = self.position()
+            if on_position and position and position != last_position:
+                last_position = position
+                await on_position(position)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self):
+        """Give back the slot, or leave the queue if not yet granted."""
+        self.scheduler.release(self)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class ExecutionScheduler:
+    """Global concurrency cap with round-robin queuing across sessions."""
+
+    def __init__(self, max_concurrent=None, max_queue=None, session_quota=None, student_quota=None):
+        self.max_concurrent = max_concurrent or getattr(
+            settings, 'CODE_EXECUTION_MAX_CONCURRENT', os.cpu_count() or 2
+        )
+        self.max_queue = max_queue or getattr(settings, 'CODE_EXECUTION_MAX_QUEUE', 200)
+        self.session_quota = session_quota or getattr(settings, 'CODE_EXECUTION_SESSION_QUOTA', 60)
+        self.student_quota = student_quota or getattr(settings, 'CODE_EXECUTION_STUDENT_QUOTA', 2)
+        self.queue_timeout = getattr(settings, 'CODE_EXECUTION_QUEUE_TIMEOUT', 30)
+
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self._queues = collections.OrderedDict()  # session_key -> deque of Tickets
+        self._by_session = collections.Counter()
+        self._by_student = collections.Counter()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def pool(self):
+        """Thread pool that async callers run blocking executions on."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_concurrent, thread_name_prefix='code-exec'
+                )
+            return self._pool
+
+    def enqueue(self, session_key, student_key):
+        """Queue a run and return its Ticket; raises SchedulerBusy on overload."""
+        with self._lock:
+            if self._by_student[student_key] >= self.student_quota:
+                self.rejected += 1
+                raise SchedulerBusy('You already have a run in progress. Please wait for it to finish.')
+            if self._by_session[session_key] >= self.session_quota:
+                self.rejected += 1
+                raise SchedulerBusy('Too many runs queued for this session. Please try again shortly.')
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerBusy('The server is busy running code. Please try again shortly.')
+
+            ticket = Ticket(self, session_key, student_key)
+            self._by_session[session_key] += 1
+            self._by_student[student_key] += 1
+            self._queues.setdefault(session_key, collections.deque()).append(ticket)
+            self.queued += 1
+            self._dispatch()
+            return ticket
+
+    def release(self, ticket):
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted:
+                self.running -= 1
+                self.completed += 1
+            else:
+                queue = self._queues.get(ticket.session_key)
+                if queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    self.queued -= 1
+                    if not queue:
+                        del self._queues[ticket.session_key]
+            self._decrement(self._by_session, ticket.session_key)
+            self._decrement(self._by_student, ticket.student_key)
+            self._dispatch()
+
+    def position(self, ticket):
+        """1-based position in round-robin grant order, 0 if already granted."""
+        with self._lock:
+            if ticket.granted or ticket.released:
+                return 0
+            # Simulate round-robin order over the current session queues
+            queues = [list(q) for q in self._queues.values()]
+            position = 0
+            depth = 0
+            while True:
+                advanced = False
+                for queue in queues:
+                    if depth < len(queue):
+                        advanced = True
+                        position += 1
+                        if queue[depth] is ticket:
+                            return position
+                if not advanced:
+                    return 0
+                depth += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'running': self.running,
+                'queued': self.queued,
+                'sessions_waiting': len(self._queues),
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+    def run_sync(self, session_key, student_key, func, *args):
+        """Run func(*args) in the calling thread once a slot is granted."""
+        ticket = self.enqueue(session_key, student_key)
+        try:
+            if not ticket.wait(self.queue_timeout):
+                raise SchedulerBusy('Timed out waiting for a free execution slot.')
+            return func(*args)
+        finally:
+            ticket.release()
+
+    async def run_async(self, session_key, student_key, func, *args, on_position=None):
+        """Await a slot, then run blocking func(*args) on the scheduler's pool."""
+        async with self.slot(session_key, student_key, on_position=on_position):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, func, *args)
+
+    @asynccontextmanager
+    async def slot(self, session_key, student_key, on_position=None):
+        """Hold a slot for the body of an ``async with`` block."""
+        ticket = self.enqueue(session_key, student_key)
+        try:
+            try:
+                await asyncio.wait_for(ticket.wait_async(on_position), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise SchedulerBusy('Timed out waiting for a free execution slot.')
+            yield ticket
+        finally:
+            ticket.release()
+
+    def _dispatch(self):
+        # Called with the lock held: grant slots round-robin across sessions
+        while self.running < self.max_concurrent and self._queues:
+            session_key, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._queues.move_to_end(session_key)
+            else:
+                del self._queues[session_key]
+            self.running += 1
+            ticket._grant()
+
+    @staticmethod
+    def _decrement(counter, key):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+
+scheduler = ExecutionScheduler()
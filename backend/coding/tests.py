@@ -0,0 +1,583 @@
+"""
+Tests for the coding app.
+"""
+import asyncio
+import base64
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from authentication.cache import UserCache
+from . import ai_service, middleware
+from .ai_service import AIResponseCache, AIService
+from .ai_stream import StreamError, stream_events
+from .archiver import ArchiveService, ArchiveWorkerPool
+from .compile_cache import CompileCache
+from .executor import CodeExecutor, ExecutorRegistry
+from .log_writer import ConsoleLogWriter
+from .replay import ReplayLog
+
+
+class StubServer(ThreadingHTTPServer):
+    """Local HTTP server on a free port; keyword arguments become attributes handlers share."""
+
+    daemon_threads = True
+
+    def __init__(self, handler, **state):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.lock = threading.Lock()
+        self.__dict__.update(state)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self, test):
+        """Serve in the background until the test is cleaned up."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        test.addCleanup(self.server_close)
+        test.addCleanup(self.shutdown)
+        return self
+
+
+class FakeGitHub(StubServer):
+    """Just enough of the GitHub REST API for the archiver, recording every call."""
+
+    def __init__(self):
+        super().__init__(
+            FakeGitHubHandler,
+            repos=set(),
+            files={},  # (repo, path) -> (sha, base64 content)
+            calls=[],
+            connections=set(),
+            gate=threading.Event(),  # cleared to hold PUTs
+        )
+        self.gate.set()
+
+    def count(self, method, kind):
+        return sum(1 for call in self.calls if call == (method, kind))
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=None):
+        payload = json.dumps(body or {}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def handle_call(self, method):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        parts = self.path.strip('/').split('/')
+        with server.lock:
+            server.connections.add(self.client_address)
+        if parts[:2] == ['user', 'repos']:
+            kind = 'create'
+        elif len(parts) == 3 and parts[0] == 'repos':
+            kind = 'repo'
+        else:
+            kind = 'contents'
+        with server.lock:
+            server.calls.append((method, kind))
+
+        if kind == 'create':
+            with server.lock:
+                server.repos.add(body['name'])
+            return self.reply(201)
+        if kind == 'repo':
+            return self.reply(200 if parts[2] in server.repos else 404)
+
+        repo, path = parts[2], '/'.join(parts[4:])
+        if method == 'GET':
+            with server.lock:
+                current = server.files.get((repo, path))
+            return self.reply(200, {'sha': current[0]}) if current else self.reply(404)
+        server.gate.wait(5)
+        with server.lock:
+            current = server.files.get((repo, path))
+            if current and body.get('sha') != current[0]:
+                return self.reply(409)
+            sha = f'sha{len(server.calls)}'
+            server.files[(repo, path)] = (sha, body['content'])
+        self.reply(200 if current else 201, {'content': {'sha': sha}})
+
+    def do_GET(self):
+        self.handle_call('GET')
+
+    def do_POST(self):
+        self.handle_call('POST')
+
+    def do_PUT(self):
+        self.handle_call('PUT')
+
+
+class ArchiveWorkerPoolTests(SimpleTestCase):
+    """The archive pool against a local fake of the GitHub API."""
+
+    def setUp(self):
+        self.github = FakeGitHub().start(self)
+        settings_override = override_settings(
+            GITHUB_API_URL=self.github.url, GITHUB_ADMIN_TOKEN='token', GITHUB_ADMIN_USERNAME='admin'
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        ArchiveService._known_repos.clear()
+        ArchiveService._file_shas.clear()
+
+    def wait_for(self, pool, completed):
+        deadline = time.monotonic() + 10
+        while pool.stats()['completed'] < completed or pool.stats()['queue_depth']:
+            self.assertLess(time.monotonic(), deadline, pool.stats())
+            time.sleep(0.01)
+
+    def test_saves_are_coalesced_and_the_repo_checked_once(self):
+        pool = ArchiveWorkerPool(workers=2, max_queue=100)
+        self.github.gate.clear()  # hold pushes so later saves pile up behind them
+        for version in range(20):
+            for student in range(5):
+                pool.submit('ABC123', 'Intro', f'student{student}', student, f'print({version})', 'python')
+        self.github.gate.set()
+        stats = pool.stats()
+        self.wait_for(pool, stats['submitted'] - stats['coalesced'])
+
+        self.assertGreater(pool.stats()['coalesced'], 0)
+        self.assertEqual(self.github.count('GET', 'repo'), 1)
+        self.assertEqual(self.github.count('POST', 'create'), 1)
+        self.assertEqual(len(self.github.files), 5)
+        latest = ArchiveService.get_target('ABC123', 'Intro', 'student0', 0, 'python')
+        content = base64.b64decode(self.github.files[latest][1]).decode('utf-8')
+        self.assertEqual(content, 'print(19)')
+        self.assertLessEqual(len(self.github.connections), 2)
+
+    def test_known_sha_skips_the_lookup(self):
+        pool = ArchiveWorkerPool(workers=1, max_queue=10)
+        pool.submit('ABC123', 'Intro', 'ada', 1, 'x = 1', 'python')
+        self.wait_for(pool, 1)
+        pool.submit('ABC123', 'Intro', 'ada', 1, 'x = 2', 'python')
+        self.wait_for(pool, 2)
+
+        self.assertEqual(self.github.count('GET', 'contents'), 1)
+        self.assertEqual(self.github.count('PUT', 'contents'), 2)
+
+    def test_full_queue_drops_new_files(self):
+        pool = ArchiveWorkerPool(workers=1, max_queue=1)
+        self.github.gate.clear()
+        pool.submit('ABC123', 'Intro', 'first', 1, 'a', 'python')
+        deadline = time.monotonic() + 5
+        while pool.stats()['queue_depth'] and time.monotonic() < deadline:
+            time.sleep(0.01)  # the worker took the first save
+        self.assertTrue(pool.submit('ABC123', 'Intro', 'second', 2, 'b', 'python'))
+        self.assertFalse(pool.submit('ABC123', 'Intro', 'third', 3, 'c', 'python'))
+        self.github.gate.set()
+        self.wait_for(pool, 2)
+        self.assertEqual(pool.stats()['dropped'], 1)
+
+    def test_sha_memo_is_bounded(self):
+        self.addCleanup(setattr, ArchiveService, '_max_file_shas', ArchiveService._max_file_shas)
+        ArchiveService._max_file_shas = 2
+        for n in range(3):
+            ArchiveService.remember_sha('repo', f'file{n}', f'sha{n}')
+        self.assertEqual(list(ArchiveService._file_shas), [('repo', 'file1'), ('repo', 'file2')])
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible streamed chat completion, first token after a per-path delay."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with self.server.lock:
+            self.server.calls += 1
+        time.sleep(self.server.delays.get(self.path, self.server.delay))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        try:
+            for text in ('Use a ', 'loop.'):
+                event = json.dumps({'choices': [{'delta': {'content': text}}]})
+                self.wfile.write(f'data: {event}\n\n'.encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(0.05)
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.wfile.flush()
+        except OSError:
+            # The client cancelled the stream
+            with self.server.lock:
+                self.server.aborted.append(self.path)
+
+
+class AIResponseCacheTests(SimpleTestCase):
+    """AIService.solve against a stub provider, with a fresh answer cache."""
+
+    def setUp(self):
+        self.provider = StubServer(StubProviderHandler, calls=0, delay=0, delays={}, aborted=[]).start(self)
+        self.cache = AIResponseCache(ttl=60, max_entries=16)
+        for patcher in (
+            mock.patch.object(ai_service, 'ai_cache', self.cache),
+            mock.patch.object(ai_service, 'OPENAI_URL', f'{self.provider.url}/openai'),
+            mock.patch.object(ai_service, 'GROQ_URL', f'{self.provider.url}/groq'),
+            mock.patch.object(ai_service, 'provider_stats', ai_service.ProviderStats()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def service(self, user_id=1, groq_api_key=''):
+        return AIService(SimpleNamespace(
+            user_id=user_id, is_ai_active=True,
+            openai_api_key='key', gemini_api_key='', groq_api_key=groq_api_key
+        ))
+
+    def test_repeated_question_is_served_from_cache(self):
+        first = self.service().solve('Why does this fail?', 'print(x)', 'python')
+        second = self.service().solve('Why does  this fail?\n', 'print(x)  \n', 'Python')
+
+        self.assertEqual(first['content'], 'Use a loop.')
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(self.provider.calls, 1)
+
+    def test_concurrent_identical_requests_share_one_call(self):
+        self.provider.delay = 0.3
+        results = []
+
+        def ask():
+            results.append(self.service().solve('Explain recursion', '', 'python'))
+
+        threads = [threading.Thread(target=ask) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result['content'] == 'Use a loop.' for result in results))
+        self.assertEqual(self.provider.calls, 1)
+        self.assertEqual(self.cache.stats()['coalesced'], 5)
+
+    def test_answers_are_not_shared_between_teachers(self):
+        self.service(user_id=1).solve('Explain recursion', '', 'python')
+        other = self.service(user_id=2).solve('Explain recursion', '', 'python')
+
+        self.assertFalse(other['cached'])
+        self.assertEqual(self.provider.calls, 2)
+
+    @override_settings(AI_HEDGE_DELAY=0.2)
+    def test_prompt_first_token_is_not_hedged(self):
+        result = self.service(groq_api_key='key').solve('Explain recursion', '', 'python')
+
+        self.assertEqual((result['provider'], result['content']), ('openai', 'Use a loop.'))
+        self.assertEqual(self.provider.calls, 1)
+
+    @override_settings(AI_HEDGE_DELAY=0.2)
+    def test_slow_provider_is_hedged_and_cancelled(self):
+        self.provider.delays = {'/openai': 0.6}
+        result = self.service(groq_api_key='key').solve('Explain recursion', '', 'python')
+
+        self.assertEqual((result['provider'], result['content']), ('groq', 'Use a loop.'))
+        self.assertEqual(self.provider.calls, 2)
+        deadline = time.monotonic() + 5
+        while not self.provider.aborted and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.provider.aborted, ['/openai'])
+
+
+class StubStreamHandler(BaseHTTPRequestHandler):
+    """Server-sent events endpoint replaying the server's canned body."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.server.requests.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for part in self.server.parts:
+            self.wfile.write(part.encode('utf-8'))
+            self.wfile.flush()
+
+
+class StreamEventsTests(SimpleTestCase):
+    """stream_events against a stub server-sent events endpoint."""
+
+    def setUp(self):
+        self.server = StubServer(StubStreamHandler, status=200, parts=[], requests=[]).start(self)
+
+    def collect(self):
+        async def run():
+            url = f'{self.server.url}/'
+            return [event async for event in stream_events(url, {}, {'stream': True})]
+        return asyncio.run(run())
+
+    def test_events_are_split_and_joined(self):
+        long_line = 'x' * 100000
+        self.server.parts = [
+            ': keep-alive\n\n',
+            'data: {"a": 1}\r\n\r\n',
+            'event: delta\ndata: one\ndata: two\n\n',
+            f'data: {long_line[:50000]}', f'{long_line[50000:]}\n\n',
+            'data: [DONE]\n\n',
+        ]
+        self.assertEqual(self.collect(), ['{"a": 1}', 'one\ntwo', long_line, '[DONE]'])
+        self.assertEqual(self.server.requests, [{'stream': True}])
+
+    def test_http_error_carries_the_status(self):
+        self.server.status = 429
+        self.server.parts = ['{"error": "rate limited"}']
+        with self.assertRaises(StreamError) as raised:
+            self.collect()
+        self.assertEqual(raised.exception.status, 429)
+        self.assertIn('rate limited', str(raised.exception))
+
+    def test_connection_failure_is_a_stream_error(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self.assertRaises(StreamError) as raised:
+            self.collect()
+        self.assertIsNone(raised.exception.status)
+
+
+class CompileCacheTests(SimpleTestCase):
+    """CompileCache only serves artifacts that still match their stored digests."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.cache = CompileCache(directory=os.path.join(self.root, 'cache'), max_bytes=1024 * 1024)
+        self.build = os.path.join(self.root, 'build')
+        os.mkdir(self.build)
+        with open(os.path.join(self.build, 'program'), 'wb') as f:
+            f.write(b'\x7fELF compiled')
+
+    def restore(self, key):
+        dest = tempfile.mkdtemp(dir=self.root)
+        return self.cache.restore(key, dest, rename={'program': 'a.out'}), dest
+
+    def test_stored_entry_is_restored(self):
+        self.cache.store('k', {'program': os.path.join(self.build, 'program')})
+        hit, dest = self.restore('k')
+
+        self.assertTrue(hit)
+        with open(os.path.join(dest, 'a.out'), 'rb') as f:
+            self.assertEqual(f.read(), b'\x7fELF compiled')
+
+    def test_tampered_entry_is_rejected(self):
+        self.cache.store('k', {'program': os.path.join(self.build, 'program')})
+        with open(os.path.join(self.cache.directory, 'k', 'program'), 'wb') as f:
+            f.write(b'poisoned')
+        hit, dest = self.restore('k')
+
+        self.assertFalse(hit)
+        self.assertEqual(os.listdir(dest), [])
+        self.assertFalse(os.path.exists(os.path.join(self.cache.directory, 'k')))
+        self.assertEqual(self.cache.stats()['rejected'], 1)
+
+    def test_entry_without_known_digest_is_a_miss(self):
+        self.assertTrue(self.cache.enabled)
+        planted = os.path.join(self.cache.directory, 'k')
+        os.mkdir(planted)
+        with open(os.path.join(planted, 'program'), 'wb') as f:
+            f.write(b'planted')
+
+        self.assertFalse(self.restore('k')[0])
+        self.cache.store('k', {'program': os.path.join(self.build, 'program')})
+        self.assertTrue(self.restore('k')[0])
+
+    def test_shared_directory_is_refused(self):
+        directory = os.path.join(self.root, 'shared')
+        os.mkdir(directory)
+        os.chmod(directory, 0o777)
+        cache = CompileCache(directory=directory, max_bytes=1024 * 1024)
+
+        with self.assertLogs('coding.compile_cache', 'WARNING'):
+            self.assertFalse(cache.enabled)
+        cache.store('k', {'program': os.path.join(self.build, 'program')})
+        self.assertEqual(os.listdir(directory), [])
+
+
+class ReplayLogTests(SimpleTestCase):
+    """ReplayLog stays within its event and byte budgets and forgets idle sessions."""
+
+    def test_byte_budget_drops_oldest_events(self):
+        log = ReplayLog(size=100, max_bytes=10000, idle_timeout=60)
+        for n in range(5):
+            log.record('S1', 'teachers', {'type': 'student_code_update', 'code': str(n) * 3000})
+
+        seq, events = log.since('S1', log.epoch, 3, {'teachers'})
+        self.assertEqual([event['seq'] for event in events], [4, 5])
+        self.assertLessEqual(log.stats()['buffered_bytes'], 10000)
+        self.assertIsNone(log.since('S1', log.epoch, 1, {'teachers'})[1])
+
+    def test_events_name_their_session(self):
+        log = ReplayLog(size=10, max_bytes=10000, idle_timeout=60)
+        event = log.record('S1', 'user_1', {'type': 'teacher_edit_received'})
+        self.assertEqual((event['seq'], event['seq_session']), (1, 'S1'))
+
+    def test_idle_sessions_are_forgotten(self):
+        log = ReplayLog(size=10, max_bytes=10000, idle_timeout=60)
+        with mock.patch('coding.replay.time.monotonic', return_value=1000):
+            log._next_sweep = 0
+            log.record('OLD', 'teachers', {'type': 'student_output'})
+        with mock.patch('coding.replay.time.monotonic', return_value=1000 + 61):
+            log._next_sweep = 0
+            log.record('NEW', 'teachers', {'type': 'student_output'})
+
+        self.assertEqual(log.current('OLD'), 0)
+        self.assertEqual(log.current('NEW'), 1)
+        self.assertEqual(log.stats()['evicted_sessions'], 1)
+
+
+class ConsoleLogWriterQueueTests(SimpleTestCase):
+    """The writer's queue is bounded by entries and by message size, dropping the oldest."""
+
+    def setUp(self):
+        self.writer = ConsoleLogWriter(batch_size=1000, max_queue=100, max_bytes=1000)
+        patcher = mock.patch.object(self.writer, '_start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def messages(self):
+        return [entry[3] for entry in self.writer._queue]
+
+    def test_large_messages_are_bounded_by_size(self):
+        for n in range(5):
+            self.writer.submit(1, 'output', str(n) * 400, session_id=1)
+
+        self.assertEqual(self.messages(), ['3' * 400, '4' * 400])
+        stats = self.writer.stats()
+        self.assertEqual((stats['queue_bytes'], stats['dropped']), (800, 3))
+
+    def test_entry_count_is_bounded(self):
+        for n in range(150):
+            self.writer.submit(1, 'output', str(n), session_id=1)
+
+        self.assertEqual(len(self.messages()), 100)
+        self.assertEqual(self.messages()[0], '50')
+
+    def test_failed_batch_is_requeued_within_bounds(self):
+        batch = [(1, 1, 'output', 'a' * 400), (1, 1, 'output', 'b' * 400)]
+        self.writer.submit(1, 'output', 'c' * 400, session_id=1)
+        self.writer._requeue(batch)
+
+        self.assertEqual(self.messages(), ['b' * 400, 'c' * 400])
+        self.assertEqual(self.writer.stats()['queue_bytes'], 800)
+
+
+class ToolchainReprobeTests(SimpleTestCase):
+    """A stale toolchain is re-probed in the background while the old probe is served."""
+
+    def toolchain(self, gcc):
+        return {'container_runtime': None, 'versions': {'gcc': gcc}, 'probe_time': 0}
+
+    @override_settings(CODE_EXECUTION_TOOLCHAIN_REPROBE_INTERVAL=1)
+    def test_reprobe_does_not_block_callers(self):
+        registry = ExecutorRegistry()
+        release = threading.Event()
+        probes = [self.toolchain('gcc 12')]
+
+        def probe():
+            if probes:
+                return probes.pop()
+            release.wait(5)
+            return self.toolchain('gcc 13')
+
+        with mock.patch('coding.executor.probe_toolchain', side_effect=probe):
+            self.assertEqual(registry.get_toolchain()['versions']['gcc'], 'gcc 12')
+            registry._probed_at -= 2
+
+            started = time.monotonic()
+            self.assertEqual(registry.get_toolchain()['versions']['gcc'], 'gcc 12')
+            self.assertEqual(registry.get_toolchain()['versions']['gcc'], 'gcc 12')
+            self.assertLess(time.monotonic() - started, 1)
+
+            release.set()
+            deadline = time.monotonic() + 5
+            while registry._reprobing and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(registry.get_toolchain()['versions']['gcc'], 'gcc 13')
+
+
+@override_settings(CODE_EXECUTION_WARM_POOL_SIZE=1, CODE_EXECUTION_TIMEOUT=2)
+class PythonWarmPoolTests(SimpleTestCase):
+    """Programs on the warm Python fork server behave like a fresh interpreter, and run once."""
+
+    def setUp(self):
+        self.executor = CodeExecutor(toolchain={
+            'container_runtime': None, 'versions': {'python3': 'Python 3'}, 'probe_time': 0
+        })
+        self.executor.start_warm_pools()
+        self.pool = self.executor.warm_pools['python']
+        self.addCleanup(self.pool.shutdown)
+        deadline = time.monotonic() + 10
+        while not self.pool.stats()['idle'] and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    def test_program_runs_as_main(self):
+        result = self.executor.execute(
+            'import sys\nif __name__ == "__main__":\n    print(sys.argv, sys.modules["__main__"].__file__)\n',
+            'python'
+        )
+        self.assertEqual(result['output'].strip(), "['main.py'] main.py")
+        self.assertEqual(self.pool.stats()['warm_hits'], 1)
+
+    def test_worker_dying_mid_run_does_not_rerun_the_program(self):
+        marker = tempfile.NamedTemporaryFile(delete=False)
+        marker.close()
+        self.addCleanup(os.unlink, marker.name)
+        result = self.executor.execute(
+            f'import os, signal\nopen({marker.name!r}, "a").write("ran\\n")\n'
+            'os.kill(os.getppid(), signal.SIGKILL)\n',
+            'python'
+        )
+
+        self.assertFalse(result['success'])
+        with open(marker.name) as f:
+            self.assertEqual(f.read(), 'ran\n')
+
+
+class WebSocketUserCacheTests(SimpleTestCase):
+    """get_cached_user never caches a user row invalidated while it was being read."""
+
+    def setUp(self):
+        self.cache = UserCache(ttl=60)
+        patcher = mock.patch.object(middleware, 'user_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.token = {'user_id': '7', 'jti': 'abc'}
+
+    def test_user_is_cached(self):
+        with mock.patch.object(middleware, 'get_user', mock.AsyncMock(return_value=SimpleNamespace(
+            is_authenticated=True, username='old'
+        ))):
+            asyncio.run(middleware.get_cached_user(self.token))
+        self.assertEqual(self.cache.get('7', 'abc').username, 'old')
+
+    def test_invalidation_during_read_is_not_overwritten(self):
+        async def read_then_invalidate(user_id):
+            # The user was saved while this read was in flight
+            self.cache.invalidate(user_id)
+            return SimpleNamespace(is_authenticated=True, username='old')
+
+        with mock.patch.object(middleware, 'get_user', read_then_invalidate):
+            user, cached = asyncio.run(middleware.get_cached_user(self.token))
+
+        self.assertEqual((user.username, cached), ('old', False))
+        self.assertIsNone(self.cache.get('7', 'abc'))
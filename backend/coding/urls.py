@@ -2,7 +2,7 @@
 URL patterns for coding app.
 """
 from django.urls import path
-from .views import ExecuteCodeView, SaveCodeView, HeartbeatView, GetMyCodeView, TeacherSaveCodeView, SupportedLanguagesView, SendNotificationView, AISolveView
+from .views import ExecuteCodeView, SaveCodeView, HeartbeatView, GetMyCodeView, TeacherSaveCodeView, SupportedLanguagesView, SendNotificationView, AISolveView, ExecutionStatsView
 
 urlpatterns = [
     path('execute/', ExecuteCodeView.as_view(), name='execute-code'),
@@ -12,6 +12,7 @@ urlpatterns = [
     path('teacher-save/', TeacherSaveCodeView.as_view(), name='teacher-save-code'),
     path('notify/', SendNotificationView.as_view(), name='send-notification'),
     path('languages/', SupportedLanguagesView.as_view(), name='supported-languages'),
+    path('stats/', ExecutionStatsView.as_view(), name='execution-stats'),
     
     # AI
     path('ai/solve/', AISolveView.as_view(), name='ai-solve'),
@@ -5,15 +5,22 @@ import logging
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
 # OPTIMIZATION: Use proper logging instead of print statements
 logger = logging.getLogger(__name__)
 
-from .executor import CodeExecutor
-from sessions.models import CodingSession, CodeSnapshot, SessionParticipant
+from .executor import get_executor
+from .scheduler import scheduler, SchedulerBusy
+from .output_limits import truncate_text
+from .consumers import flush_code_updates
+from .live_code import live_code
+from .log_writer import console_log_writer
+from .presence import presence
+from .archiver import archive_pool
+from sessions.cache import session_cache, get_session_or_404
 
 
 class ExecuteCodeView(APIView):
@@ -35,42 +42,36 @@ class ExecuteCodeView(APIView):
         session = None
         # Save code if session provided
         if session_code:
-            try:
-                session = CodingSession.objects.get(session_code=session_code)
-                snapshot, _ = CodeSnapshot.objects.get_or_create(
-                    session=session,
-                    student=request.user,
-                    defaults={'code_content': code, 'language': language}
-                )
-                snapshot.code_content = code
-                snapshot.language = language
-                snapshot.save()
+            session = session_cache.get(session_code)
+            if session is not None:
+                live_code.put(session.id, request.user.id, code, language)
                 
-                # Update participant last_active
-                SessionParticipant.objects.filter(
-                    session=session, student=request.user
-                ).update(is_connected=True, last_active=timezone.now())
-            except CodingSession.DoesNotExist:
-                pass
+                # Update participant presence
+                presence.record_activity(session_code, request.user.id)
+                
+                # Teachers should see the code that is about to run
+                flush_code_updates(request.user.id)
         
-        executor = CodeExecutor()
-        result = executor.execute(code, language)
+        # Wait for a free execution slot (fair across sessions, bounded overall)
+        try:
+            result = scheduler.run_sync(
+                session_code or f'personal_{request.user.id}', request.user.id,
+                get_executor().execute, code, language
+            )
+        except SchedulerBusy as e:
+            return Response(
+                {'success': False, 'error': str(e), 'execution_time': 0},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
         
         # Save console log and error notification if in a session
         if session and request.user.role == 'student':
-            from sessions.models import ConsoleLog, ErrorNotification
-            
-            # Save console log
+            # Save console log (queued; written in batches off the request path)
             log_type = 'output' if result.get('success') else 'error'
-            message = result.get('output') or result.get('error') or ''
+            message = truncate_text(result.get('output') or result.get('error') or '')
             
             if message:
-                ConsoleLog.objects.create(
-                    session=session,
-                    student=request.user,
-                    log_type=log_type,
-                    message=message
-                )
+                console_log_writer.submit(request.user.id, log_type, message, session_id=session.id)
             
             # Error notification creation disabled - manual only
             # Automatic Error notification creation disabled in favor of manual notifications
@@ -103,22 +104,16 @@ class SaveCodeView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        session = get_object_or_404(CodingSession, session_code=session_code)
+        session = get_session_or_404(session_code)
         
-        # Update or create code snapshot
-        snapshot, created = CodeSnapshot.objects.update_or_create(
-            session=session,
-            student=request.user,
-            defaults={
-                'code_content': code,
-                'language': language
-            }
-        )
+        # Update live code (written behind to CodeSnapshot)
+        created = live_code.put(session.id, request.user.id, code, language)
+        
+        # Update participant presence
+        presence.record_activity(session_code, request.user.id)
         
-        # Update participant status
-        SessionParticipant.objects.filter(
-            session=session, student=request.user
-        ).update(is_connected=True, last_active=timezone.now())
+        # Push any coalesced live updates to teachers
+        flush_code_updates(request.user.id)
         
         # Trigger Automated Archive (Fire-and-forget)
         try:
@@ -149,21 +144,19 @@ class HeartbeatView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            session = CodingSession.objects.get(session_code=session_code)
-            updated = SessionParticipant.objects.filter(
-                session=session, student=request.user
-            ).update(is_connected=True, last_active=timezone.now())
-            
-            return Response({
-                'success': True,
-                'updated': updated > 0
-            })
-        except CodingSession.DoesNotExist:
+        # In-memory unless the student was offline; the session is only
+        # looked up when the student turns out not to be a participant
+        updated = presence.record_activity(session_code, request.user.id)
+        if not updated and session_cache.get(session_code) is None:
             return Response(
                 {'error': 'Session not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        return Response({
+            'success': True,
+            'updated': updated
+        })
 
 
 class GetMyCodeView(APIView):
@@ -180,29 +173,25 @@ class GetMyCodeView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            session = CodingSession.objects.get(session_code=session_code)
-            snapshot = CodeSnapshot.objects.filter(
-                session=session, student=request.user
-            ).first()
-            
-            if snapshot:
-                return Response({
-                    'code': snapshot.code_content,
-                    'language': snapshot.language,
-                    'updated_at': snapshot.updated_at.isoformat() if hasattr(snapshot, 'updated_at') else None
-                })
-            else:
-                return Response({
-                    'code': '',
-                    'language': 'python',
-                    'updated_at': None
-                })
-        except CodingSession.DoesNotExist:
+        session = session_cache.get(session_code)
+        if session is None:
             return Response(
                 {'error': 'Session not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        current = live_code.get(session.id, request.user.id)
+        if current:
+            return Response({
+                'code': current['code'],
+                'language': current['language'],
+                'updated_at': current['updated_at'].isoformat() if current['updated_at'] else None
+            })
+        return Response({
+            'code': '',
+            'language': 'python',
+            'updated_at': None
+        })
 
 
 class TeacherSaveCodeView(APIView):
@@ -231,20 +220,25 @@ class TeacherSaveCodeView(APIView):
             )
         
         # Verify teacher owns this session
-        session = get_object_or_404(CodingSession, session_code=session_code, teacher=request.user)
+        session = get_session_or_404(session_code, teacher=request.user)
         
         # Update student's code snapshot
         from authentication.models import User
         student = get_object_or_404(User, id=student_id)
         
-        snapshot, created = CodeSnapshot.objects.update_or_create(
-            session=session,
-            student=student,
-            defaults={
-                'code_content': code,
-                'language': language
-            }
-        )
+        created = live_code.put(session.id, student.id, code, language)
+        
+        # Push the edit to the student's open editor
+        from .replay import publish_sync
+        publish_sync(session.session_code, f'user_{student.id}', {
+            'type': 'teacher_edit_received',
+            'teacher_id': request.user.id,
+            'teacher_name': request.user.full_name or request.user.username,
+            'code': code,
+            'language': language,
+            'cursor_position': 0,
+            'timestamp': timezone.now().isoformat()
+        })
         
         return Response({
             'success': True,
@@ -270,6 +264,38 @@ class SupportedLanguagesView(APIView):
         })
 
 
+class ExecutionStatsView(APIView):
+    """Execution engine, code sync and socket handler counters for this worker (admin only)."""
+    
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        from .compile_cache import compile_cache
+        from .code_sync import code_sync_meter
+        from .consumers import handler_latency
+        from .ai_service import ai_cache, provider_stats
+        from authentication.cache import user_cache
+        from .replay import replay_log
+        executor = get_executor()
+        return Response({
+            'toolchain': executor.toolchain,
+            'warm_pools': {language: pool.stats() for language, pool in executor.warm_pools.items()},
+            'compile_cache': compile_cache.stats(),
+            'scheduler': scheduler.stats(),
+            'code_sync': code_sync_meter.snapshot(),
+            'socket_handlers': handler_latency.snapshot(),
+            'live_code': live_code.stats(),
+            'console_logs': console_log_writer.stats(),
+            'presence': presence.stats(),
+            'session_cache': session_cache.stats(),
+            'ws_users': user_cache.stats(),
+            'replay': replay_log.stats(),
+            'archiver': archive_pool.stats(),
+            'ai_cache': ai_cache.stats(),
+            'ai_providers': provider_stats.snapshot(),
+        })
+
+
 class SendNotificationView(APIView):
     """Send manual notification to teacher."""
     
@@ -285,17 +311,30 @@ class SendNotificationView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        session = get_object_or_404(CodingSession, session_code=session_code)
+        session = get_session_or_404(session_code)
         
         # Create notification
         from sessions.models import ErrorNotification
-        ErrorNotification.objects.create(
-            session=session,
+        notification = ErrorNotification.objects.create(
+            session_id=session.id,
             student=request.user,
             error_message=message,
             is_read=False
         )
         
+        # Alert the session's teachers now rather than on their next refresh
+        from .consumers import teachers_group_name
+        from .replay import publish_sync
+        publish_sync(session.session_code, teachers_group_name(session.session_code), {
+            'type': 'student_alert',
+            'notification_id': notification.id,
+            'student_id': request.user.id,
+            'username': request.user.username,
+            'full_name': request.user.full_name or request.user.username,
+            'message': message,
+            'timestamp': notification.created_at.isoformat()
+        })
+        
         return Response({'success': True, 'message': 'Notification sent'})
 
 
@@ -325,6 +364,7 @@ class AISolveView(APIView):
              
         from .ai_service import AIService
         service = AIService(settings)
+        # Identical questions are answered from cache (result['cached'] is True)
         result = service.solve(prompt, context_code, language)
         
         if 'error' in result:
@@ -0,0 +1,433 @@
+"""
+Pre-forked warm interpreter pool for Python and JavaScript execution.
+
+Interpreter startup dominates the latency of short student programs, so each
+worker process boots its interpreter ahead of time and waits for code on stdin.
+
+- Python workers are fork servers: every run is executed in a freshly forked
+  child with a fresh ``__main__`` module and ``sys.argv``, so one student's
+  code can never see or mutate another student's state. The CPU limit is set
+  in each child (the server itself would otherwise use it up over its runs).
+  The fork server is recycled after ``max_runs`` runs, or immediately after a
+  crash or timeout.
+- JavaScript workers are single-use: Node cannot safely fork a warm isolate,
+  so each pre-booted ``node`` process runs exactly one program and exits.
+
+If no warm worker is ready, ``WarmPool.acquire()`` returns None and the caller
+falls back to the cold (spawn-per-run) path. A worker that breaks only falls
+back to a cold run if the program had not started (``program_started``), so a
+program is never run twice.
+"""
+import collections
+import json
+import logging
+import os
+import selectors
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from .output_limits import capture_process, get_output_limit, truncation_marker
+
+logger = logging.getLogger(__name__)
+
+
+# Fork server run by each warm Python worker. Reads one JSON request per line
+# ({"code", "timeout", "limit"}) and replies with two JSON lines per run: the
+# child's pid ({"pid"}) once it is forked, then the result. Each stream is kept
+# as head + tail of at most "limit" bytes, like HeadTailBuffer.
+PYTHON_FORK_SERVER = r'''
+import sys, os, json, select, signal, time, traceback, linecache, resource, types
+# Warm the modules student programs use most so forked children get them for free
+import math, random, re, string, collections, itertools, functools, datetime, io
+
+NPROC_LIMIT = int(sys.argv[1])
+proto_in = sys.stdin.buffer
+proto_out = os.fdopen(os.dup(1), 'wb')
+devnull = os.open(os.devnull, os.O_RDWR)
+os.dup2(devnull, 1)
+
+class Capture:
+    def __init__(self, limit):
+        self.head_limit = limit - limit // 2
+        self.tail_limit = limit // 2
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data and self.tail_limit:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    def reply(self):
+        return {
+            'head': self.head.decode('utf-8', errors='replace'),
+            'tail': self.tail.decode('utf-8', errors='replace'),
+            'omitted': self.total - len(self.head) - len(self.tail),
+        }
+
+def run_child(code, timeout):
+    os.setpgid(0, 0)
+    # Never let student code reach the protocol pipes
+    os.close(proto_out.fileno())
+    os.dup2(devnull, 0)
+    try:
+        resource.setrlimit(resource.RLIMIT_NPROC, (NPROC_LIMIT, NPROC_LIMIT))
+        # CPU time counts from the fork, like a freshly spawned interpreter's
+        cpu = max(1, int(-(-timeout // 1)))
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+    except Exception:
+        pass
+    sys.stdin = open(os.devnull)
+    sys.argv = ['main.py']
+    linecache.cache['main.py'] = (len(code), None, code.splitlines(True), 'main.py')
+    # A real __main__ module, so pickle, dataclasses and `if __name__ == "__main__":` behave
+    main = types.ModuleType('__main__')
+    main.__file__ = 'main.py'
+    main.__builtins__ = __builtins__
+    sys.modules['__main__'] = main
+    status = 0
+    try:
+        exec(compile(code, 'main.py', 'exec'), main.__dict__)
+    except SystemExit as e:
+        if e.code is None:
+            status = 0
+        elif isinstance(e.code, int):
+            status = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        etype, value, tb = sys.exc_info()
+        traceback.print_exception(etype, value, tb.tb_next)
+        status = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except Exception:
+        pass
+    os._exit(status & 0xFF)
+
+for line in proto_in:
+    request = json.loads(line)
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(out_r)
+        os.close(err_r)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        run_child(request['code'], request['timeout'])
+    os.close(out_w)
+    os.close(err_w)
+    # The child leaves our process group; the worker needs its pid to kill it
+    proto_out.write(json.dumps({'pid': pid}).encode('utf-8') + b'\n')
+    proto_out.flush()
+
+    buffers = {out_r: Capture(request['limit']), err_r: Capture(request['limit'])}
+    open_fds = {out_r, err_r}
+    deadline = time.monotonic() + request['timeout']
+    timed_out = False
+    while open_fds:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select(list(open_fds), [], [], remaining)
+        for fd in ready:
+            chunk = os.read(fd, 65536)
+            if chunk:
+                buffers[fd].write(chunk)
+            else:
+                open_fds.discard(fd)
+    for fd in (out_r, err_r):
+        os.close(fd)
+    # A child can close its output and keep running: wait no longer than the deadline
+    while not timed_out:
+        reaped, wait_status = os.waitpid(pid, os.WNOHANG)
+        if reaped:
+            break
+        if time.monotonic() >= deadline:
+            timed_out = True
+        else:
+            time.sleep(0.005)
+    if timed_out:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+        _, wait_status = os.waitpid(pid, 0)
+
+    reply = {
+        'returncode': os.waitstatus_to_exitcode(wait_status),
+        'stdout': buffers[out_r].reply(),
+        'stderr': buffers[err_r].reply(),
+        'timed_out': timed_out,
+    }
+    proto_out.write(json.dumps(reply).encode('utf-8') + b'\n')
+    proto_out.flush()
+'''
+
+
+# Single-use warm Node worker: waits for the program on stdin, then runs it as
+# an ordinary CommonJS module named main.js.
+NODE_BOOTSTRAP = r'''
+const Module = require('module');
+const path = require('path');
+const chunks = [];
+process.stdin.on('data', (chunk) => chunks.push(chunk));
+process.stdin.on('end', () => {
+    const filename = path.join(process.cwd(), 'main.js');
+    const mod = new Module(filename, null);
+    mod.filename = filename;
+    mod.paths = Module._nodeModulePaths(process.cwd());
+    mod._compile(Buffer.concat(chunks).toString('utf8'), filename);
+});
+'''
+
+
+class WarmWorker:
+    """A pre-spawned interpreter process waiting for code."""
+
+    reusable = False
+
+    def __init__(self, process):
+        self.process = process
+        self.runs = 0
+        self.child_pid = None  # process group of the program being run, if outside ours
+        self.program_started = False  # the current run's program may have begun executing
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        """Kill the worker and its whole process group, and the running program's group."""
+        if self.child_pid:
+            try:
+                os.killpg(self.child_pid, signal.SIGKILL)
+            except OSError:
+                pass
+            self.child_pid = None
+        try:
+            os.killpg(os.getpgid(self.process.pid), signal.SIGKILL)
+        except (ProcessLookupError, PermissionError, OSError):
+            try:
+                self.process.kill()
+            except Exception:
+                pass
+        try:
+            self.process.wait(timeout=1)
+        except Exception:
+            pass
+
+    def run(self, code, timeout):
+        """
+        Run code and return dict with keys: returncode, stdout, stderr, timed_out.
+        Raises OSError/ValueError if the worker is broken; program_started then
+        tells whether the program may already have run.
+        """
+        raise NotImplementedError
+
+
+class PythonWorker(WarmWorker):
+    """Fork-server worker: one forked child per run, reused up to max_runs."""
+
+    reusable = True
+
+    @classmethod
+    def spawn(cls, preexec_fn, nproc_limit):
+        process = subprocess.Popen(
+            ['python3', '-u', '-c', PYTHON_FORK_SERVER, str(nproc_limit)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=tempfile.gettempdir(),
+            preexec_fn=preexec_fn,
+            start_new_session=True
+        )
+        return cls(process)
+
+    def run(self, code, timeout):
+        self.runs += 1
+        self.program_started = False
+        request = json.dumps({
+            'code': code, 'timeout': timeout, 'limit': get_output_limit()
+        }).encode('utf-8') + b'\n'
+        self.process.stdin.write(request)
+        self.process.stdin.flush()
+
+        # The fork server enforces the timeout itself; the grace period only
+        # covers a wedged or dead server.
+        deadline = time.monotonic() + timeout + 2
+        fd = self.process.stdout.fileno()
+        buffer = b''
+        reply = None
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while reply is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    raise TimeoutError('Warm worker did not reply')
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise OSError('Warm worker exited')
+                buffer += chunk
+                while b'\n' in buffer and reply is None:
+                    line, buffer = buffer.split(b'\n', 1)
+                    message = json.loads(line)
+                    if 'pid' in message:
+                        self.child_pid = message['pid']
+                        self.program_started = True
+                    else:
+                        reply = message
+        self.child_pid = None
+        for stream in ('stdout', 'stderr'):
+            part = reply[stream]
+            marker = truncation_marker(part['omitted']) if part['omitted'] > 0 else ''
+            reply[stream] = part['head'] + marker + part['tail']
+        return reply
+
+
+class NodeWorker(WarmWorker):
+    """Single-use worker: Node is already booted, the program runs once."""
+
+    @classmethod
+    def spawn(cls, preexec_fn, nproc_limit):
+        process = subprocess.Popen(
+            ['node', '-e', NODE_BOOTSTRAP],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=tempfile.gettempdir(),
+            preexec_fn=preexec_fn,
+            start_new_session=True
+        )
+        return cls(process)
+
+    def run(self, code, timeout):
+        self.runs += 1
+        # Node runs the program as soon as stdin closes
+        self.program_started = True
+        returncode, stdout, stderr, timed_out = capture_process(
+            self.process, timeout, input=code.encode('utf-8')
+        )
+        return {
+            'returncode': returncode,
+            'stdout': stdout,
+            'stderr': stderr,
+            'timed_out': timed_out,
+        }
+
+
+class WarmPool:
+    """
+    A fixed-size pool of warm workers for one language.
+
+    Workers are spawned in a background thread so neither startup nor a
+    refill ever blocks a request.
+    """
+
+    def __init__(self, worker_class, size, max_runs, preexec_fn, nproc_limit=10):
+        self.worker_class = worker_class
+        self.size = size
+        self.max_runs = max_runs if worker_class.reusable else 1
+        self.preexec_fn = preexec_fn
+        self.nproc_limit = nproc_limit
+        self.warm_hits = 0
+        self.cold_misses = 0
+        self._idle = collections.deque()
+        self._spawning = 0
+        self._busy = 0  # reusable workers currently checked out
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._refill()
+
+    def acquire(self):
+        """Return an idle warm worker, or None if the caller must run cold."""
+        worker = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.popleft()
+                if candidate.is_alive():
+                    worker = candidate
+                    break
+                candidate.kill()
+            if worker:
+                self.warm_hits += 1
+                if worker.reusable:
+                    self._busy += 1
+            else:
+                self.cold_misses += 1
+        self._refill()
+        return worker
+
+    def release(self, worker, healthy=True):
+        """Return a worker after a run; retire it if it is spent or broken."""
+        retire = (
+            not healthy
+            or not worker.reusable
+            or worker.runs >= self.max_runs
+            or not worker.is_alive()
+        )
+        with self._lock:
+            if worker.reusable:
+                self._busy -= 1
+            if not retire and not self._closed:
+                self._idle.append(worker)
+                return
+        worker.kill()
+        self._refill()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'busy': self._busy,
+                'warm_hits': self.warm_hits,
+                'cold_misses': self.cold_misses,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            workers = list(self._idle)
+            self._idle.clear()
+        for worker in workers:
+            worker.kill()
+
+    def _refill(self):
+        with self._lock:
+            if self._closed:
+                return
+            missing = self.size - len(self._idle) - self._busy - self._spawning
+            if missing <= 0:
+                return
+            self._spawning += missing
+        threading.Thread(target=self._spawn_workers, args=(missing,), daemon=True).start()
+
+    def _spawn_workers(self, count):
+        for _ in range(count):
+            worker = None
+            try:
+                worker = self.worker_class.spawn(self.preexec_fn, self.nproc_limit)
+            except Exception as e:
+                logger.warning(f"Warm {self.worker_class.__name__} spawn failed: {e}")
+            with self._lock:
+                self._spawning -= 1
+                if worker and not self._closed:
+                    self._idle.append(worker)
+                    worker = None
+            if worker:
+                worker.kill()
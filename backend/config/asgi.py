@@ -15,6 +15,11 @@ django_asgi_app = get_asgi_application()
 
 from config.routing import websocket_urlpatterns
 from coding.middleware import JWTAuthMiddlewareStack
+from coding.executor import get_executor
+
+# Probe the toolchain and start the warm pools when the server starts, so the
+# first "Run" doesn't pay for it (management commands never load this module)
+get_executor()
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -169,6 +169,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # Request lines would otherwise be logged for every streamed AI answer
+        'httpx': {
+            'level': 'WARNING',
+        },
     },
 }
 
@@ -229,12 +233,89 @@ else:
 # Code execution settings
 CODE_EXECUTION_TIMEOUT = 5  # seconds
 CODE_EXECUTION_MEMORY_LIMIT = 50 * 1024 * 1024  # 50MB
+# Max captured bytes per output stream (stdout/stderr); head and tail are kept, the middle is dropped
+CODE_EXECUTION_OUTPUT_LIMIT = int(os.environ.get('CODE_EXECUTION_OUTPUT_LIMIT', str(256 * 1024)))
+# Re-probe compilers/runtimes every N seconds (0 = probe once per worker)
+CODE_EXECUTION_TOOLCHAIN_REPROBE_INTERVAL = int(os.environ.get('CODE_EXECUTION_TOOLCHAIN_REPROBE_INTERVAL', '0'))
+# Warm interpreter pool for Python/JavaScript (workers per language, 0 = disabled)
+CODE_EXECUTION_WARM_POOL_SIZE = int(os.environ.get('CODE_EXECUTION_WARM_POOL_SIZE', '2'))
+# Recycle a warm Python fork server after this many runs
+CODE_EXECUTION_WARM_POOL_MAX_RUNS = int(os.environ.get('CODE_EXECUTION_WARM_POOL_MAX_RUNS', '50'))
+# Compile cache for C/C++/Java (0 bytes = disabled). Kept out of the temp directory
+# programs run in; an existing directory must be owned by the server with mode 0700
+CODE_EXECUTION_COMPILE_CACHE_DIR = os.environ.get(
+    'CODE_EXECUTION_COMPILE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'observer', 'compile_cache')
+)
+CODE_EXECUTION_COMPILE_CACHE_MAX_BYTES = int(os.environ.get('CODE_EXECUTION_COMPILE_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# Execution scheduler: concurrent runs per worker, waiting runs, and outstanding runs per session/student
+CODE_EXECUTION_MAX_CONCURRENT = int(os.environ.get('CODE_EXECUTION_MAX_CONCURRENT', str(os.cpu_count() or 2)))
+CODE_EXECUTION_MAX_QUEUE = int(os.environ.get('CODE_EXECUTION_MAX_QUEUE', '200'))
+CODE_EXECUTION_SESSION_QUOTA = int(os.environ.get('CODE_EXECUTION_SESSION_QUOTA', '60'))
+CODE_EXECUTION_STUDENT_QUOTA = int(os.environ.get('CODE_EXECUTION_STUDENT_QUOTA', '2'))
+CODE_EXECUTION_QUEUE_TIMEOUT = 30  # seconds a run may wait for a slot
+# Interactive console streaming: coalesce output into frames of up to N bytes / N seconds
+CODE_EXECUTION_STREAM_FRAME_BYTES = 8192
+CODE_EXECUTION_STREAM_FLUSH_INTERVAL = 0.016
+# Live code sync: at most one student code update per N seconds reaches teachers
+CODE_SYNC_COALESCE_INTERVAL = 0.075
+# Live code buffers are written behind to CodeSnapshot every N seconds
+# (0 = write-through; required when more than one ASGI process serves sessions)
+LIVE_CODE_FLUSH_INTERVAL = 5
+# Console logs are inserted in batches of up to N rows, at least every N seconds;
+# when the database can't keep up, the oldest queued rows beyond either cap (rows,
+# characters of message text) are dropped
+CONSOLE_LOG_BATCH_SIZE = 200
+CONSOLE_LOG_FLUSH_INTERVAL = 1.0
+CONSOLE_LOG_QUEUE_SIZE = 10000
+CONSOLE_LOG_QUEUE_BYTES = 64 * 1024 * 1024
+# Presence: students are online for N seconds after their last heartbeat; last_active
+# is persisted at most every N seconds (0 = write every heartbeat through)
+PRESENCE_TTL = 45
+PRESENCE_PERSIST_INTERVAL = 60
+# Session code -> session row cache lifetime (entries are also dropped on save)
+SESSION_CACHE_TTL = 300
+# Users authenticated on WebSocket connect are cached per (user, token) for N seconds
+# (entries are also dropped on save; logout revokes the access token)
+WS_USER_CACHE_TTL = 60
+# Sequenced session events kept per session for reconnecting clients (at most N events
+# and N bytes of text); a client that missed more than this gets a snapshot instead of
+# a replay. Sessions without events for N seconds are dropped from memory
+REPLAY_BUFFER_SIZE = 2000
+REPLAY_BUFFER_BYTES = 8 * 1024 * 1024
+REPLAY_IDLE_TIMEOUT = 6 * 3600
+# compact_session_logs: sessions ended over N hours ago keep the newest N logs and
+# errors per student; older rows are archived compressed and deleted N at a time
+LOG_RETENTION_GRACE_HOURS = 24
+LOG_RETENTION_KEEP_PER_STUDENT = 50
+LOG_RETENTION_BATCH_SIZE = 1000
+
+# AI solver: a teacher's identical questions (normalized prompt, code, language,
+# providers) are answered from cache for N seconds; answers are never shared
+# between teachers. Provider URLs can point at a local stub
+AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', '3600'))
+AI_CACHE_MAX_ENTRIES = 256
+# Answers are streamed (also for the REST solver); start the next provider if the
+# running ones sent no first token within N seconds (negative = strictly in order)
+AI_HEDGE_DELAY = float(os.environ.get('AI_HEDGE_DELAY', '2.0'))
+AI_OPENAI_URL = os.environ.get('AI_OPENAI_URL', 'https://api.openai.com/v1/chat/completions')
+AI_GEMINI_URL = os.environ.get(
+    'AI_GEMINI_URL', 'https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent'
+)
+AI_GROQ_URL = os.environ.get('AI_GROQ_URL', 'https://api.groq.com/openai/v1/chat/completions')
 
 # Automated Archiving (Admin)
 # The username of the admin account where session repos will be created
 GITHUB_ADMIN_USERNAME = os.environ.get('GITHUB_ADMIN_USERNAME', '')
 # Personal Access Token with 'repo' scope
 GITHUB_ADMIN_TOKEN = os.environ.get('GITHUB_ADMIN_TOKEN', '')
+# Archive pushes: worker threads, files waiting at most, per-request timeout (seconds)
+# and API base URL (point it at a local fake for testing)
+ARCHIVE_WORKERS = 2
+ARCHIVE_QUEUE_SIZE = 500
+ARCHIVE_HTTP_TIMEOUT = 10
+# Files whose last pushed SHA is remembered (a forgotten SHA costs one extra GET)
+ARCHIVE_SHA_CACHE_SIZE = 10000
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
 
 # SECURITY: Production security settings
 SECURE_BROWSER_XSS_FILTER = True
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CodingSession, SessionParticipant, CodeSnapshot, ConsoleLog, ErrorNotification
+from .models import CodingSession, SessionParticipant, CodeSnapshot, ConsoleLog, ErrorNotification, SessionLogArchive
 
 
 @admin.register(CodingSession)
@@ -31,3 +31,10 @@ class ConsoleLogAdmin(admin.ModelAdmin):
 class ErrorNotificationAdmin(admin.ModelAdmin):
     list_display = ['student', 'error_message', 'is_read', 'created_at']
     list_filter = ['is_read']
+
+
+@admin.register(SessionLogArchive)
+class SessionLogArchiveAdmin(admin.ModelAdmin):
+    list_display = ['session', 'kind', 'row_count', 'raw_bytes', 'created_at']
+    list_filter = ['kind']
+    exclude = ['data']
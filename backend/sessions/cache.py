@@ -0,0 +1,82 @@
+"""
+Session code -> session row cache.
+
+Consumers and views resolve a session code on nearly every request; the
+handful of fields they need are cached here so the same row isn't read
+thousands of times per class. Entries are dropped when a session is saved
+or deleted (after the transaction commits) and expire after
+SESSION_CACHE_TTL seconds, which bounds staleness when another process
+changed the row.
+"""
+import collections
+import threading
+import time
+from django.conf import settings
+from django.http import Http404
+
+SessionInfo = collections.namedtuple(
+    'SessionInfo', ['id', 'session_code', 'session_name', 'teacher_id', 'is_active', 'default_language']
+)
+
+
+class SessionCache:
+    """LRU map of session_code -> SessionInfo with a TTL."""
+
+    def __init__(self, ttl=None, max_entries=4096):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'SESSION_CACHE_TTL', 300)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_code):
+        """SessionInfo for a code, or None if there is no such session."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(session_code)
+            if cached is not None and cached[1] > now:
+                self._entries.move_to_end(session_code)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        from .models import CodingSession
+        row = CodingSession.objects.filter(session_code=session_code).values_list(
+            *SessionInfo._fields
+        ).first()
+        if row is None:
+            return None
+        info = SessionInfo(*row)
+        with self._lock:
+            self._entries[session_code] = (info, now + self.ttl)
+            self._entries.move_to_end(session_code)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return info
+
+    def invalidate(self, session_code):
+        with self._lock:
+            self._entries.pop(session_code, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'ttl': self.ttl,
+            }
+
+
+session_cache = SessionCache()
+
+
+def get_session_or_404(session_code, teacher=None, is_active=None):
+    """Cached SessionInfo for a code, raising Http404 like get_object_or_404."""
+    info = session_cache.get(session_code)
+    if info is None \
+            or (teacher is not None and info.teacher_id != teacher.id) \
+            or (is_active is not None and info.is_active != is_active):
+        raise Http404('No CodingSession matches the given query.')
+    return info
@@ -0,0 +1,76 @@
+"""
+Per-student state shown on the teacher dashboard.
+
+Shared by TeacherDashboardView and by the session socket, which sends it
+as a snapshot to a teacher reconnecting after too long to replay.
+"""
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import SessionParticipant, CodeSnapshot, ConsoleLog, ErrorNotification
+
+
+def dashboard_students(session_id, session_code):
+    """One dict per participant: identity, presence, latest code, recent logs, errors."""
+    # A fixed number of queries regardless of class size: one each for
+    # participants, snapshots, recent logs and unread errors
+    participants = SessionParticipant.objects.filter(
+        session_id=session_id
+    ).select_related('student').order_by('student__id')
+    
+    # Latest code per student: live (unflushed) code wins over snapshots
+    from coding.live_code import live_code
+    snapshots = {}
+    for snapshot in CodeSnapshot.objects.filter(session_id=session_id).only(
+        'student_id', 'code_content', 'language'
+    ):
+        snapshots[snapshot.student_id] = {'code': snapshot.code_content, 'language': snapshot.language}
+    snapshots.update(live_code.session_entries(session_id))
+    
+    # 10 most recent console logs per student
+    recent_logs = {}
+    logs = ConsoleLog.objects.filter(session_id=session_id).annotate(
+        row=Window(
+            RowNumber(),
+            partition_by=F('student_id'),
+            order_by=F('created_at').desc()
+        )
+    ).filter(row__lte=10).order_by('student_id', '-created_at')
+    for log in logs:
+        recent_logs.setdefault(log.student_id, []).append({
+            'id': log.id,
+            'log_type': log.log_type,
+            'message': log.message,
+            'created_at': log.created_at.isoformat()
+        })
+    
+    # Students with unread errors
+    students_with_errors = set(
+        ErrorNotification.objects.filter(session_id=session_id, is_read=False)
+        .values_list('student_id', flat=True).distinct()
+    )
+    
+    # Live presence wins over the (coarsely persisted) participant rows
+    from coding.presence import presence
+    live_presence = presence.session_presence(session_code)
+    
+    students = []
+    for participant in participants:
+        student = participant.student
+        snapshot = snapshots.get(student.id)
+        is_connected, last_active = participant.is_connected, participant.last_active
+        if student.id in live_presence:
+            is_connected, seen_at = live_presence[student.id]
+            last_active = max(last_active, seen_at)
+        students.append({
+            'id': student.id,
+            'username': student.username,
+            'full_name': student.full_name or student.username,
+            'is_connected': is_connected,
+            'last_active': last_active,
+            'code_content': snapshot['code'] if snapshot else '',
+            'language': snapshot['language'] if snapshot else 'python',
+            'recent_logs': recent_logs.get(student.id, []),
+            'has_errors': student.id in students_with_errors
+        })
+    return students
@@ -0,0 +1,75 @@
+"""
+Compact console logs and error notifications of ended sessions.
+
+    python manage.py compact_session_logs [--keep 50] [--batch-size 1000]
+        [--grace-hours 24] [--session CODE] [--all] [--dry-run] [--pause 0.1]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from sessions.models import CodingSession
+from sessions.retention import compact_session, get_retention_settings, sessions_to_compact
+
+
+def format_bytes(nbytes):
+    for unit in ('B', 'KB', 'MB'):
+        if abs(nbytes) < 1024:
+            return f'{nbytes:.0f} {unit}' if unit == 'B' else f'{nbytes:.1f} {unit}'
+        nbytes /= 1024
+    return f'{nbytes:.1f} GB'
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete old console logs and error notifications of ended sessions.'
+
+    def add_arguments(self, parser):
+        keep, batch_size, grace_hours = get_retention_settings()
+        parser.add_argument('--keep', type=int, default=keep,
+                            help=f'Rows kept per student and table (default {keep})')
+        parser.add_argument('--batch-size', type=int, default=batch_size,
+                            help=f'Rows archived and deleted per transaction (default {batch_size})')
+        parser.add_argument('--grace-hours', type=float, default=grace_hours,
+                            help=f'Only sessions ended at least this long ago (default {grace_hours})')
+        parser.add_argument('--session', help='Compact a single ended session by code')
+        parser.add_argument('--all', action='store_true', help='Include sessions compacted before')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be archived')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        if options['keep'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--keep must be >= 0 and --batch-size >= 1')
+
+        if options['session']:
+            sessions = CodingSession.objects.filter(session_code=options['session'], is_active=False)
+            if not sessions.exists():
+                raise CommandError(f"No ended session with code {options['session']}")
+        else:
+            sessions = sessions_to_compact(options['grace_hours'], include_compacted=options['all'])
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        totals = {'sessions': 0, 'rows': 0, 'raw_bytes': 0, 'reclaimed_bytes': 0}
+        for session in sessions.iterator():
+            def progress(kind, stats, session=session):
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"  {session.session_code} {kind}: {stats['rows']} rows so far")
+
+            result = compact_session(
+                session, options['keep'], options['batch_size'],
+                dry_run=options['dry_run'], pause=options['pause'], on_batch=progress
+            )
+            totals['sessions'] += 1
+            for kind, stats in result.items():
+                totals['rows'] += stats['rows']
+                totals['raw_bytes'] += stats['raw_bytes']
+                totals['reclaimed_bytes'] += stats['reclaimed_bytes']
+                if stats['rows']:
+                    self.stdout.write(
+                        f"{session.session_code}: {verb.lower()} {stats['rows']} {kind} "
+                        f"({format_bytes(stats['raw_bytes'])} -> {format_bytes(stats['archived_bytes'])})"
+                    )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {totals['rows']} rows from {totals['sessions']} sessions, "
+            f"{format_bytes(totals['raw_bytes'])} of log data, "
+            f"{format_bytes(totals['reclaimed_bytes'])} reclaimed"
+        ))
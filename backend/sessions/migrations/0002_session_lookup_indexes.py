@@ -0,0 +1,62 @@
+# Generated by Django 5.2.9 on 2026-10-17 02:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_snapshots(apps, schema_editor):
+    """Keep only the most recently updated snapshot per (session, student)."""
+    CodeSnapshot = apps.get_model('coding_sessions', 'CodeSnapshot')
+    duplicates = (
+        CodeSnapshot.objects.values('session_id', 'student_id')
+        .annotate(count=models.Count('id')).filter(count__gt=1)
+    )
+    for pair in duplicates.iterator():
+        stale = CodeSnapshot.objects.filter(
+            session_id=pair['session_id'], student_id=pair['student_id']
+        ).order_by('-updated_at', '-id').values_list('id', flat=True)[1:]
+        CodeSnapshot.objects.filter(id__in=list(stale)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coding_sessions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_snapshots, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='codesnapshot',
+            unique_together={('session', 'student')},
+        ),
+        migrations.AddIndex(
+            model_name='codingsession',
+            index=models.Index(fields=['teacher', '-created_at', '-id'], name='session_teacher_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consolelog',
+            index=models.Index(fields=['session', 'student', '-created_at'], name='consolelog_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='errornotification',
+            index=models.Index(fields=['session', 'student', '-created_at'], name='errornotif_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='errornotification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['session', '-created_at', '-id'], name='errornotif_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionparticipant',
+            index=models.Index(fields=['session', '-last_active'], name='participant_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionparticipant',
+            index=models.Index(fields=['session', 'joined_at', 'id'], name='participant_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionparticipant',
+            index=models.Index(condition=models.Q(('is_connected', True)), fields=['session'], name='participant_connected_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-17 02:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coding_sessions', '0002_session_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codingsession',
+            name='logs_compacted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='SessionLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('console_logs', 'Console logs'), ('error_notifications', 'Error notifications')], max_length=20)),
+                ('data', models.BinaryField(default=bytes)),
+                ('row_count', models.IntegerField(default=0)),
+                ('raw_bytes', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='log_archives', to='coding_sessions.codingsession')),
+            ],
+            options={
+                'unique_together': {('session', 'kind')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coding_sessions', '0003_session_log_archive'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='sessionlogarchive',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='sessionlogarchive',
+            index=models.Index(fields=['session', 'kind', 'id'], name='logarchive_session_idx'),
+        ),
+    ]
@@ -3,7 +3,8 @@ Models for coding session management.
 """
 import random
 import string
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
 
@@ -12,6 +13,20 @@ def generate_session_code():
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
 
+class CodingSessionQuerySet(models.QuerySet):
+    
+    def with_participant_count(self):
+        """Annotate connected_participant_count so lists serialize without a COUNT per session."""
+        connected = SessionParticipant.objects.filter(
+            session=models.OuterRef('pk'), is_connected=True
+        ).order_by().values('session').annotate(count=models.Count('pk')).values('count')
+        return self.annotate(
+            connected_participant_count=Coalesce(
+                models.Subquery(connected, output_field=models.IntegerField()), 0
+            )
+        )
+
+
 class CodingSession(models.Model):
     """A coding session created by a teacher that students can join."""
     
@@ -27,9 +42,17 @@ class CodingSession(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     ended_at = models.DateTimeField(null=True, blank=True)
+    # Set by the compact_session_logs command once old logs are archived
+    logs_compacted_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = CodingSessionQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Teacher's session list, newest first (cursor order)
+            models.Index(fields=['teacher', '-created_at', '-id'], name='session_teacher_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.session_name} ({self.session_code})"
@@ -41,6 +64,17 @@ class CodingSession(models.Model):
             while CodingSession.objects.filter(session_code=self.session_code).exists():
                 self.session_code = generate_session_code()
         super().save(*args, **kwargs)
+        self._invalidate_cache()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._invalidate_cache()
+        return result
+    
+    def _invalidate_cache(self):
+        from .cache import session_cache
+        session_code = self.session_code
+        transaction.on_commit(lambda: session_cache.invalidate(session_code))
 
 
 class SessionParticipant(models.Model):
@@ -63,6 +97,15 @@ class SessionParticipant(models.Model):
     class Meta:
         unique_together = ['session', 'student']
         ordering = ['-last_active']
+        indexes = [
+            models.Index(fields=['session', '-last_active'], name='participant_active_idx'),
+            models.Index(fields=['session', 'joined_at', 'id'], name='participant_joined_idx'),
+            # Connected-participant counts
+            models.Index(
+                fields=['session'], name='participant_connected_idx',
+                condition=models.Q(is_connected=True)
+            ),
+        ]
     
     def __str__(self):
         return f"{self.student.username} in {self.session.session_code}"
@@ -95,6 +138,8 @@ class CodeSnapshot(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
+        # One live snapshot per student per session (get_or_create relies on it)
+        unique_together = ['session', 'student']
         ordering = ['-updated_at']
     
     def __str__(self):
@@ -127,6 +172,10 @@ class ConsoleLog(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Recent logs per student (dashboard window query, student history)
+            models.Index(fields=['session', 'student', '-created_at'], name='consolelog_student_idx'),
+        ]
     
     def __str__(self):
         return f"{self.log_type}: {self.message[:50]}"
@@ -152,6 +201,48 @@ class ErrorNotification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['session', 'student', '-created_at'], name='errornotif_student_idx'),
+            # Unread errors per session (teacher error list, dashboard flags)
+            models.Index(
+                fields=['session', '-created_at', '-id'], name='errornotif_unread_idx',
+                condition=models.Q(is_read=False)
+            ),
+        ]
     
     def __str__(self):
         return f"Error from {self.student.username}: {self.error_message[:50]}"
+
+
+class SessionLogArchive(models.Model):
+    """
+    One compaction batch of console logs or error notifications removed from
+    an ended session. ``data`` is a gzip member of JSON lines; a session's
+    archive is all its rows of one kind in id order (see
+    ``sessions.retention.read_archive``).
+    """
+    
+    KINDS = [
+        ('console_logs', 'Console logs'),
+        ('error_notifications', 'Error notifications'),
+    ]
+    
+    session = models.ForeignKey(
+        CodingSession,
+        on_delete=models.CASCADE,
+        related_name='log_archives'
+    )
+    kind = models.CharField(max_length=20, choices=KINDS)
+    data = models.BinaryField(default=bytes)
+    row_count = models.IntegerField(default=0)
+    raw_bytes = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'kind', 'id'], name='logarchive_session_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} archive of {self.session.session_code} ({self.row_count} rows)"
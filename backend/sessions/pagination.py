@@ -0,0 +1,23 @@
+"""
+Keyset (cursor) pagination for session list endpoints.
+
+Pages are addressed by an opaque cursor over a unique ordering, so each page
+costs the same no matter how deep into a long history it is, and rows added
+between requests never shift or repeat items.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class NewestFirstCursorPagination(CursorPagination):
+    """Newest rows first, by (created_at, id)."""
+    
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class JoinOrderCursorPagination(NewestFirstCursorPagination):
+    """Participants in the order they joined."""
+    
+    ordering = ('joined_at', 'id')
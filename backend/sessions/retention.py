@@ -0,0 +1,124 @@
+"""
+Retention for ended sessions' console logs and error notifications.
+
+For every student, the newest LOG_RETENTION_KEEP_PER_STUDENT rows of each
+table stay in place; older rows are written, as a gzip member of JSON lines,
+to a new SessionLogArchive row and deleted. Work happens in batches of
+LOG_RETENTION_BATCH_SIZE rows, each in its own short transaction that only
+inserts its own archive row, so compaction never holds long locks on tables
+the live dashboard reads and never rewrites earlier batches.
+
+Run it with ``python manage.py compact_session_logs`` (scheduled as a cron job
+in render.yaml).
+"""
+import gzip
+import json
+import time
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import CodingSession, ConsoleLog, ErrorNotification, SessionLogArchive
+
+# Archive kind -> (model, fields kept in the archive)
+ARCHIVED_TABLES = {
+    'console_logs': (ConsoleLog, ['id', 'student_id', 'log_type', 'message', 'created_at']),
+    'error_notifications': (
+        ErrorNotification, ['id', 'student_id', 'error_message', 'error_line', 'is_read', 'created_at']
+    ),
+}
+
+
+def get_retention_settings():
+    """(keep per student, batch size, grace period in hours) from settings."""
+    return (
+        getattr(settings, 'LOG_RETENTION_KEEP_PER_STUDENT', 50),
+        getattr(settings, 'LOG_RETENTION_BATCH_SIZE', 1000),
+        getattr(settings, 'LOG_RETENTION_GRACE_HOURS', 24),
+    )
+
+
+def sessions_to_compact(grace_hours, include_compacted=False):
+    """Sessions that ended more than grace_hours ago, oldest first."""
+    sessions = CodingSession.objects.filter(
+        is_active=False,
+        ended_at__lte=timezone.now() - timezone.timedelta(hours=grace_hours)
+    )
+    if not include_compacted:
+        sessions = sessions.filter(logs_compacted_at__isnull=True)
+    return sessions.order_by('ended_at', 'id')
+
+
+def stale_ids(model, session, keep):
+    """Ids of a session's rows beyond the newest `keep` per student."""
+    return list(
+        model.objects.filter(session=session).annotate(
+            row=Window(
+                RowNumber(),
+                partition_by=F('student_id'),
+                order_by=[F('created_at').desc(), F('id').desc()]
+            )
+        ).filter(row__gt=keep).order_by('id').values_list('id', flat=True)
+    )
+
+
+def compact_session(session, keep, batch_size, dry_run=False, pause=0, on_batch=None):
+    """
+    Archive and delete a session's old logs and error notifications.
+
+    Args:
+        on_batch: optional callable(kind, stats) called after every batch
+
+    Returns:
+        {kind: {'rows', 'raw_bytes', 'archived_bytes', 'reclaimed_bytes'}}
+    """
+    result = {}
+    for kind, (model, fields) in ARCHIVED_TABLES.items():
+        stats = result[kind] = {'rows': 0, 'raw_bytes': 0, 'archived_bytes': 0, 'reclaimed_bytes': 0}
+        ids = stale_ids(model, session, keep)
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            rows, raw_bytes, archived_bytes = _archive_batch(session, kind, model, fields, chunk, dry_run)
+            stats['rows'] += rows
+            stats['raw_bytes'] += raw_bytes
+            stats['archived_bytes'] += archived_bytes
+            stats['reclaimed_bytes'] += raw_bytes - archived_bytes
+            if on_batch:
+                on_batch(kind, stats)
+            if pause:
+                time.sleep(pause)
+
+    if not dry_run:
+        CodingSession.objects.filter(pk=session.pk).update(logs_compacted_at=timezone.now())
+    return result
+
+
+def _archive_batch(session, kind, model, fields, ids, dry_run):
+    """Move one batch of rows into the archive. Returns (rows, raw bytes, compressed bytes)."""
+    with transaction.atomic():
+        rows = list(model.objects.filter(id__in=ids).order_by('created_at', 'id').values(*fields))
+        if not rows:
+            return 0, 0, 0
+        lines = ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows).encode('utf-8')
+        member = gzip.compress(lines)
+        if dry_run:
+            return len(rows), len(lines), len(member)
+
+        SessionLogArchive.objects.create(
+            session=session, kind=kind, data=member, row_count=len(rows), raw_bytes=len(lines)
+        )
+        model.objects.filter(id__in=[row['id'] for row in rows]).delete()
+    return len(rows), len(lines), len(member)
+
+
+def read_archive(session, kind):
+    """All archived rows of one kind of a session as dicts, in archiving order."""
+    rows = []
+    batches = SessionLogArchive.objects.filter(session=session, kind=kind).order_by('id')
+    for data in batches.values_list('data', flat=True).iterator():
+        lines = gzip.decompress(bytes(data)).decode('utf-8').splitlines()
+        rows.extend(json.loads(line) for line in lines if line)
+    return rows
@@ -73,9 +73,24 @@ class CodingSessionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'session_code', 'created_at', 'teacher']
     
     def get_participant_count(self, obj):
+        # Annotated by CodingSession.objects.with_participant_count() on list endpoints
+        count = getattr(obj, 'connected_participant_count', None)
+        if count is not None:
+            return count
         return obj.participants.filter(is_connected=True).count()
 
 
+class CodingSessionSummarySerializer(CodingSessionSerializer):
+    """Lightweight field set for session lists (no nested teacher)."""
+    
+    class Meta(CodingSessionSerializer.Meta):
+        fields = [
+            'id', 'session_name', 'session_code', 'description',
+            'default_language', 'is_active', 'created_at', 'ended_at',
+            'participant_count'
+        ]
+
+
 class CodingSessionDetailSerializer(CodingSessionSerializer):
     """Detailed serializer with participants."""
     
@@ -0,0 +1,149 @@
+"""
+Tests for session views.
+"""
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authentication.models import User
+from .models import (
+    CodingSession, SessionParticipant, CodeSnapshot, ConsoleLog, ErrorNotification, SessionLogArchive
+)
+from .retention import compact_session, read_archive
+
+
+class TeacherDashboardQueryTests(TestCase):
+    """The dashboard costs a fixed number of queries whatever the class size."""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('dash_teacher', role=User.Role.TEACHER)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def make_class(self, session_code, size):
+        session = CodingSession.objects.create(
+            teacher=self.teacher, session_name=f'Class {size}', session_code=session_code
+        )
+        for i in range(size):
+            student = User.objects.create_user(f'{session_code.lower()}_student_{i}')
+            SessionParticipant.objects.create(session=session, student=student, is_connected=bool(i % 2))
+            CodeSnapshot.objects.create(session=session, student=student, code_content=f'print({i})')
+            ConsoleLog.objects.bulk_create([
+                ConsoleLog(session=session, student=student, message=f'line {n}') for n in range(12)
+            ])
+            if i % 3 == 0:
+                ErrorNotification.objects.create(session=session, student=student, error_message='boom')
+        return session
+
+    def dashboard_queries(self, session):
+        # secure: without DEBUG, plain HTTP is redirected (SECURE_SSL_REDIRECT)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/sessions/{session.session_code}/dashboard/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['students']
+
+    def test_query_count_is_flat(self):
+        small = self.make_class('DSMALL', 2)
+        large = self.make_class('DLARGE', 40)
+
+        small_count, small_students = self.dashboard_queries(small)
+        large_count, large_students = self.dashboard_queries(large)
+
+        self.assertEqual(len(small_students), 2)
+        self.assertEqual(len(large_students), 40)
+        self.assertEqual(small_count, large_count)
+        with self.assertNumQueries(large_count):
+            self.client.get(f'/api/sessions/{large.session_code}/dashboard/', secure=True)
+
+    def test_recent_logs_are_capped_per_student(self):
+        session = self.make_class('DLOGS', 3)
+        _, students = self.dashboard_queries(session)
+        self.assertTrue(all(len(student['recent_logs']) == 10 for student in students))
+        self.assertEqual([student['has_errors'] for student in students], [True, False, False])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN output is PostgreSQL specific')
+class SessionLookupIndexTests(TestCase):
+    """The hot session lookups are served by the indexes from migration 0002."""
+
+    def setUp(self):
+        teacher = User.objects.create_user('index_teacher', role=User.Role.TEACHER)
+        self.student = User.objects.create_user('index_student')
+        self.session = CodingSession.objects.create(teacher=teacher, session_name='Indexes')
+        SessionParticipant.objects.create(session=self.session, student=self.student, is_connected=True)
+        with connection.cursor() as cursor:
+            # Tiny test tables would otherwise always be scanned sequentially
+            cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_unread_errors(self):
+        self.assertUsesIndex(
+            ErrorNotification.objects.filter(session=self.session, is_read=False).order_by('-created_at', '-id'),
+            'errornotif_unread_idx'
+        )
+
+    def test_student_console_logs(self):
+        self.assertUsesIndex(
+            ConsoleLog.objects.filter(session=self.session, student=self.student).order_by('-created_at'),
+            'consolelog_student_idx'
+        )
+
+    def test_participants_in_join_order(self):
+        self.assertUsesIndex(
+            SessionParticipant.objects.filter(session=self.session).order_by('joined_at', 'id'),
+            'participant_joined_idx'
+        )
+
+    def test_connected_participants(self):
+        self.assertUsesIndex(
+            SessionParticipant.objects.filter(session=self.session, is_connected=True),
+            'participant_connected_idx'
+        )
+
+
+class LogCompactionTests(TestCase):
+    """compact_session writes one archive row per batch and keeps the newest rows."""
+
+    def setUp(self):
+        teacher = User.objects.create_user('compact_teacher', role=User.Role.TEACHER)
+        self.session = CodingSession.objects.create(
+            teacher=teacher, session_name='Ended', is_active=False, ended_at=timezone.now()
+        )
+        self.students = [User.objects.create_user(f'compact_student_{i}') for i in range(2)]
+        for student in self.students:
+            ConsoleLog.objects.bulk_create([
+                ConsoleLog(session=self.session, student=student, message=f'{student.username} {n}')
+                for n in range(25)
+            ])
+
+    def test_batches_are_archived_separately(self):
+        result = compact_session(self.session, keep=5, batch_size=8)
+
+        self.assertEqual(result['console_logs']['rows'], 40)
+        archives = SessionLogArchive.objects.filter(session=self.session, kind='console_logs')
+        self.assertEqual(archives.count(), 5)
+        self.assertEqual(sum(archive.row_count for archive in archives), 40)
+        for student in self.students:
+            kept = ConsoleLog.objects.filter(session=self.session, student=student)
+            self.assertEqual(
+                sorted(kept.values_list('message', flat=True)),
+                [f'{student.username} {n}' for n in range(20, 25)]
+            )
+
+        archived = read_archive(self.session, 'console_logs')
+        self.assertEqual(len(archived), 40)
+        self.assertEqual([row['id'] for row in archived], sorted(row['id'] for row in archived))
+        self.assertEqual(read_archive(self.session, 'error_notifications'), [])
+
+    def test_dry_run_writes_nothing(self):
+        result = compact_session(self.session, keep=5, batch_size=8, dry_run=True)
+
+        self.assertEqual(result['console_logs']['rows'], 40)
+        self.assertFalse(SessionLogArchive.objects.exists())
+        self.assertEqual(ConsoleLog.objects.filter(session=self.session).count(), 50)
@@ -7,13 +7,17 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.db.models import Exists, OuterRef
 import logging
 
 logger = logging.getLogger(__name__)
 
-from .models import CodingSession, SessionParticipant, CodeSnapshot, ConsoleLog, ErrorNotification
+from .models import CodingSession, SessionParticipant, CodeSnapshot, ErrorNotification
+from .cache import get_session_or_404
+from .dashboard import dashboard_students
+from .pagination import NewestFirstCursorPagination, JoinOrderCursorPagination
 from .serializers import (
-    CodingSessionSerializer, CodingSessionDetailSerializer,
+    CodingSessionSerializer, CodingSessionDetailSerializer, CodingSessionSummarySerializer,
     JoinSessionSerializer, SessionParticipantSerializer,
     CodeSnapshotSerializer, ErrorNotificationSerializer
 )
@@ -41,19 +45,22 @@ class CreateSessionView(generics.CreateAPIView):
 
 
 class ListSessionsView(generics.ListAPIView):
-    """List sessions for the current user."""
+    """List sessions for the current user, newest first, one cursor page at a time."""
     
-    serializer_class = CodingSessionSerializer
+    serializer_class = CodingSessionSummarySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NewestFirstCursorPagination
     
     def get_queryset(self):
         user = self.request.user
         if user.role == 'teacher':
-            return CodingSession.objects.filter(teacher=user)
+            sessions = CodingSession.objects.filter(teacher=user)
         else:
-            return CodingSession.objects.filter(
-                participants__student=user
-            ).distinct()
+            # EXISTS instead of a join + DISTINCT over every joined session
+            sessions = CodingSession.objects.filter(Exists(
+                SessionParticipant.objects.filter(session=OuterRef('pk'), student=user)
+            ))
+        return sessions.with_participant_count()
 
 
 class SessionDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -136,6 +143,15 @@ class EndSessionView(APIView):
         # Disconnect all participants
         session.participants.update(is_connected=False)
         
+        # Persist the live code buffers now rather than on the next flush tick
+        from coding.live_code import live_code
+        live_code.flush(session.id)
+        live_code.forget_session(session.id)
+        from coding.presence import presence
+        presence.forget_session(session.session_code)
+        from coding.replay import replay_log
+        replay_log.forget_session(session.session_code)
+        
         return Response({'message': 'Session ended successfully'})
 
 
@@ -144,11 +160,11 @@ class SessionParticipantsView(generics.ListAPIView):
     
     serializer_class = SessionParticipantSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = JoinOrderCursorPagination
     
     def get_queryset(self):
-        session_code = self.kwargs['session_code']
-        session = get_object_or_404(CodingSession, session_code=session_code)
-        return session.participants.all()
+        session = get_session_or_404(self.kwargs['session_code'])
+        return SessionParticipant.objects.filter(session_id=session.id).select_related('student')
 
 
 class StudentCodeView(generics.RetrieveAPIView):
@@ -161,7 +177,7 @@ class StudentCodeView(generics.RetrieveAPIView):
         session_code = self.kwargs['session_code']
         student_id = self.kwargs['student_id']
         
-        session = get_object_or_404(CodingSession, session_code=session_code)
+        session = get_session_or_404(session_code)
         
         if self.request.user.role != 'teacher' and self.request.user.id != student_id:
             from rest_framework.exceptions import PermissionDenied
@@ -169,9 +185,17 @@ class StudentCodeView(generics.RetrieveAPIView):
         
         snapshot = get_object_or_404(
             CodeSnapshot,
-            session=session,
+            session_id=session.id,
             student_id=student_id
         )
+        
+        # Unflushed edits live in memory
+        from coding.live_code import live_code
+        current = live_code.session_entries(session.id).get(snapshot.student_id)
+        if current:
+            snapshot.code_content = current['code']
+            snapshot.language = current['language']
+            snapshot.updated_at = current['updated_at']
         return snapshot
 
 
@@ -180,15 +204,13 @@ class ErrorNotificationsView(generics.ListAPIView):
     
     serializer_class = ErrorNotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NewestFirstCursorPagination
     
     def get_queryset(self):
-        session_code = self.kwargs['session_code']
-        session = get_object_or_404(
-            CodingSession, 
-            session_code=session_code,
-            teacher=self.request.user
-        )
-        return session.error_notifications.filter(is_read=False)
+        session = get_session_or_404(self.kwargs['session_code'], teacher=self.request.user)
+        return ErrorNotification.objects.filter(
+            session_id=session.id, is_read=False
+        ).select_related('student')
 
 
 class MarkErrorReadView(APIView):
@@ -214,58 +236,17 @@ class TeacherDashboardView(APIView):
     
     def get(self, request, session_code):
         session = get_object_or_404(
-            CodingSession,
+            CodingSession.objects.select_related('teacher'),
             session_code=session_code
         )
         
-        if session.teacher != request.user:
+        if session.teacher_id != request.user.id:
             return Response(
                 {'error': 'You do not have permission to view this dashboard.'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        participants = session.participants.select_related('student').order_by('student__id').all()
-        
-        dashboard_data = []
-        for participant in participants:
-            # Get latest code snapshot
-            snapshot = CodeSnapshot.objects.filter(
-                session=session,
-                student=participant.student
-            ).first()
-            
-            # Get recent console logs
-            logs = ConsoleLog.objects.filter(
-                session=session,
-                student=participant.student
-            )[:10]
-            
-            # Check for unread errors
-            has_errors = ErrorNotification.objects.filter(
-                session=session,
-                student=participant.student,
-                is_read=False
-            ).exists()
-            
-            dashboard_data.append({
-                'id': participant.student.id,
-                'username': participant.student.username,
-                'full_name': participant.student.full_name or participant.student.username,
-                'is_connected': participant.is_connected,
-                'last_active': participant.last_active,
-                'code_content': snapshot.code_content if snapshot else '',
-                'language': snapshot.language if snapshot else 'python',
-                'recent_logs': [
-                    {
-                        'id': log.id,
-                        'log_type': log.log_type,
-                        'message': log.message,
-                        'created_at': log.created_at.isoformat()
-                    }
-                    for log in logs
-                ],
-                'has_errors': has_errors
-            })
+        dashboard_data = dashboard_students(session.id, session.session_code)
         
         return Response({
             'session': CodingSessionSerializer(session).data,
@@ -288,28 +269,28 @@ class ReportActivityView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        session = get_object_or_404(CodingSession, session_code=session_code)
+        session = get_session_or_404(session_code)
         
         # If user is the teacher, just log it but don't error
-        if request.user == session.teacher:
+        if request.user.id == session.teacher_id:
              logger.info("ℹ️ Teacher reported activity, ignoring participant check")
              return Response({'status': 'reported (teacher)'})
 
         # Verify student is participant
         participant = get_object_or_404(
             SessionParticipant,
-            session=session,
+            session_id=session.id,
             student=request.user
         )
         
-        # Broadcast activity to session group (teachers will pick it up)
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
+        # Broadcast activity to the session's teachers
+        from coding.consumers import teachers_group_name
+        from coding.replay import publish_sync
         
-        channel_layer = get_channel_layer()
-        logger.debug(f"📤 Broadcasting to session_{session_code}")
-        async_to_sync(channel_layer.group_send)(
-            f'session_{session_code}',
+        logger.debug(f"📤 Broadcasting to {teachers_group_name(session_code)}")
+        publish_sync(
+            session_code,
+            teachers_group_name(session_code),
             {
                 'type': 'student_activity',
                 'student_id': request.user.id,
@@ -8,6 +8,7 @@ import { sessionsAPI, codingAPI, githubAPI } from '../../services/api';
 import { useWebSocket } from '../../context/WebSocketContext';
 import Console from './Console';
 import { registerSuggestions } from '../../utils/editorSuggestions';
+import { diffToOps } from '../../utils/codeSync';
 
 // Map our language IDs to Monaco editor language IDs
 const getMonacoLanguage = (lang) => {
@@ -25,7 +26,7 @@ export default function CodingInterface() {
     const { sessionCode } = useParams();
     const navigate = useNavigate();
     const location = useLocation();
-    const { connect, disconnect, sendCodeChange, on, off } = useWebSocket();
+    const { connect, disconnect, isConnected, sendCodeChange, sendCodeDelta, on, off } = useWebSocket();
 
     const [session, setSession] = useState(null);
     const [code, setCode] = useState('# Write your code here\nprint("Hello, World!")\n');
@@ -38,6 +39,7 @@ export default function CodingInterface() {
     const heartbeatRef = useRef(null);
     const lastTypedRef = useRef(0); // Track last typing time to prevent overwrites
     const lastSavedCodeRef = useRef(''); // Track what was last saved to detect unsaved changes
+    const codeSyncRef = useRef({ text: null, version: null }); // Last code the server acknowledged (delta sync)
 
     // GitHub integration state
     const [githubConnected, setGithubConnected] = useState(false);
@@ -113,9 +115,10 @@ export default function CodingInterface() {
         loadSession();
     }, [sessionCode, navigate]);
 
-    // Heartbeat and poll for teacher edits every 15 seconds
+    // Heartbeat and poll for teacher edits every 15 seconds while the socket is down
+    // (while connected, presence and teacher edits go over the socket)
     useEffect(() => {
-        if (!sessionCode) return;
+        if (!sessionCode || isConnected) return;
 
         let lastCodeFromServer = '';
 
@@ -171,12 +174,13 @@ export default function CodingInterface() {
                 clearInterval(heartbeatRef.current);
             }
         };
-    }, [sessionCode]);
+    }, [sessionCode, isConnected]);
 
     // Listen for real-time teacher edits
     useEffect(() => {
         const handleTeacherEdit = (data) => {
-            // Teacher edit received
+            // Teacher edit received; the server dropped our delta base
+            codeSyncRef.current = { text: null, version: null };
             // Only update if we haven't typed recently (to avoid overwrite conflict)
             const timeSinceLastTyped = Date.now() - lastTypedRef.current;
             // If user is actively typing, we might show a notification instead of overwriting?
@@ -187,15 +191,74 @@ export default function CodingInterface() {
             }
         };
 
+        // Reconnected after missing too many events: adopt the server's copy unless we have unsaved edits
+        const handleSnapshot = (data) => {
+            if (!data.code) return;
+            setCode(prevCode => {
+                const hasUnsavedChanges = prevCode !== lastSavedCodeRef.current && lastSavedCodeRef.current !== '';
+                return hasUnsavedChanges ? prevCode : data.code;
+            });
+            if (data.language) setLanguage(data.language);
+        };
+
         if (on) {
             on('teacher_edit_received', handleTeacherEdit);
+            on('session_snapshot', handleSnapshot);
         }
 
         return () => {
-            if (off) off('teacher_edit_received', handleTeacherEdit);
+            if (off) {
+                off('teacher_edit_received', handleTeacherEdit);
+                off('session_snapshot', handleSnapshot);
+            }
         };
     }, [on, off]);
 
+    // Send code to the teacher as a delta against the server's version,
+    // falling back to the full code when there is no shared base
+    const syncCode = (currentValue, syncLanguage) => {
+        const sync = codeSyncRef.current;
+        if (sync.text === null || sync.version === null) {
+            sendCodeChange(currentValue, syncLanguage, 0);
+            codeSyncRef.current = { text: currentValue, version: null };
+            return;
+        }
+        const ops = diffToOps(sync.text, currentValue);
+        if (ops.length === 0) return;
+        sendCodeDelta(ops, sync.version, syncLanguage, 0);
+        codeSyncRef.current = { text: currentValue, version: sync.version + 1 };
+    };
+    const syncCodeRef = useRef(syncCode);
+    syncCodeRef.current = syncCode;
+
+    // Delta sync acknowledgements and resync requests
+    useEffect(() => {
+        const handleCodeAck = (data) => {
+            // Full updates wait for the server's version; deltas already advanced it
+            if (codeSyncRef.current.version === null) {
+                codeSyncRef.current.version = data.version;
+            }
+        };
+        const handleResyncRequired = () => {
+            codeSyncRef.current = { text: null, version: null };
+            if (editorRef.current) {
+                syncCodeRef.current(editorRef.current.getValue(), language);
+            }
+        };
+
+        if (on) {
+            on('code_ack', handleCodeAck);
+            on('code_resync_required', handleResyncRequired);
+        }
+
+        return () => {
+            if (off) {
+                off('code_ack', handleCodeAck);
+                off('code_resync_required', handleResyncRequired);
+            }
+        };
+    }, [on, off, language]);
+
 
     // Register suggestions on editor mount and attach Enter key handler
     const editorRef = useRef(null);
@@ -209,7 +272,7 @@ export default function CodingInterface() {
                 // Let Monaco process the Enter first, then send updated code
                 setTimeout(() => {
                     const currentValue = editor.getValue();
-                    sendCodeChange(currentValue, language, 0);
+                    syncCodeRef.current(currentValue, language);
                 }, 50);
             }
         });
@@ -49,14 +49,32 @@ export default function PersonalConsole() {
         newSocket.onmessage = (event) => {
             const data = JSON.parse(event.data);
             if (data.type === 'status') {
-                if (data.status === 'started') {
+                if (data.status === 'queued') {
+                    // Waiting for a free execution slot; 'started' clears this
+                    setIsRunning(true);
+                    setOutput([{
+                        type: 'info',
+                        message: `Waiting to run (position ${data.queue_position} in queue)...`,
+                        timestamp: new Date().toISOString()
+                    }]);
+                } else if (data.status === 'started') {
                     setIsRunning(true);
                     setOutput([]);
                 } else if (data.status === 'finished') {
                     setIsRunning(false);
                     setOutput(prev => [...prev, {
-                        type: 'info',
-                        message: `\nProcess finished with exit code ${data.exit_code}`,
+                        // Killed for printing far past the output limit
+                        type: data.output_limit ? 'error' : 'info',
+                        message: data.output_limit
+                            ? `\n${data.message}`
+                            : `\nProcess finished with exit code ${data.exit_code}`,
+                        timestamp: new Date().toISOString()
+                    }]);
+                } else if (data.status === 'timeout') {
+                    setIsRunning(false);
+                    setOutput(prev => [...prev, {
+                        type: 'error',
+                        message: `\n${data.message}`,
                         timestamp: new Date().toISOString()
                     }]);
                 } else if (data.status === 'stopped') {
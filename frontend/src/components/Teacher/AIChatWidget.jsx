@@ -1,6 +1,7 @@
 
 import { useState, useEffect, useRef } from 'react';
 import { codingAPI } from '../../services/api';
+import { useWebSocket } from '../../context/WebSocketContext';
 
 export default function AIChatWidget({ activeSession }) {
     const [isOpen, setIsOpen] = useState(false);
@@ -10,6 +11,51 @@ export default function AIChatWidget({ activeSession }) {
     const [input, setInput] = useState('');
     const [loading, setLoading] = useState(false);
     const messagesEndRef = useRef(null);
+    const streamIdRef = useRef(null);
+    const { isConnected, on, sendAISolve } = useWebSocket();
+
+    // Streamed answers arrive over the session socket, chunk by chunk
+    useEffect(() => {
+        const updateStream = (data, update) => {
+            setMessages(prev => prev.map(msg => msg.requestId === data.request_id ? update(msg) : msg));
+        };
+        const finishStream = (data) => {
+            if (streamIdRef.current === data.request_id) {
+                streamIdRef.current = null;
+                setLoading(false);
+            }
+        };
+
+        const unsubscribers = [
+            on('ai_stream_start', (data) => updateStream(data, msg => ({ ...msg, provider: data.provider }))),
+            on('ai_stream_chunk', (data) => updateStream(data, msg => ({ ...msg, content: msg.content + data.text }))),
+            on('ai_stream_end', (data) => {
+                updateStream(data, msg => ({ ...msg, streaming: false }));
+                finishStream(data);
+            }),
+            on('ai_stream_error', (data) => {
+                const errorDetails = data.details?.length ? `\nDetails: ${JSON.stringify(data.details)}` : '';
+                updateStream(data, msg => ({
+                    ...msg,
+                    streaming: false,
+                    content: (msg.content ? msg.content + '\n\n' : '') + data.error + errorDetails
+                }));
+                finishStream(data);
+            }),
+        ];
+        return () => unsubscribers.forEach(unsubscribe => unsubscribe());
+    }, [on]);
+
+    // The answer can't arrive on a socket that dropped
+    useEffect(() => {
+        if (isConnected || !streamIdRef.current) return;
+        const requestId = streamIdRef.current;
+        streamIdRef.current = null;
+        setLoading(false);
+        setMessages(prev => prev.map(msg => msg.requestId === requestId
+            ? { ...msg, streaming: false, content: msg.content || 'Connection lost before the answer arrived.' }
+            : msg));
+    }, [isConnected]);
 
     const scrollToBottom = () => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -28,6 +74,15 @@ export default function AIChatWidget({ activeSession }) {
         setMessages(prev => [...prev, { role: 'user', content: userMessage }]);
         setLoading(true);
 
+        if (isConnected) {
+            const requestId = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+            streamIdRef.current = requestId;
+            setMessages(prev => [...prev, { role: 'assistant', content: '', requestId, streaming: true }]);
+            sendAISolve(requestId, userMessage, '', 'python');
+            return;
+        }
+
+        // No socket: fall back to the blocking REST call
         try {
             // Include active session context if available, or just general help
             const response = await codingAPI.solveError(
@@ -75,8 +130,8 @@ export default function AIChatWidget({ activeSession }) {
 
                     {/* Messages */}
                     <div className="flex-1 overflow-y-auto p-4 space-y-4 bg-[#0D1117]/50">
-                        {messages.map((msg, idx) => (
-                            <div key={idx} className={`flex ${msg.role === 'user' ? 'justify-end' : 'justify-start'}`}>
+                        {messages.filter(msg => !msg.streaming || msg.content).map((msg, idx) => (
+                            <div key={msg.requestId || idx} className={`flex ${msg.role === 'user' ? 'justify-end' : 'justify-start'}`}>
                                 <div className={`max-w-[85%] rounded-lg p-3 ${msg.role === 'user'
                                     ? 'bg-blue-600 text-white'
                                     : 'bg-[#1F2937] text-gray-200 border border-[#30363D]'
@@ -92,7 +147,7 @@ export default function AIChatWidget({ activeSession }) {
                                 </div>
                             </div>
                         ))}
-                        {loading && (
+                        {loading && !messages.some(msg => msg.streaming && msg.content) && (
                             <div className="flex justify-start">
                                 <div className="bg-[#1F2937] border border-[#30363D] rounded-lg p-3">
                                     <div className="flex gap-1">
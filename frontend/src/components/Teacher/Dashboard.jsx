@@ -1,7 +1,7 @@
 /**
  * Teacher Dashboard - Real-time student monitoring
  */
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useWebSocket } from '../../context/WebSocketContext';
 import { useTheme } from '../../context/ThemeContext';
@@ -10,11 +10,12 @@ import StudentTile from './StudentTile';
 import ErrorNotifications from './ErrorNotifications';
 import AIChatWidget from './AIChatWidget';
 import Editor from '@monaco-editor/react';
+import { applyCodeOps } from '../../utils/codeSync';
 
 export default function TeacherDashboard() {
     const { sessionCode } = useParams();
     const navigate = useNavigate();
-    const { connect, disconnect, isConnected, on, off } = useWebSocket();
+    const { connect, disconnect, isConnected, on, off, requestCodeSync } = useWebSocket();
     const { isDark } = useTheme();
 
     const [session, setSession] = useState(null);
@@ -30,6 +31,10 @@ export default function TeacherDashboard() {
     const [isExpandedRunning, setIsExpandedRunning] = useState(false);
     const [isExpandedEditing, setIsExpandedEditing] = useState(false);
     const [isExpandedSaving, setIsExpandedSaving] = useState(false);
+    // Per-student {text, version} that incoming code deltas apply to
+    const codeSyncRef = useRef({});
+    const requestCodeSyncRef = useRef(requestCodeSync);
+    requestCodeSyncRef.current = requestCodeSync;
 
     // Load initial session data
     useEffect(() => {
@@ -41,7 +46,7 @@ export default function TeacherDashboard() {
                 setStudents(sortedStudents);
 
                 const errorsResponse = await sessionsAPI.getErrors(sessionCode);
-                setErrors(errorsResponse.data);
+                setErrors(errorsResponse.data.results);
                 setLoading(false);
             } catch (error) {
                 console.error('Failed to load session:', error);
@@ -72,9 +77,9 @@ export default function TeacherDashboard() {
         };
     }, [sessionCode, connect, disconnect]);
 
-    // Poll for updates every 10 seconds (fallback for WebSocket)
+    // Poll while the socket is down (a reconnect replays missed events or sends a snapshot)
     useEffect(() => {
-        if (!sessionCode) return;
+        if (!sessionCode || isConnected) return;
 
         const pollData = async () => {
             try {
@@ -86,7 +91,7 @@ export default function TeacherDashboard() {
                 setSession(response.data.session);
 
                 const errorsResponse = await sessionsAPI.getErrors(sessionCode);
-                setErrors(errorsResponse.data);
+                setErrors(errorsResponse.data.results);
             } catch (error) {
                 console.error('Polling error:', error);
             }
@@ -96,26 +101,44 @@ export default function TeacherDashboard() {
         const interval = setInterval(pollData, 30000);
 
         return () => clearInterval(interval);
-    }, [sessionCode]);
+    }, [sessionCode, isConnected]);
 
     // Handle WebSocket events
     useEffect(() => {
-        const handleCodeUpdate = (data) => {
+        const applyStudentCode = (studentId, code, language) => {
             setStudents(prev => prev.map(s =>
-                s.id === data.student_id
-                    ? { ...s, code_content: data.code, language: data.language }
+                s.id === studentId
+                    ? { ...s, code_content: code, language }
                     : s
             ));
 
             // Also update the expanded student view if this student is currently maximized
             setExpandedStudent(prev => {
-                if (prev && prev.id === data.student_id) {
-                    return { ...prev, code_content: data.code, language: data.language };
+                if (prev && prev.id === studentId) {
+                    return { ...prev, code_content: code, language };
                 }
                 return prev;
             });
         };
 
+        const handleCodeUpdate = (data) => {
+            codeSyncRef.current[data.student_id] = { text: data.code, version: data.version ?? null };
+            applyStudentCode(data.student_id, data.code, data.language);
+        };
+
+        const handleCodeDelta = (data) => {
+            const sync = codeSyncRef.current[data.student_id];
+            const code = sync && sync.version === data.base_version ? applyCodeOps(sync.text, data.ops) : null;
+            if (code === null) {
+                // Missed an update: ask the student's connection for the full code
+                delete codeSyncRef.current[data.student_id];
+                requestCodeSyncRef.current(data.student_id);
+                return;
+            }
+            codeSyncRef.current[data.student_id] = { text: code, version: data.version };
+            applyStudentCode(data.student_id, code, data.language);
+        };
+
         const handleOutput = (data) => {
             setStudents(prev => prev.map(s =>
                 s.id === data.student_id
@@ -141,6 +164,31 @@ export default function TeacherDashboard() {
             }
         };
 
+        const handleAlert = (data) => {
+            setStudents(prev => prev.map(s =>
+                s.id === data.student_id ? { ...s, has_errors: true } : s
+            ));
+            setErrors(prev => [{
+                id: data.notification_id ?? Date.now(),
+                student: { username: data.username, full_name: data.full_name },
+                error_message: data.message,
+                created_at: data.timestamp,
+                is_read: false
+            }, ...prev]);
+        };
+
+        // Reconnected after missing too many events: take the server's state wholesale
+        const handleSnapshot = async (data) => {
+            codeSyncRef.current = {};
+            setStudents([...data.students].sort((a, b) => a.id - b.id));
+            try {
+                const errorsResponse = await sessionsAPI.getErrors(sessionCode);
+                setErrors(errorsResponse.data.results);
+            } catch (error) {
+                console.error('Failed to reload errors:', error);
+            }
+        };
+
         const handleConnect = (data) => {
             if (data.role === 'student') {
                 setStudents(prev => {
@@ -192,19 +240,25 @@ export default function TeacherDashboard() {
         };
 
         on('student_code_update', handleCodeUpdate);
+        on('student_code_delta', handleCodeDelta);
         on('student_output', handleOutput);
         on('user_connected', handleConnect);
         on('user_disconnected', handleDisconnect);
         on('student_activity', handleActivity);
+        on('student_alert', handleAlert);
+        on('session_snapshot', handleSnapshot);
 
         return () => {
             off('student_code_update', handleCodeUpdate);
+            off('student_code_delta', handleCodeDelta);
             off('student_output', handleOutput);
             off('user_connected', handleConnect);
             off('user_disconnected', handleDisconnect);
             off('student_activity', handleActivity);
+            off('student_alert', handleAlert);
+            off('session_snapshot', handleSnapshot);
         };
-    }, [on, off]);
+    }, [on, off, sessionCode]);
 
     // Filter and search students
     const filteredStudents = students.filter(student => {
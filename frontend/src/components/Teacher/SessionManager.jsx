@@ -17,12 +17,14 @@ import {
     Clock,
     Search
 } from 'lucide-react';
-import { sessionsAPI } from '../../services/api';
+import { sessionsAPI, nextCursor } from '../../services/api';
 import { useTheme } from '../../context/ThemeContext';
 
 export default function SessionManager() {
     const { isDark } = useTheme();
     const [sessions, setSessions] = useState([]);
+    const [cursor, setCursor] = useState(null); // next page of older sessions
+    const [loadingMore, setLoadingMore] = useState(false);
     const [loading, setLoading] = useState(true);
     const [showCreate, setShowCreate] = useState(false);
     const [newSession, setNewSession] = useState({ session_name: '', description: '', default_language: 'python' });
@@ -37,7 +39,8 @@ export default function SessionManager() {
     const loadSessions = async () => {
         try {
             const response = await sessionsAPI.list();
-            setSessions(response.data);
+            setSessions(response.data.results);
+            setCursor(nextCursor(response.data));
         } catch (error) {
             console.error('Failed to load sessions:', error);
         } finally {
@@ -45,6 +48,20 @@ export default function SessionManager() {
         }
     };
 
+    const loadMoreSessions = async () => {
+        if (!cursor) return;
+        setLoadingMore(true);
+        try {
+            const response = await sessionsAPI.list(cursor);
+            setSessions(prev => [...prev, ...response.data.results]);
+            setCursor(nextCursor(response.data));
+        } catch (error) {
+            console.error('Failed to load more sessions:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const createSession = async (e) => {
         e.preventDefault();
         setCreating(true);
@@ -255,6 +272,14 @@ export default function SessionManager() {
                     </motion.div>
                 )}
 
+                {!loading && cursor && (
+                    <div className="flex justify-center mt-8">
+                        <button onClick={loadMoreSessions} disabled={loadingMore} className="btn btn-secondary">
+                            {loadingMore ? 'Loading...' : 'Load older sessions'}
+                        </button>
+                    </div>
+                )}
+
                 {/* Create Session Modal */}
                 <AnimatePresence>
                     {showCreate && (
@@ -23,6 +23,8 @@ export function WebSocketProvider({ children }) {
     const heartbeatInterval = useRef(null);
     const reconnectAttempts = useRef(0);
     const maxReconnectAttempts = 5;
+    // Last event sequence seen per session, presented on reconnect to get only missed events
+    const resumeRef = useRef(null);
 
     // Connect to a session
     const connect = useCallback((code) => {
@@ -42,7 +44,9 @@ export function WebSocketProvider({ children }) {
             socket.close(1000, 'Reconnecting');
         }
 
-        const wsUrl = `${WS_BASE_URL}/ws/session/${code}/?token=${token}`;
+        const resume = resumeRef.current?.code === code ? resumeRef.current : null;
+        const resumeQuery = resume ? `&epoch=${resume.epoch}&last_seq=${resume.seq}` : '';
+        const wsUrl = `${WS_BASE_URL}/ws/session/${code}/?token=${token}${resumeQuery}`;
         // Connecting to WebSocket
         // OPTIMIZATION: Connecting to WebSocket session
         const ws = new WebSocket(wsUrl);
@@ -62,23 +66,35 @@ export function WebSocketProvider({ children }) {
             }, 60000); // 60s heartbeat (reduced from 30s)
         };
 
+        const dispatch = (data) => {
+            // Call registered listeners for this message type
+            const typeListeners = listeners.current.get(data.type) || [];
+            typeListeners.forEach(callback => callback(data));
+
+            // Call 'all' listeners
+            const allListeners = listeners.current.get('all') || [];
+            allListeners.forEach(callback => callback(data));
+        };
+
         ws.onmessage = (event) => {
             try {
                 const data = JSON.parse(event.data);
                 setLastMessage(data);
 
-                // OPTIMIZATION: Connection confirmed from server
-                if (data.type === 'connection_confirmed') {
-                    // WebSocket connection confirmed
+                if (data.type === 'connection_confirmed' && !resume) {
+                    // Fresh connection: the initial REST load covers everything before now
+                    resumeRef.current = { code, epoch: data.epoch, seq: data.seq };
+                } else if (data.type === 'replay' || data.type === 'session_snapshot') {
+                    resumeRef.current = { code, epoch: data.epoch, seq: data.seq };
+                } else if (data.seq && resumeRef.current?.code === code) {
+                    resumeRef.current.seq = Math.max(resumeRef.current.seq, data.seq);
                 }
 
-                // Call registered listeners for this message type
-                const typeListeners = listeners.current.get(data.type) || [];
-                typeListeners.forEach(callback => callback(data));
-
-                // Call 'all' listeners
-                const allListeners = listeners.current.get('all') || [];
-                allListeners.forEach(callback => callback(data));
+                // Events missed while disconnected are delivered as if they just arrived
+                if (data.type === 'replay') {
+                    data.events.forEach(dispatch);
+                }
+                dispatch(data);
             } catch (error) {
                 console.error('WebSocket message parse error:', error);
             }
@@ -126,6 +142,10 @@ export function WebSocketProvider({ children }) {
 
     // Disconnect from session
     const disconnect = useCallback(() => {
+        // Leaving a live session forgets its place; a cleanup racing a reconnect keeps it
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            resumeRef.current = null;
+        }
         if (socket) {
             socket.close(1000, 'User disconnected');
             setSocket(null);
@@ -196,6 +216,10 @@ export function WebSocketProvider({ children }) {
         // Convenience methods for common actions
         sendCodeChange: (code, language, cursorPosition) =>
             send('code_change', { code, language, cursor_position: cursorPosition }),
+        sendCodeDelta: (ops, baseVersion, language, cursorPosition) =>
+            send('code_change', { ops, base_version: baseVersion, language, cursor_position: cursorPosition }),
+        requestCodeSync: (studentId) =>
+            send('request_code_sync', { student_id: studentId }),
         sendTeacherEdit: (studentId, code, language, cursorPosition) =>
             send('teacher_edit', { student_id: studentId, code, language, cursor_position: cursorPosition }),
         sendRunCode: (code, language) =>
@@ -206,6 +230,10 @@ export function WebSocketProvider({ children }) {
             send('release_control', { student_id: studentId }),
         sendStudentAlert: (message) =>
             send('student_notification', { message }),
+        sendAISolve: (requestId, prompt, code, language) =>
+            send('ai_solve', { request_id: requestId, prompt, code, language }),
+        cancelAISolve: (requestId) =>
+            send('ai_cancel', { request_id: requestId }),
     };
 
     return (
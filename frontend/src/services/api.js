@@ -94,8 +94,9 @@ export const authAPI = {
 
 // Sessions API
 export const sessionsAPI = {
-    list: () =>
-        api.get('/sessions/'),
+    // List endpoints are cursor-paginated: { next, previous, results }
+    list: (cursor) =>
+        api.get('/sessions/', { params: cursor ? { cursor } : {} }),
 
     create: (data) =>
         api.post('/sessions/create/', data),
@@ -112,8 +113,8 @@ export const sessionsAPI = {
     update: (sessionCode, data) =>
         api.patch(`/sessions/${sessionCode}/`, data),
 
-    getParticipants: (sessionCode) =>
-        api.get(`/sessions/${sessionCode}/participants/`),
+    getParticipants: (sessionCode, cursor) =>
+        api.get(`/sessions/${sessionCode}/participants/`, { params: cursor ? { cursor } : {} }),
 
     getDashboard: (sessionCode) =>
         api.get(`/sessions/${sessionCode}/dashboard/`),
@@ -121,8 +122,8 @@ export const sessionsAPI = {
     getStudentCode: (sessionCode, studentId) =>
         api.get(`/sessions/${sessionCode}/students/${studentId}/code/`),
 
-    getErrors: (sessionCode) =>
-        api.get(`/sessions/${sessionCode}/errors/`),
+    getErrors: (sessionCode, cursor) =>
+        api.get(`/sessions/${sessionCode}/errors/`, { params: cursor ? { cursor } : {} }),
 
     markErrorRead: (notificationId) =>
         api.post(`/sessions/errors/${notificationId}/read/`),
@@ -188,4 +189,8 @@ export const githubAPI = {
         api.post('/auth/github/create-repo/', { name, description, private: isPrivate }),
 };
 
+// Cursor of the next page from a paginated response's `next` URL
+export const nextCursor = (data) =>
+    data?.next ? new URL(data.next, window.location.origin).searchParams.get('cursor') : null;
+
 export default api;
@@ -0,0 +1,35 @@
+/**
+ * Delta-encoded code sync helpers
+ * Ops are {from, to, text} with JavaScript string (UTF-16) offsets,
+ * matching backend/coding/code_sync.py
+ */
+
+// Describe the change from oldText to newText as a single replace op
+export const diffToOps = (oldText, newText) => {
+    if (oldText === newText) return [];
+
+    let start = 0;
+    const maxStart = Math.min(oldText.length, newText.length);
+    while (start < maxStart && oldText.charCodeAt(start) === newText.charCodeAt(start)) {
+        start++;
+    }
+
+    let oldEnd = oldText.length;
+    let newEnd = newText.length;
+    while (oldEnd > start && newEnd > start && oldText.charCodeAt(oldEnd - 1) === newText.charCodeAt(newEnd - 1)) {
+        oldEnd--;
+        newEnd--;
+    }
+
+    return [{ from: start, to: oldEnd, text: newText.slice(start, newEnd) }];
+};
+
+// Apply ops in order; returns null if they don't fit the text
+export const applyCodeOps = (text, ops) => {
+    let result = text;
+    for (const op of ops || []) {
+        if (op.from < 0 || op.from > op.to || op.to > result.length) return null;
+        result = result.slice(0, op.from) + (op.text || '') + result.slice(op.to);
+    }
+    return result;
+};